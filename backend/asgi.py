@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Dream Keeper ASGI entry point (uvicorn)
+
+    pip install -r requirements-asgi.txt      # asyncpg per Postgres
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+Un processo tiene migliaia di connessioni keep-alive inattive; le view Flask
+girano in un pool di ASGI_THREADS thread (vedi project/asgi.py).
+"""
+
+import os
+import sys
+
+# Add project directory to path
+project_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_dir)
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    os.environ.setdefault('FLASK_ENV', 'development')
+
+# Una connessione al database per ogni thread delle view
+os.environ.setdefault('DB_POOL_SIZE', os.getenv('ASGI_THREADS', '32'))
+
+from project.asgi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,3 @@
+"""
+Benchmarks (run from the backend directory, e.g. python -m benchmarks.serialization)
+"""
@@ -0,0 +1,434 @@
+"""
+Load benchmark: concurrent clients against a local server, with a baseline
+
+    python -m benchmarks.load seed --db /tmp/bench.db --users 10000 --dreams 1000 --tags 200
+    python -m benchmarks.load run --db /tmp/bench.db --clients 16 --duration 30
+    python -m benchmarks.load run --db /tmp/bench.db --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load run --db /tmp/bench.db --baseline benchmarks/baseline.json
+
+`seed` fills a SQLite file through the models (bulk insert, so tags, stats,
+journal and search index stay consistent). `run` starts gunicorn on that file
+(or targets --url), drives the endpoints of every blueprint with a weighted
+mix of operations and reports p50/p95/p99 latency per operation and overall
+throughput. With --baseline the run fails (exit code 1) when an operation's
+p95 or the throughput is worse than the baseline beyond --tolerance.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PASSWORD = 'BenchPassw0rd'
+USER_CHUNK = 1000
+
+WORDS = ['volo', 'mare', 'casa', 'treno', 'bosco', 'scuola', 'montagna', 'città',
+         'cane', 'notte', 'pioggia', 'specchio', 'ascensore', 'isola', 'ponte']
+MOODS = ['happy', 'sad', 'scary', 'weird', 'peaceful', None]
+
+# Operazioni simulate e loro peso nel mix
+OPERATIONS = {
+    'login': 3,
+    'list': 30,
+    'get': 15,
+    'search': 12,
+    'stats': 10,
+    'tags': 5,
+    'find_users': 5,
+    'create': 10,
+    'update': 10,
+}
+
+
+# --- seed -------------------------------------------------------------------
+
+def _dream_items(rng, count, tags):
+    today = date.today()
+    items = []
+    for i in range(count):
+        words = rng.sample(WORDS, 6)
+        items.append({
+            'title': f'Sogno {i}: {words[0]}',
+            'content': ' '.join(f'Ero in {word} e poi' for word in words) + ' mi sono svegliato.',
+            'date_dreamed': today - timedelta(days=rng.randrange(3 * 365)),
+            'mood': rng.choice(MOODS),
+            'is_lucid': rng.random() < 0.1,
+            'tags': rng.sample(tags, rng.randint(0, 3)),
+            'is_private': rng.random() < 0.8,
+        })
+    return items
+
+
+def seed(path, users, dreams, tags, seed_value=42):
+    """Create ``users`` bench users with ``dreams`` dreams each in a SQLite file."""
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+
+    from project.app import create_app
+    from project import db
+    from project.models import User, Dream
+
+    rng = random.Random(seed_value)
+    tag_names = [WORDS[i] if i < len(WORDS) else f'tag{i}' for i in range(tags)]
+    app = create_app('production')
+
+    with app.app_context():
+        # Un solo hash bcrypt condiviso: hashare 10k password richiederebbe ore
+        password_hash = User('bench', 'bench@example.com', PASSWORD).password_hash
+        table = User.__table__
+        now = datetime.utcnow()
+        start = time.perf_counter()
+        for first in range(0, users, USER_CHUNK):
+            db.session.execute(db.insert(table), [{
+                'username': f'bench_{i}', 'username_lower': f'bench_{i}', 'email': f'bench_{i}@example.com',
+                'password_hash': password_hash, 'is_active': True,
+                'created_at': now, 'updated_at': now,
+            } for i in range(first, min(first + USER_CHUNK, users))])
+            db.session.commit()
+
+        user_ids = db.session.execute(
+            db.select(table.c.id).where(table.c.username.like('bench\\_%', escape='\\')).order_by(table.c.id)
+        ).scalars().all()
+        for done, user_id in enumerate(user_ids, 1):
+            Dream.bulk_insert(user_id, _dream_items(rng, dreams, tag_names))
+            if done % 100 == 0 or done == len(user_ids):
+                elapsed = time.perf_counter() - start
+                print(f'   {done}/{len(user_ids)} utenti, {done * dreams} sogni ({elapsed:.0f}s)')
+
+    print(f"✅ Seed completato: {users} utenti x {dreams} sogni, {tags} tag -> {path}")
+
+
+def seeded_users(path):
+    """Number of bench users in a seeded database."""
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench\\_%' ESCAPE '\\'").fetchone()[0]
+
+
+# --- server -----------------------------------------------------------------
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(path, workers, threads):
+    """Start gunicorn (or run.py without it) on the bench database; return (process, url)."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{os.path.abspath(path)}',
+        'FLASK_ENV': 'production',
+        'FLASK_PORT': str(port),
+        'RATELIMIT_ENABLED': 'False',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_THREADS': str(threads),
+        'GUNICORN_ACCESS_LOG': os.devnull,
+    })
+    try:
+        import gunicorn  # noqa: F401
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+    except ImportError:
+        print("⚠️  gunicorn non installato, uso il server di sviluppo (run.py)")
+        command = [sys.executable, 'run.py']
+
+    log = open(os.path.join(os.path.dirname(os.path.abspath(path)), 'bench-server.log'), 'w')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}, see {log.name}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/api/health')
+            if connection.getresponse().status == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'Server not ready after 60s, see {log.name}')
+
+
+# --- client -----------------------------------------------------------------
+
+class Client:
+    """One simulated user on a keep-alive connection."""
+
+    def __init__(self, url, user_index, rng, results):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = None
+        self.email = f'bench_{user_index}@example.com'
+        self.rng = rng
+        self.results = results
+        self.token = None
+        self.dream_ids = []
+
+    def request(self, operation, method, path, body=None, record=True):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection = None
+            data, status = b'', 0
+        elapsed = time.perf_counter() - start
+
+        if record:
+            self.results.record(operation, elapsed, 200 <= status < 300)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def login(self, record=True):
+        status, data = self.request('login', 'POST', '/api/auth/login',
+                                    {'email': self.email, 'password': PASSWORD}, record=record)
+        if status == 200:
+            self.token = data['access_token']
+        return status
+
+    def refresh_ids(self):
+        status, data = self.request('list', 'GET', '/api/dreams?per_page=50')
+        if status == 200:
+            self.dream_ids = [dream['id'] for dream in data['dreams']]
+
+    def run_operation(self, operation):
+        rng = self.rng
+        if operation == 'login':
+            self.login()
+        elif operation == 'list':
+            self.request('list', 'GET', f'/api/dreams?page={rng.randint(1, 5)}&per_page=20')
+        elif operation == 'get':
+            if not self.dream_ids:
+                return self.refresh_ids()
+            self.request('get', 'GET', f'/api/dreams/{rng.choice(self.dream_ids)}')
+        elif operation == 'search':
+            self.request('search', 'GET', f'/api/dreams/search?q={quote(rng.choice(WORDS[:10]))}')
+        elif operation == 'stats':
+            self.request('stats', 'GET', '/api/dreams/stats')
+        elif operation == 'tags':
+            self.request('tags', 'GET', '/api/dreams/tags')
+        elif operation == 'find_users':
+            self.request('find_users', 'GET', f'/api/users/find?q=bench_{rng.randint(1, 99)}')
+        elif operation == 'create':
+            word = rng.choice(WORDS)
+            status, data = self.request('create', 'POST', '/api/dreams', {
+                'title': f'Nuovo sogno: {word}', 'content': f'Stanotte ero in {word} con degli amici.',
+                'date_dreamed': date.today().isoformat(), 'mood': rng.choice(MOODS[:-1]), 'tags': [word],
+            })
+            if status == 201:
+                self.dream_ids.append(data['dream']['id'])
+        elif operation == 'update':
+            if not self.dream_ids:
+                return self.refresh_ids()
+            self.request('update', 'PUT', f'/api/dreams/{rng.choice(self.dream_ids)}', {
+                'title': f'Aggiornato {rng.randint(1, 10 ** 6)}', 'tags': rng.sample(WORDS, 2),
+            })
+
+
+class Results:
+    """Latencies per operation, shared by all client threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, operation, elapsed, ok):
+        with self._lock:
+            self.latencies[operation].append(elapsed)
+            if not ok:
+                self.errors[operation] += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(results, elapsed, settings):
+    operations = {}
+    total = 0
+    for operation in sorted(results.latencies):
+        values = sorted(results.latencies[operation])
+        total += len(values)
+        operations[operation] = {
+            'count': len(values),
+            'errors': results.errors[operation],
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'rps': round(len(values) / elapsed, 1),
+        }
+    return {
+        'settings': settings,
+        'duration_s': round(elapsed, 2),
+        'requests': total,
+        'errors': sum(results.errors.values()),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'operations': operations,
+    }
+
+
+def run_load(url, users, clients, duration, seed_value=42):
+    """Run ``clients`` threads for ``duration`` seconds; return a Results."""
+    results = Results()
+    population = list(OPERATIONS)
+    weights = [OPERATIONS[name] for name in population]
+    stop = threading.Event()
+    ready = threading.Barrier(clients + 1)
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        client = Client(url, rng.randrange(users), rng, results)
+        client.login(record=False)
+        ready.wait()
+        while not stop.is_set():
+            client.run_operation(rng.choices(population, weights)[0])
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()  # login iniziali esclusi dalla misura
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+# --- report / baseline --------------------------------------------------------
+
+def print_report(summary):
+    print(f"\n{'operazione':<12} {'n':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for operation, stats in summary['operations'].items():
+        print(f"{operation:<12} {stats['count']:>7} {stats['errors']:>5} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['rps']:>8.1f}")
+    print(f"\n{summary['requests']} richieste in {summary['duration_s']}s, "
+          f"{summary['throughput_rps']} req/s, {summary['errors']} errori")
+
+
+def compare_baseline(summary, baseline, tolerance):
+    """Return the regressions of ``summary`` against ``baseline`` (list of messages)."""
+    regressions = []
+    for operation, reference in baseline['operations'].items():
+        current = summary['operations'].get(operation)
+        if current is None:
+            continue
+        limit = reference['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > limit:
+            regressions.append(f"{operation}: p95 {current['p95_ms']}ms > {limit:.1f}ms "
+                               f"(baseline {reference['p95_ms']}ms)")
+    minimum = baseline['throughput_rps'] * (1 - tolerance)
+    if summary['throughput_rps'] < minimum:
+        regressions.append(f"throughput {summary['throughput_rps']} req/s < {minimum:.1f} "
+                           f"(baseline {baseline['throughput_rps']})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='create and fill the benchmark database')
+    seed_parser.add_argument('--db', default='bench.db')
+    seed_parser.add_argument('--users', type=int, default=200)
+    seed_parser.add_argument('--dreams', type=int, default=100, help='dreams per user')
+    seed_parser.add_argument('--tags', type=int, default=50, help='distinct tag names')
+    seed_parser.add_argument('--seed', type=int, default=42)
+
+    run_parser = commands.add_parser('run', help='run the load test')
+    run_parser.add_argument('--db', default='bench.db')
+    run_parser.add_argument('--url', help='target an already running server instead of starting one')
+    run_parser.add_argument('--users', type=int, help='bench users in the database (default: read from --db)')
+    run_parser.add_argument('--clients', type=int, default=16)
+    run_parser.add_argument('--duration', type=float, default=30, help='seconds')
+    run_parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    run_parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help='write the results as JSON')
+    run_parser.add_argument('--save-baseline', metavar='FILE', help='store the results as the new baseline')
+    run_parser.add_argument('--baseline', metavar='FILE', help='compare with a baseline, exit 1 on regression')
+    run_parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown (0.25 = 25%%)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        seed(args.db, args.users, args.dreams, args.tags, args.seed)
+        return 0
+
+    if args.url is None and not os.path.exists(args.db):
+        seed(args.db, 200, 100, 50, args.seed)
+    users = args.users or seeded_users(args.db)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.db, args.workers, args.threads)
+        print(f"🌐 Server su {url} ({args.workers} worker x {args.threads} thread)")
+    try:
+        print(f"🚀 {args.clients} client per {args.duration:.0f}s su {users} utenti...")
+        results, elapsed = run_load(url, users, args.clients, args.duration, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    settings = {'clients': args.clients, 'duration': args.duration, 'users': users,
+                'workers': args.workers, 'threads': args.threads, 'external': args.url is not None}
+    summary = summarize(results, elapsed, settings)
+    print_report(summary)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+                f.write('\n')
+            print(f"💾 Risultati salvati in {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(summary, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ Regressioni rispetto a {args.baseline}:")
+            for message in regressions:
+                print(f"   {message}")
+            return 1
+        print(f"\n✅ Nessuna regressione rispetto a {args.baseline} (tolleranza {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
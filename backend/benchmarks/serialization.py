@@ -0,0 +1,109 @@
+"""
+Serialization benchmark: DreamSchema + json vs precompiled serializer + orjson
+
+    python -m benchmarks.serialization [--dreams 10000] [--page-size 50] [--repeat 200]
+
+Seeds an in-memory database, checks that both paths produce the same data,
+then times a list page (dump + jsonify) and a full export.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project.app import create_app  # noqa: E402
+from project import db  # noqa: E402
+from project.models import User, Dream  # noqa: E402
+from project.schemas import dreams_schema  # noqa: E402
+from project.serializers import serialize_dreams  # noqa: E402
+from project.utils.json_provider import ORJSONProvider, orjson  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+MOODS = ['happy', 'sad', 'scary', 'weird', None]
+
+
+def seed(total):
+    user = User(username='bench_user', email='bench@example.com', password='BenchPassw0rd')
+    user.save_to_db()
+    today = date.today()
+    items = [{
+        'title': f'Sogno {i}',
+        'content': 'Volavo sopra una città di vetro, poi il mare diventava cielo. ' * 6,
+        'date_dreamed': today - timedelta(days=i % 900),
+        'mood': MOODS[i % len(MOODS)],
+        'is_lucid': i % 7 == 0,
+        'tags': ['volo', f'tag{i % 25}', 'mare'] if i % 3 else [],
+        'is_private': True,
+    } for i in range(total)]
+    Dream.bulk_insert(user.id, items)
+    return user.id
+
+
+def timed(function, repeat):
+    """Return the best and mean wall time of ``repeat`` calls, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples), sum(samples) / len(samples)
+
+
+def run(total, page_size, repeat, export_repeat):
+    app = create_app('testing')
+    stdlib_json = DefaultJSONProvider(app)
+    fast_json = ORJSONProvider(app)
+
+    with app.app_context():
+        user_id = seed(total)
+        page = Dream.query.filter_by(user_id=user_id).order_by(
+            Dream.date_dreamed.desc(), Dream.id.desc()
+        ).limit(page_size).all()
+        everything = db.session.execute(
+            db.select(Dream.__table__).where(Dream.__table__.c.user_id == user_id)
+        ).all()
+        models = Dream.query.filter_by(user_id=user_id).all()
+
+        # Stessi dati: dict identici e JSON identico una volta decodificato
+        assert dreams_schema.dump(models) == serialize_dreams(models)
+        assert serialize_dreams(models) == serialize_dreams(everything)
+        assert json.loads(stdlib_json.dumps(dreams_schema.dump(page))) == \
+            json.loads(fast_json.dumps(serialize_dreams(page)))
+
+        with app.test_request_context():
+            cases = [
+                (f'page {page_size}: marshmallow + json', repeat,
+                 lambda: stdlib_json.response({'dreams': dreams_schema.dump(page)})),
+                (f'page {page_size}: compiled + {"orjson" if orjson else "json"}', repeat,
+                 lambda: fast_json.response({'dreams': serialize_dreams(page)})),
+                (f'export {total}: marshmallow + json', export_repeat,
+                 lambda: stdlib_json.dumps(dreams_schema.dump(models))),
+                (f'export {total}: compiled + {"orjson" if orjson else "json"}', export_repeat,
+                 lambda: fast_json.dumps(serialize_dreams(everything))),
+            ]
+            results = [(label, *timed(function, count)) for label, count, function in cases]
+
+    width = max(len(label) for label, _, _ in results)
+    print(f"{'case':<{width}}  {'best ms':>9}  {'mean ms':>9}")
+    for label, best, mean in results:
+        print(f'{label:<{width}}  {best:>9.3f}  {mean:>9.3f}')
+    for slow, fast in ((0, 1), (2, 3)):
+        print(f'speedup {results[slow][0].split(":")[0]}: {results[slow][2] / results[fast][2]:.1f}x')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dreams', type=int, default=10000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--export-repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    run(args.dreams, args.page_size, args.repeat, args.export_repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,107 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'my_super_secret_key_2024')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=86400)  # 24 ore
+
+    # Full-text search: 'auto' sceglie in base al database (sqlite_fts5, postgres, like)
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    # Ricerca utenti: username in memoria (caricati all'avvio) per i prefissi
+    USER_INDEX_ENABLED = os.getenv('USER_INDEX_ENABLED', 'True').lower() == 'true'
+
+    # Cache delle identità utente (current_user dei token JWT)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # secondi
+
+    # Rate limiting: memory:// (singolo processo), sqlite:///ratelimit.db
+    # (tutti i worker della macchina) o redis://host:6379/0 (condiviso)
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
+
+    # Serializzazione JSON con orjson (se installato)
+    JSON_USE_ORJSON = os.getenv('JSON_USE_ORJSON', 'True').lower() == 'true'
+
+    # Cache delle risposte GET (lista, ricerca, statistiche): memory:// per
+    # processo o redis://host:6379/1 condivisa tra i worker
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', 'memory://')
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 30))  # secondi
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+    # Notifiche live (/api/events, SSE): memory:// per processo o
+    # redis://host:6379/2 per vedere le scritture di tutti i worker
+    EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'True').lower() == 'true'
+    EVENTS_BROKER_URL = os.getenv('EVENTS_BROKER_URL', 'memory://')
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', 100))  # oltre: evento 'resync'
+    EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))  # secondi
+    EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))
+    # Ticket monouso per aprire lo stream (EventSource non invia l'header Authorization)
+    EVENTS_TICKET_TTL = int(os.getenv('EVENTS_TICKET_TTL', 30))  # secondi
+    # Stream serviti da Flask (gunicorn/sviluppo): ognuno occupa un thread
+    EVENTS_MAX_WSGI_STREAMS = int(os.getenv('EVENTS_MAX_WSGI_STREAMS', 2))
+
+    # Compressione gzip/brotli delle risposte (brotli se installato)
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))  # byte
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', 512))
+    COMPRESS_CACHE_MAX_BYTES = int(os.getenv('COMPRESS_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+
+    # Strumentazione richieste: header Server-Timing e /api/metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # se impostato, richiesto da /api/metrics
+    # Senza METRICS_TOKEN: /api/metrics e /api/cache/stats aperti (False = 404)
+    METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'True').lower() == 'true'
+
+    # Password: costo bcrypt dei nuovi hash (quelli con un costo diverso
+    # vengono aggiornati al login successivo) e pool di processi per l'hashing
+    # (0 = nel thread della richiesta); oltre PASSWORD_POOL_MAX_PENDING
+    # operazioni in coda login/registrazione rispondono 503
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', 2))
+    PASSWORD_POOL_MAX_PENDING = int(os.getenv('PASSWORD_POOL_MAX_PENDING', 32))
+    PASSWORD_POOL_TIMEOUT = float(os.getenv('PASSWORD_POOL_TIMEOUT', 10))  # secondi
+    # Login falliti: oltre la soglia (per account+IP e per IP) 429 senza bcrypt
+    LOGIN_MAX_FAILURES = int(os.getenv('LOGIN_MAX_FAILURES', 5))
+    LOGIN_MAX_FAILURES_PER_IP = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 20))
+    LOGIN_FAILURE_WINDOW = int(os.getenv('LOGIN_FAILURE_WINDOW', 900))  # secondi
+
+    # Feed degli amici: fan-out in scrittura per gli autori con meno di
+    # FEED_FANOUT_THRESHOLD amici, fan-in in lettura per gli altri
+    FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', 1000))
+    FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', 200))  # sogni copiati alla nuova amicizia
+
+    # Rilevatore N+1: segnala la stessa SELECT ripetuta più di
+    # NPLUSONE_THRESHOLD volte in una richiesta ('log' oppure 'raise')
+    NPLUSONE_ENABLED = os.getenv('NPLUSONE_ENABLED', 'False').lower() == 'true'
+    NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+    NPLUSONE_ACTION = os.getenv('NPLUSONE_ACTION', 'log')
+
+    # Pool di connessioni del database (per processo/worker)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # secondi
+    }
+
+    # Modalità ASGI (asgi.py): thread per le view Flask, connessioni del
+    # motore async (aiosqlite/asyncpg) usato dalle route native
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL')  # default: DATABASE_URL con driver async
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', 10))
+
+    # PRAGMA applicati a ogni nuova connessione SQLite (file, non :memory:).
+    # WAL: i lettori non vengono bloccati dagli scrittori; con WAL
+    # synchronous=NORMAL resta sicuro e non fa fsync a ogni commit.
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),  # negativo = KiB
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'temp_store': 'MEMORY',
+    }
     
     # CORS Origins - supporta localhost e rete locale dinamicamente
     @staticmethod
@@ -45,12 +146,27 @@ class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///dream_keeper.db')
+    NPLUSONE_ENABLED = os.getenv('NPLUSONE_ENABLED', 'True').lower() == 'true'
 
 class ProductionConfig(Config):
     """Production configuration."""
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     
+    # Con più worker gunicorn la cache in memoria non vede le scritture degli
+    # altri processi: di default attiva solo con un backend condiviso
+    RESPONSE_CACHE_ENABLED = os.getenv(
+        'RESPONSE_CACHE_ENABLED',
+        str(not Config.RESPONSE_CACHE_URL.startswith('memory://'))
+    ).lower() == 'true'
+    
+    # Identità utente in cache per worker: una disattivazione arriva agli
+    # altri worker solo alla scadenza, quindi TTL breve
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 10))  # secondi
+    
+    # Metriche e statistiche delle cache solo con METRICS_TOKEN
+    METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'False').lower() == 'true'
+    
     # Security headers for production
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
@@ -60,7 +176,12 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # :memory: usa una sola connessione condivisa
     WTF_CSRF_ENABLED = False
+    NPLUSONE_ENABLED = True
+    NPLUSONE_ACTION = 'raise'
+    BCRYPT_ROUNDS = 4  # hash veloci nei test
+    PASSWORD_POOL_WORKERS = 0
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,64 @@
+"""
+Gunicorn configuration for the Dream Keeper API (production)
+
+Avvio:
+    gunicorn -c gunicorn.conf.py
+
+Tutti i valori si possono sovrascrivere con variabili d'ambiente
+(GUNICORN_WORKERS, GUNICORN_THREADS, ...). Reload graceful:
+    kill -HUP <pid master>    # nuovi worker, le richieste in corso terminano
+    kill -USR2 <pid master>   # nuovo master con il codice aggiornato (preload_app)
+"""
+import multiprocessing
+import os
+
+# Applicazione: factory di run.py, chiamata una volta (nel master con preload_app)
+wsgi_app = 'run:create_app()'
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('FLASK_PORT', '5000')}")
+
+# gthread: ogni worker serve più richieste in parallelo con un pool di thread,
+# così le attese su I/O (SQLite, client lenti) non bloccano il processo
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Connessioni keep-alive (client mobili dietro lo stesso proxy)
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Ricicla i worker periodicamente (memory leak), con jitter per non
+# riavviarli tutti insieme
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# create_app() viene eseguita una volta sola nel master, i worker la ereditano
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Pool di connessioni per worker allineato ai thread: una connessione per
+# thread, più un piccolo margine (letto da config.py all'avvio dell'app)
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(max(2, threads // 2)))
+os.environ.setdefault('FLASK_ENV', 'production')
+# Stream SSE: al massimo metà dei thread di ogni worker
+os.environ.setdefault('EVENTS_MAX_WSGI_STREAMS', str(threads // 2))
+# bcrypt: i pool dei worker si sommano. Con i 2 * CPU + 1 worker di default
+# ognuno ha un solo processo, quindi 2 * CPU + 1 processi bcrypt in totale;
+# oltre PASSWORD_POOL_MAX_PENDING operazioni in coda il worker risponde 503
+os.environ.setdefault('PASSWORD_POOL_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+
+def post_fork(server, worker):
+    """Do not share the master's pooled DB connections with the forked worker."""
+    from project import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,57 @@
+"""Add composite indexes for dreams and friendships
+
+Revision ID: 3f2a9c1d7b10
+Revises: c6b2d8f40e17
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b10'
+down_revision = 'c6b2d8f40e17'
+branch_labels = None
+depends_on = None
+
+
+# (tabella, nome, colonne) - gli indici che le route usano davvero
+INDEXES = [
+    ('dreams', 'ix_dreams_user_date_id', ['user_id', 'date_dreamed', 'id']),
+    ('dream_tags', 'ix_dream_tags_user_tag_dream', ['user_id', 'tag_id', 'dream_id']),
+    ('friendships', 'ix_friendships_requester_status', ['requester_id', 'status']),
+    ('friendships', 'ix_friendships_addressee_status', ['addressee_id', 'status']),
+]
+
+UNIQUE_INDEXES = [
+    ('friendships', 'uq_friendships_requester_addressee', ['requester_id', 'addressee_id']),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Le tabelle possono essere già state create da db.create_all() con gli
+    # indici dichiarati nei modelli: crea solo quelli mancanti.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, name, columns in INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+    for table, name, columns in UNIQUE_INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns, unique=True)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, name, _ in UNIQUE_INDEXES + INDEXES:
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""Add user_journals (per-user journal version for ETags)
+
+Revision ID: 8c41e7a2d5f3
+Revises: 3f2a9c1d7b10
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e7a2d5f3'
+down_revision = '3f2a9c1d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() all'avvio può averla già creata
+    inspector = sa.inspect(op.get_bind())
+    if 'user_journals' in inspector.get_table_names():
+        return
+    op.create_table(
+        'user_journals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_journals')
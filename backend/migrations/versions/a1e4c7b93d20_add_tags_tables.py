@@ -0,0 +1,49 @@
+"""Add tags and dream_tags (normalized dream tags)
+
+Revision ID: a1e4c7b93d20
+Revises: 
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1e4c7b93d20'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() all'avvio può averle già create; i dati li popola l'avvio
+    # dell'app (Tag.needs_backfill) o 'flask tags rebuild'
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'tags' not in tables:
+        op.create_table(
+            'tags',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_tags_name', 'tags', ['name'], unique=True)
+    if 'dream_tags' not in tables:
+        op.create_table(
+            'dream_tags',
+            sa.Column('dream_id', sa.Integer(), nullable=False),
+            sa.Column('tag_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['dream_id'], ['dreams.id'], ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['tag_id'], ['tags.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('dream_id', 'tag_id')
+        )
+        op.create_index('ix_dream_tags_user_tag_dream', 'dream_tags', ['user_id', 'tag_id', 'dream_id'])
+
+
+def downgrade():
+    op.drop_index('ix_dream_tags_user_tag_dream', table_name='dream_tags')
+    op.drop_table('dream_tags')
+    op.drop_index('ix_tags_name', table_name='tags')
+    op.drop_table('tags')
@@ -0,0 +1,51 @@
+"""Add dreams.excerpt (list preview computed from content)
+
+Revision ID: b7d93e15c2a8
+Revises: 8c41e7a2d5f3
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d93e15c2a8'
+down_revision = '8c41e7a2d5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from project.models.dream import Dream, EXCERPT_LENGTH
+
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('dreams')}
+    if 'excerpt' not in columns:
+        with op.batch_alter_table('dreams', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('excerpt', sa.String(length=EXCERPT_LENGTH + 1), nullable=True))
+
+    # Calcola l'anteprima dei sogni esistenti, a blocchi
+    dreams = sa.table('dreams', sa.column('id', sa.Integer), sa.column('content', sa.Text),
+                      sa.column('excerpt', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(dreams.c.id, dreams.c.content)
+            .where(dreams.c.id > last_id, dreams.c.excerpt.is_(None))
+            .order_by(dreams.c.id).limit(1000)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            dreams.update().where(dreams.c.id == sa.bindparam('dream_id')).values(
+                excerpt=sa.bindparam('new_excerpt')
+            ),
+            [{'dream_id': row.id, 'new_excerpt': Dream.make_excerpt(row.content)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('dreams', schema=None) as batch_op:
+        batch_op.drop_column('excerpt')
@@ -0,0 +1,35 @@
+"""Add user_dream_stats (incremental per-user statistics)
+
+Revision ID: c6b2d8f40e17
+Revises: a1e4c7b93d20
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6b2d8f40e17'
+down_revision = 'a1e4c7b93d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Chiave (user_id, bucket): il riepilogo di un utente è una lettura per
+    # range di chiave primaria. I contatori li calcola l'avvio dell'app
+    # (UserDreamStats.needs_backfill) o 'flask stats rebuild'
+    if 'user_dream_stats' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'user_dream_stats',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('bucket', sa.String(length=64), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id', 'bucket')
+        )
+
+
+def downgrade():
+    op.drop_table('user_dream_stats')
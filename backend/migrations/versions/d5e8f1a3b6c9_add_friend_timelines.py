@@ -0,0 +1,72 @@
+"""Add timeline_entries and user_friend_counts (friends' feed)
+
+Revision ID: d5e8f1a3b6c9
+Revises: b7d93e15c2a8
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e8f1a3b6c9'
+down_revision = 'b7d93e15c2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # create_all() all'avvio può averle già create (vuote)
+    tables = sa.inspect(bind).get_table_names()
+    if 'user_friend_counts' not in tables:
+        op.create_table(
+            'user_friend_counts',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('friends', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id')
+        )
+        op.create_index('ix_user_friend_counts_friends', 'user_friend_counts', ['friends'])
+    if 'timeline_entries' not in tables:
+        op.create_table(
+            'timeline_entries',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('dream_id', sa.Integer(), nullable=False),
+            sa.Column('author_id', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['author_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['dream_id'], ['dreams.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('user_id', 'dream_id')
+        )
+        op.create_index('ix_timeline_user_created', 'timeline_entries', ['user_id', 'created_at', 'dream_id'])
+        op.create_index('ix_timeline_dream', 'timeline_entries', ['dream_id'])
+
+    # Amicizie già accettate: contatori e timeline
+    friends = """
+        SELECT requester_id AS user_id, addressee_id AS friend_id FROM friendships WHERE status = 'accepted'
+        UNION ALL
+        SELECT addressee_id, requester_id FROM friendships WHERE status = 'accepted'
+    """
+    if not bind.execute(sa.text('SELECT 1 FROM user_friend_counts LIMIT 1')).first():
+        op.execute(f"""
+            INSERT INTO user_friend_counts (user_id, friends)
+            SELECT user_id, COUNT(*) FROM ({friends}) f GROUP BY user_id
+        """)
+    if not bind.execute(sa.text('SELECT 1 FROM timeline_entries LIMIT 1')).first():
+        op.execute(f"""
+            INSERT INTO timeline_entries (user_id, dream_id, author_id, created_at)
+            SELECT f.user_id, d.id, d.user_id, d.created_at
+            FROM ({friends}) f JOIN dreams d ON d.user_id = f.friend_id
+            WHERE d.is_private = false
+        """)
+
+
+def downgrade():
+    op.drop_index('ix_timeline_dream', table_name='timeline_entries')
+    op.drop_index('ix_timeline_user_created', table_name='timeline_entries')
+    op.drop_table('timeline_entries')
+    op.drop_index('ix_user_friend_counts_friends', table_name='user_friend_counts')
+    op.drop_table('user_friend_counts')
@@ -0,0 +1,59 @@
+"""Add users.username_lower (indexed username search)
+
+Revision ID: e3c9a6d2f4b1
+Revises: d5e8f1a3b6c9
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3c9a6d2f4b1'
+down_revision = 'd5e8f1a3b6c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from project.models.user import User
+
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('users')}
+    if 'username_lower' not in columns:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('username_lower', sa.String(length=80), nullable=True))
+
+    # Normalizza gli username esistenti in Python (lower() di SQLite è solo ASCII), a blocchi
+    users = sa.table('users', sa.column('id', sa.Integer), sa.column('username', sa.String),
+                     sa.column('username_lower', sa.String))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(users.c.id, users.c.username)
+            .where(users.c.id > last_id, users.c.username_lower.is_(None))
+            .order_by(users.c.id).limit(1000)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            users.update().where(users.c.id == sa.bindparam('user_id')).values(
+                username_lower=sa.bindparam('new_username_lower')
+            ),
+            [{'user_id': row.id, 'new_username_lower': User.normalize_username(row.username)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+    indexes = {index['name'] for index in sa.inspect(bind).get_indexes('users')}
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('username_lower', existing_type=sa.String(length=80), nullable=False)
+        if 'ix_users_username_lower' not in indexes:
+            batch_op.create_index('ix_users_username_lower', ['username_lower'], unique=False,
+                                  postgresql_ops={'username_lower': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_username_lower')
+        batch_op.drop_column('username_lower')
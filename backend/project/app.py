@@ -1,15 +1,21 @@
 """
 Flask application factory
 """
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
 import os
 
 from config import config
-from project import db, jwt, cors, migrate, ma
-from project.routes import auth_bp, dreams_bp, users_bp
+from project import db, jwt, cors, migrate, ma, metrics, passwords
+from project.models import Tag, UserDreamStats
+from project.routes import auth_bp, dreams_bp, users_bp, batch_bp, friends_bp, feed_bp, events_bp
+from project.commands import register_commands
+from project.utils import (
+    search, security, ratelimit, sqlite_tuning, response_cache, json_provider, compression, nplusone,
+    user_search, events
+)
 
 
 def create_app(config_name=None):
@@ -23,22 +29,37 @@ def create_app(config_name=None):
     
     config_obj = config[config_name]
     app.config.from_object(config_obj)
+    json_provider.init_app(app)  # orjson per jsonify, se installato
     
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    sqlite_tuning.init_app(app)  # WAL e PRAGMA per i database SQLite su file
+    migrate.init_app(app, db, render_as_batch=True)  # batch mode: ALTER su SQLite
     jwt.init_app(app)
+    security.init_app(app)  # current_user dai token JWT, con cache
+    ratelimit.init_app(app)
+    passwords.init_app(app)  # bcrypt nel pool di processi, blocco dei login falliti
+    response_cache.init_app(app)  # invalidata dal segnale dreams_changed
+    events.init_app(app)  # notifiche per /api/events dai segnali dreams_changed/feed_changed
+    compression.init_app(app)  # gzip/brotli: registrato per primo, eseguito per ultimo
+    metrics.init_app(app)  # Server-Timing e istogrammi per /api/metrics
+    nplusone.init_app(app)  # query ripetute (N+1): log in sviluppo, errore nei test
     
     # CORS dinamico - ottieni gli origins dalla configurazione
     cors_origins = config_obj.get_cors_origins()
     print(f"🌐 CORS Origins configurati: {cors_origins}")
     cors.init_app(app, origins=cors_origins)
+    app.extensions['cors_origins'] = cors_origins  # per le route native ASGI
     ma.init_app(app)
     
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dreams_bp)
     app.register_blueprint(users_bp)
+    app.register_blueprint(batch_bp)
+    app.register_blueprint(friends_bp)
+    app.register_blueprint(feed_bp)
+    app.register_blueprint(events_bp)
 
     # CORS headers
     @app.after_request
@@ -52,11 +73,74 @@ def create_app(config_name=None):
     def health_check():
         return jsonify({'status': 'healthy'}), 200
     
+    def internal_access_denied():
+        """Response for /api/metrics and /api/cache/stats, None if access is allowed."""
+        token = app.config.get('METRICS_TOKEN')
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                return jsonify({'message': 'Unauthorized'}), 401
+        elif not app.config.get('METRICS_PUBLIC', True):
+            return jsonify({'message': 'Not found'}), 404
+        return None
+    
+    # Metriche Prometheus (per processo); METRICS_TOKEN le protegge con un bearer token,
+    # senza token in produzione non sono esposte
+    @app.route('/api/metrics', methods=['GET'])
+    def prometheus_metrics():
+        denied = internal_access_denied()
+        if denied:
+            return denied
+        return Response(metrics.expose_metrics(), mimetype='text/plain; version=0.0.4')
+    
+    # Hit/miss delle cache (per processo), stesso accesso di /api/metrics
+    @app.route('/api/cache/stats', methods=['GET'])
+    def cache_stats():
+        denied = internal_access_denied()
+        if denied:
+            return denied
+        return jsonify({
+            'responses': response_cache.response_cache.stats(),
+            'users': security.user_cache_stats(),
+            'compression': compression.compressor.stats()
+        }), 200
+    
     # Create tables
     with app.app_context():
         try:
             db.create_all()
         except Exception as e:
             print(f"Error creating tables: {e}")
+        
+        # create_all() non aggiunge colonne alle tabelle esistenti: servono le migrazioni
+        try:
+            inspector = db.inspect(db.engine)
+            for table in db.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                missing = [column.name for column in table.columns if column.name not in existing]
+                if missing:
+                    print(f"⚠️  Colonne mancanti in '{table.name}' ({', '.join(missing)}): esegui 'flask db upgrade'")
+        except Exception as e:
+            print(f"Error checking schema: {e}")
+        
+        # Popola dream_tags e user_dream_stats per i database creati prima di questi indici
+        try:
+            if Tag.needs_backfill():
+                print(f"🏷️  Indice tag popolato ({Tag.rebuild_index()} sogni)")
+            if UserDreamStats.needs_backfill():
+                print(f"📊 Statistiche utenti popolate ({UserDreamStats.rebuild()} bucket)")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error building indexes: {e}")
+    
+    # Full-text search index
+    search.init_app(app)
+    
+    # Ricerca utenti: indice trigrammi e indice username in memoria
+    user_search.init_app(app)
+    
+    # CLI commands (flask search rebuild, ...)
+    register_commands(app)
     
     return app
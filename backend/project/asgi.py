@@ -0,0 +1,390 @@
+"""
+ASGI serving mode: the Flask app behind an event loop (uvicorn)
+
+Connections are held by the event loop: idle keep-alive clients, slow
+uploads (the body is read before the view runs) and the time between
+requests cost no thread. A request takes a thread of a bounded pool
+(``ASGI_THREADS``) only while its Flask view runs, and bcrypt already runs
+in the password process pool. Routes registered with ``async_route`` are
+served on the loop itself, with the async engine (aiosqlite / asyncpg)
+from ``get_async_engine`` for their queries.
+
+Requires ``pip install -r requirements-asgi.txt`` (plus ``asyncpg`` for Postgres).
+"""
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+from flask_jwt_extended import decode_token
+from sqlalchemy import event, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import parse_date, parse_etags
+
+from project.app import create_app
+from project.models import Tag, User, UserJournal
+from project.passwords import hasher
+from project.utils import sqlite_tuning
+from project.utils.events import event_streams, format_event, stream_preamble, HEARTBEAT
+from project.utils.http import make_etag, validator_headers, validators_match
+
+# Driver async per dialetto (URL sincrono -> URL per create_async_engine)
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+# (metodo, path) -> handler nativo; registrati con async_route
+ROUTES = {}
+
+
+def async_route(path, methods=('GET',)):
+    """Serve ``path`` natively on the event loop in ASGI mode.
+
+    The handler is ``async def handler(app, scope, receive, send)`` with
+    ``app`` the Flask app; the WSGI app keeps serving the same path under
+    gunicorn or the development server.
+    """
+    def decorator(handler):
+        for method in methods:
+            ROUTES[(method, path)] = handler
+        return handler
+    return decorator
+
+
+def async_database_url(url):
+    """The async-driver equivalent of a SQLAlchemy URL (aiosqlite, asyncpg)."""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f'No async driver for {url.get_backend_name()!r}')
+    return url.set(drivername=driver)
+
+
+def get_async_engine(app):
+    """The app's async engine, created on first use (same database and PRAGMAs)."""
+    engine = app.extensions.get('async_engine')
+    if engine is None:
+        url = app.config.get('ASYNC_DATABASE_URL') or async_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        engine_options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        options = {'pool_pre_ping': engine_options.get('pool_pre_ping', True)}
+        if make_url(url).get_backend_name() != 'sqlite':
+            options['pool_size'] = app.config.get('ASYNC_DB_POOL_SIZE', 10)
+        engine = create_async_engine(url, **options)
+
+        pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+        if engine.dialect.name == 'sqlite' and pragmas:
+            ordered = dict(sorted(pragmas.items(), key=lambda item: item[0] != 'busy_timeout'))
+
+            @event.listens_for(engine.sync_engine, 'connect')
+            def set_sqlite_pragmas(dbapi_connection, connection_record):
+                sqlite_tuning.apply_pragmas(dbapi_connection, ordered)
+
+        app.extensions['async_engine'] = engine
+    return engine
+
+
+async def send_json(send, payload, status=200, headers=()):
+    """Send a complete JSON response from a native handler."""
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _cors_headers(app, scope):
+    """CORS headers for a native response (Flask-CORS only sees the WSGI routes)."""
+    origin = _header(scope, b'origin')
+    if origin and origin in app.extensions.get('cors_origins', ()):
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    return []
+
+
+async def _active_user_id(app, user_id):
+    async with get_async_engine(app).connect() as connection:
+        is_active = (await connection.execute(select(User.is_active).where(User.id == user_id))).scalar()
+    return user_id if is_active else None
+
+
+async def authenticate(app, scope):
+    """ID of the active user of the request's JWT (Authorization header), else None."""
+    authorization = _header(scope, b'authorization') or ''
+    if not authorization.startswith('Bearer '):
+        return None
+
+    try:
+        with app.app_context():
+            user_id = int(decode_token(authorization[len('Bearer '):])['sub'])
+    except Exception:
+        return None
+    return await _active_user_id(app, user_id)
+
+
+async def authenticate_stream(app, scope):
+    """ID of the active user of a ``?ticket=`` (consumed) or of the Authorization header."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if 'ticket' not in query:
+        return await authenticate(app, scope)
+    # Con redis il riscatto è una richiesta di rete: fuori dal loop
+    user_id = await asyncio.get_running_loop().run_in_executor(
+        None, event_streams.redeem_ticket, query['ticket'][0]
+    )
+    if user_id is None:
+        return None
+    return await _active_user_id(app, user_id)
+
+
+def build_environ(scope, body):
+    """WSGI environ (PEP 3333) for an ASGI HTTP scope and its buffered body."""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    path_info = scope['path'].encode('utf-8').decode('latin-1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        # Header ripetuti: uniti con una virgola (RFC 9110)
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """WSGI app behind ASGI: the body is read on the loop, the view runs in ``executor``.
+
+    Each request takes a thread of the bounded pool only while the Flask
+    view runs and its response is sent; the chunks of a streamed response
+    are sent one at a time, each waiting for the loop to hand it to the
+    client.
+    """
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return  # client andato via prima della fine del body
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.run_wsgi_app, scope, body, send, loop)
+
+    def run_wsgi_app(self, scope, body, send, loop):
+        """Run the view in the current (pool) thread and send its response."""
+        def sync_send(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {'start': None, 'started': False}
+
+        def send_start():
+            if not response['started']:
+                response['started'] = True
+                sync_send(response['start'])
+
+        def write(data):
+            send_start()
+            sync_send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and response['started']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+            return write
+
+        iterable = self.wsgi_app(build_environ(scope, body), start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    write(chunk)
+            send_start()
+            sync_send({'type': 'http.response.body'})
+        finally:
+            # Es. call_on_close delle risposte in streaming
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+class AsgiApp:
+    """ASGI application: native routes on the loop, everything else via WSGI."""
+
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('ASGI_THREADS', 32), thread_name_prefix='wsgi'
+        )
+        self.wsgi = WsgiBridge(app, self.executor)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return None
+        handler = ROUTES.get((scope['method'], scope['path']))
+        if handler is not None:
+            return await handler(self.app, scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    # Driver async mancante o database irraggiungibile: errore all'avvio
+                    async with get_async_engine(self.app).connect() as connection:
+                        await connection.exec_driver_sql('SELECT 1')
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def shutdown(self):
+        engine = self.app.extensions.pop('async_engine', None)
+        if engine is not None:
+            await engine.dispose()
+        await asyncio.get_running_loop().run_in_executor(None, hasher.shutdown)
+        self.executor.shutdown(wait=False)
+
+
+@async_route('/api/health')
+async def health_check(app, scope, receive, send):
+    """Health check without a thread: answers even when the pool is saturated."""
+    await send_json(send, {'status': 'healthy'})
+
+
+@async_route('/api/dreams/tags')
+async def dream_tags(app, scope, receive, send):
+    """Tag cloud read through the async engine (same body and ETag as the Flask view)."""
+    cors = _cors_headers(app, scope)
+    user_id = await authenticate(app, scope)
+    if user_id is None:
+        return await send_json(send, {'message': 'Missing or invalid token'}, 401, cors)
+
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        limit = max(1, min(int(query['limit'][0]), 200))
+    except (KeyError, ValueError):
+        limit = None
+
+    async with get_async_engine(app).connect() as connection:
+        state = (await connection.execute(UserJournal.state_statement(user_id))).first()
+        version, last_modified = state if state is not None else (0, None)
+        etag = make_etag('j', user_id, version, 'tags')
+        headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in validator_headers(etag, last_modified).items()
+        ] + cors
+
+        if validators_match(parse_etags(_header(scope, b'if-none-match')),
+                            parse_date(_header(scope, b'if-modified-since')), etag, last_modified):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+            return await send({'type': 'http.response.body', 'body': b''})
+
+        counts = (await connection.execute(Tag.counts_statement(user_id, limit))).all()
+
+    await send_json(send, {
+        'tags': [{'name': name, 'count': count} for name, count in counts],
+        'count': len(counts)
+    }, headers=headers)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+@async_route('/api/events')
+async def event_stream(app, scope, receive, send):
+    """SSE stream on the loop: an idle client costs a subscription, not a thread."""
+    cors = _cors_headers(app, scope)
+    if not event_streams.enabled:
+        return await send_json(send, {'message': 'Event stream disabled'}, 404, cors)
+    user_id = await authenticate_stream(app, scope)
+    if user_id is None:
+        return await send_json(send, {'message': 'Invalid or expired ticket'}, 401, cors)
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    subscription = event_streams.subscribe(user_id, wake=lambda: loop.call_soon_threadsafe(ready.set))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *cors
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': stream_preamble(event_streams.retry_ms), 'more_body': True})
+        while not disconnected.done():
+            waiter = asyncio.ensure_future(ready.wait())
+            await asyncio.wait({waiter, disconnected}, timeout=event_streams.heartbeat,
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if disconnected.done():
+                break
+            ready.clear()
+            events = subscription.drain()
+            body = b''.join(format_event(name, data) for name, data in events) if events else HEARTBEAT
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        event_streams.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+def create_asgi_app(config_name=None):
+    """Create the Flask app and wrap it for an ASGI server."""
+    return AsgiApp(create_app(config_name))
@@ -0,0 +1,87 @@
+"""
+Flask CLI commands for database maintenance
+"""
+import click
+from flask.cli import AppGroup
+
+from project import db
+
+search_cli = AppGroup('search', help='Full-text search index maintenance.')
+tags_cli = AppGroup('tags', help='Tag index maintenance.')
+stats_cli = AppGroup('stats', help='Per-user statistics maintenance.')
+audit_cli = AppGroup('audit', help='Query plan audit.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search_index():
+    """Rebuild the full-text indexes of dreams and usernames."""
+    from project.utils.search import get_search_backend
+    from project.utils.user_search import get_user_search_backend
+
+    backend = get_search_backend()
+    backend.rebuild()
+    user_backend = get_user_search_backend()
+    user_backend.rebuild()
+    db.session.commit()
+    click.echo(f"✅ Indice di ricerca '{backend.name}' ricostruito")
+    click.echo(f"✅ Indice utenti '{user_backend.name}' ricostruito")
+
+
+@tags_cli.command('rebuild')
+def rebuild_tags_index():
+    """Rebuild the dream_tags table from the tags column of every dream."""
+    from project.models import Tag
+
+    total = Tag.rebuild_index()
+    click.echo(f"✅ Indice tag ricostruito ({total} sogni con tag)")
+
+
+@stats_cli.command('rebuild')
+@click.option('--user-id', type=int, default=None, help='Rebuild a single user only.')
+def rebuild_user_stats(user_id):
+    """Recompute the user_dream_stats counters from the dreams table."""
+    from project.models import UserDreamStats
+
+    total = UserDreamStats.rebuild(user_id=user_id)
+    click.echo(f"✅ Statistiche ricostruite ({total} bucket)")
+
+
+@audit_cli.command('queries')
+@click.option('--verbose', '-v', is_flag=True, help='Print every statement with its plan.')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if a full-table scan is found.')
+def audit_queries(verbose, strict):
+    """EXPLAIN QUERY PLAN every query issued by the blueprints and flag full scans."""
+    from flask import current_app
+    from project.app import create_app
+    from project.utils.query_audit import audit, uncovered_routes
+
+    # Il workload gira su un database in memoria, i piani sul database configurato
+    scratch_app = create_app('testing')
+    report = audit(scratch_app)
+
+    full_scans = 0
+    for entry in report:
+        flagged = entry['findings']
+        full_scans += sum(1 for kind, _ in flagged if kind == 'full-scan')
+        if not flagged and not verbose:
+            continue
+        marker = '❌' if any(kind == 'full-scan' for kind, _ in flagged) else ('⚠️ ' if flagged else '✅')
+        click.echo(f"{marker} {entry['endpoint']} [{entry['status']}]")
+        click.echo(f"   {entry['statement'][:200]}")
+        for line in entry['plan']:
+            click.echo(f"     {line}")
+
+    for route in uncovered_routes(current_app):
+        click.echo(f"⚠️  Route non coperta dal workload: {route}")
+
+    click.echo(f"\n{len(report)} query analizzate, {full_scans} full table scan")
+    if strict and full_scans:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    """Register CLI command groups on the app."""
+    app.cli.add_command(search_cli)
+    app.cli.add_command(tags_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(audit_cli)
@@ -0,0 +1,259 @@
+"""
+Request instrumentation: wall/SQL/serialization/bcrypt time per request
+
+Every request collects its phase timings (``timed('serialize')``, SQL via
+cursor events) and answers with a ``Server-Timing`` header; the same values
+feed per-process histograms exported in Prometheus text format at
+``/api/metrics``.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import request, has_request_context
+from sqlalchemy import event
+
+_ENVIRON_KEY = 'dream_keeper.timings'
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Fasi riportate in Server-Timing e negli istogrammi
+PHASES = ('db', 'serialize', 'bcrypt')
+
+
+class RequestTimings:
+    """Accumulated phase durations (seconds) and SQL count of one request."""
+
+    __slots__ = ('start', 'phases', 'queries')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+def current_timings():
+    """Timings of the current request (each batch sub-request has its own), or None."""
+    if not has_request_context():
+        return None
+    return request.environ.get(_ENVIRON_KEY)
+
+
+@contextmanager
+def timed(phase):
+    """Add the duration of the block to ``phase`` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings()
+        if timings is not None:
+            timings.add(phase, time.perf_counter() - start)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (Prometheus semantics)."""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, (counts, total, count) in series:
+                labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+                prefix = f'{labels},' if labels else ''
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return '\n'.join(lines)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = ','.join(f'{name}="{_escape(label)}"' for name, label in zip(self.labelnames, key))
+                lines.append(f'{self.name}{{{labels}}} {value}' if labels else f'{self.name} {value}')
+        return '\n'.join(lines)
+
+
+class Gauge:
+    """Value read from a callback at scrape time (queue depth, pool size...)."""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def clear(self):
+        pass
+
+    def expose(self):
+        return '\n'.join([
+            f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge',
+            f'{self.name} {self.callback()}'
+        ])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Wall time of HTTP requests.',
+    ('method', 'endpoint', 'status'), DURATION_BUCKETS
+)
+request_queries = Histogram(
+    'http_request_sql_queries', 'SQL statements executed per HTTP request.',
+    ('method', 'endpoint'), QUERY_BUCKETS
+)
+request_phase = Histogram(
+    'http_request_phase_seconds', 'Time spent per request in db, serialize and bcrypt.',
+    ('method', 'endpoint', 'phase'), DURATION_BUCKETS
+)
+COLLECTORS = [request_duration, request_queries, request_phase]
+
+
+def register(collector):
+    """Add a Histogram/Counter/Gauge of another module to /api/metrics."""
+    if collector not in COLLECTORS:
+        COLLECTORS.append(collector)
+    return collector
+
+
+def expose_metrics():
+    """All collectors in Prometheus text exposition format."""
+    return '\n'.join(collector.expose() for collector in COLLECTORS) + '\n'
+
+
+def reset_metrics():
+    for collector in COLLECTORS:
+        collector.clear()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    timings = current_timings()
+    if timings is not None:
+        timings.queries += 1
+        timings.add('db', elapsed)
+
+
+def _discard_failed_query(exception_context):
+    connection = exception_context.connection
+    starts = connection.info.get('query_start') if connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _start_timer():
+    request.environ[_ENVIRON_KEY] = RequestTimings()
+
+
+def _server_timing_header(timings, total):
+    parts = [f'app;dur={total * 1000:.1f}']
+    for phase in PHASES:
+        if phase in timings.phases:
+            entry = f'{phase};dur={timings.phases[phase] * 1000:.1f}'
+            if phase == 'db':
+                entry += f';desc="{timings.queries} queries"'
+            parts.append(entry)
+    return ', '.join(parts)
+
+
+def _record_request(response):
+    timings = current_timings()
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings.start
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    response.headers['Server-Timing'] = _server_timing_header(timings, total)
+    request_duration.observe(total, method=request.method, endpoint=endpoint, status=str(response.status_code))
+    request_queries.observe(timings.queries, method=request.method, endpoint=endpoint)
+    for phase in PHASES:
+        request_phase.observe(timings.phases.get(phase, 0.0), method=request.method, endpoint=endpoint, phase=phase)
+    return response
+
+
+def _instrument_json_provider(app):
+    provider = app.json
+    original = provider.response
+
+    def response(*args, **kwargs):
+        with timed('serialize'):
+            return original(*args, **kwargs)
+
+    provider.response = response
+
+
+def init_app(app):
+    """Install the request hooks, SQL cursor events and JSON timing."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    _instrument_json_provider(app)
+
+    with app.app_context():
+        from project import db
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _discard_failed_query)
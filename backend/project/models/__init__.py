@@ -3,5 +3,18 @@ Models initialization
 """
 from .user import User
 from .dream import Dream
+from .friend import Friendship, UserFriendCount
+from .tag import Tag, dream_tags, register_tag_events
+from .stats import UserDreamStats, register_stats_events
+from .journal import UserJournal, register_journal_events
+from .timeline import TimelineEntry, register_timeline_events
+from project.signals import register_dream_signals
 
-__all__ = ['User', 'Dream']
+register_tag_events(Dream)
+register_stats_events(Dream, User)
+register_journal_events(Dream, User)
+register_timeline_events(Dream, User)
+register_dream_signals(Dream)
+
+__all__ = ['User', 'Dream', 'Friendship', 'Tag', 'dream_tags', 'UserDreamStats', 'UserJournal',
+           'UserFriendCount', 'TimelineEntry']
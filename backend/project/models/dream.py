@@ -1,18 +1,30 @@
 """
 Dream model for storing user dreams
 """
+import re
 from datetime import datetime
+from sqlalchemy.orm import validates, load_only
 from project import db
 
 
+# Anteprima mostrata nelle liste al posto del contenuto completo
+EXCERPT_LENGTH = 200
+
+
 class Dream(db.Model):
     """Dream model for storing user dreams."""
     
     __tablename__ = 'dreams'
+    __table_args__ = (
+        # Listing utente ordinato per data (offset e keyset pagination); l'indice
+        # viene letto all'indietro per ORDER BY date_dreamed DESC, id DESC
+        db.Index('ix_dreams_user_date_id', 'user_id', 'date_dreamed', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    excerpt = db.Column(db.String(EXCERPT_LENGTH + 1))  # calcolato da content
     date_dreamed = db.Column(db.Date, nullable=False)
     mood = db.Column(db.String(50))  # happy, sad, scary, weird, etc.
     is_lucid = db.Column(db.Boolean, default=False)
@@ -35,6 +47,29 @@ class Dream(db.Model):
         self.tags = tags
         self.is_private = is_private
     
+    @validates('content')
+    def _update_excerpt(self, key, content):
+        """Keep the stored excerpt in sync with every content assignment."""
+        self.excerpt = Dream.make_excerpt(content)
+        return content
+    
+    @staticmethod
+    def make_excerpt(content, length=EXCERPT_LENGTH):
+        """First ``length`` characters of the content, cut on a word boundary."""
+        text = re.sub(r'\s+', ' ', content or '').strip()
+        if len(text) <= length:
+            return text
+        cut = text[:length]
+        if ' ' in cut[length // 2:]:
+            cut = cut[:cut.rindex(' ')]
+        return cut.rstrip(' ,.;:') + '…'
+    
+    @staticmethod
+    def load_columns(attributes):
+        """Loader option reading only the given attributes (plus the listing keys)."""
+        names = set(attributes) | {'id', 'date_dreamed', 'user_id'}
+        return load_only(*[getattr(Dream, name) for name in sorted(names)])
+    
     def save_to_db(self):
         """Save dream to database."""
         db.session.add(self)
@@ -50,6 +85,71 @@ class Dream(db.Model):
         self.updated_at = datetime.utcnow()
         db.session.commit()
     
+    @staticmethod
+    def bulk_insert(user_id, items, chunk_size=500):
+        """Insert many dreams for a user in chunked transactions.
+        
+        `items` are dicts as loaded by DreamSchema. Each chunk is one multi-row
+        INSERT ... RETURNING plus batched dream_tags and stats updates, committed
+        together with the journal version and the friends' timelines (mapper
+        events do not fire for Core inserts). Returns the new IDs.
+        """
+        from .tag import Tag
+        from .stats import UserDreamStats
+        from .journal import UserJournal
+        from .timeline import TimelineEntry
+        from project.signals import record_dream_changes, record_feed_changes
+        
+        table = Dream.__table__
+        new_ids = []
+        for start in range(0, len(items), chunk_size):
+            now = datetime.utcnow()
+            rows = []
+            for item in items[start:start + chunk_size]:
+                tags = item.get('tags')
+                rows.append({
+                    'title': item['title'],
+                    'content': item['content'],
+                    'excerpt': Dream.make_excerpt(item['content']),
+                    'date_dreamed': item['date_dreamed'],
+                    'mood': item.get('mood'),
+                    'is_lucid': item.get('is_lucid', False),
+                    'tags': ', '.join(tags) if tags else None,
+                    'is_private': item.get('is_private', True),
+                    'created_at': now,
+                    'updated_at': now,
+                    'user_id': user_id,
+                })
+            
+            try:
+                connection = db.session.connection()
+                ids = connection.execute(
+                    db.insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                    rows
+                ).scalars().all()
+                
+                Tag.link_many(connection, [
+                    (dream_id, user_id, row['tags']) for dream_id, row in zip(ids, rows)
+                ])
+                
+                deltas = {}
+                for row in rows:
+                    for bucket in UserDreamStats.buckets_for(row['date_dreamed'], row['is_lucid'], row['mood']):
+                        deltas[bucket] = deltas.get(bucket, 0) + 1
+                UserDreamStats.apply_deltas(connection, user_id, deltas)
+                UserJournal.bump(connection, user_id, now=now)
+                shared = [(dream_id, now) for dream_id, row in zip(ids, rows) if not row['is_private']]
+                readers = TimelineEntry.fan_out(connection, user_id, shared)
+                record_dream_changes(db.session(), user_id, [('insert', dream_id) for dream_id in ids])
+                record_feed_changes(db.session(), readers, [dream_id for dream_id, _ in shared])
+                
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            new_ids.extend(ids)
+        return new_ids
+    
     @staticmethod
     def find_by_id(dream_id):
         """Find dream by ID."""
@@ -64,16 +164,59 @@ class Dream(db.Model):
         return query.all()
     
     @staticmethod
-    def search_user_dreams(user_id, search_term):
-        """Search dreams by user ID and search term."""
-        return Dream.query.filter(
+    def search_user_dreams(user_id, search_term, columns=None):
+        """Search dreams by user ID and search term, most relevant first.
+        
+        ``columns`` limits the attributes loaded (see load_columns).
+        """
+        from project.utils.search import get_search_backend
+
+        query = Dream.query.filter(Dream.user_id == user_id)
+        if columns is not None:
+            query = query.options(Dream.load_columns(columns))
+        return get_search_backend().search(query, search_term).all()
+    
+    @staticmethod
+    def aggregate_user_stats(user_id, top_tags=10):
+        """Aggregate a user's dream statistics with GROUP BY queries.
+        
+        Only the mood, date_dreamed, is_lucid and tags columns are read, so
+        memory grows with the number of groups instead of the number of dreams.
+        """
+        from sqlalchemy import func, extract, case
+        from .tag import Tag
+        
+        totals = db.session.query(
+            func.count(Dream.id),
+            func.coalesce(func.sum(case((Dream.is_lucid == True, 1), else_=0)), 0)
+        ).filter(Dream.user_id == user_id).one()
+        
+        # Mood distribution
+        mood_rows = db.session.query(Dream.mood, func.count(Dream.id)).filter(
             Dream.user_id == user_id,
-            db.or_(
-                Dream.title.contains(search_term),
-                Dream.content.contains(search_term),
-                Dream.tags.contains(search_term)
-            )
-        ).order_by(Dream.date_dreamed.desc()).all()
+            Dream.mood.isnot(None),
+            Dream.mood != ''
+        ).group_by(Dream.mood).all()
+        
+        # Dreams by month
+        year = extract('year', Dream.date_dreamed)
+        month = extract('month', Dream.date_dreamed)
+        month_rows = db.session.query(year, month, func.count(Dream.id)).filter(
+            Dream.user_id == user_id
+        ).group_by(year, month).all()
+        
+        # Tag frequencies dall'indice dream_tags
+        most_common_tags = Tag.counts_for_user(user_id, limit=top_tags)
+        
+        return {
+            'total_dreams': totals[0],
+            'lucid_dreams': int(totals[1]),
+            'mood_distribution': {mood: count for mood, count in mood_rows},
+            'dreams_by_month': {
+                f'{int(y):04d}-{int(m):02d}': count for y, m, count in month_rows
+            },
+            'most_common_tags': most_common_tags
+        }
     
     def get_tags_list(self):
         """Get tags as a list."""
@@ -89,20 +232,9 @@ class Dream(db.Model):
             self.tags = None
     
     def to_dict(self):
-        """Convert dream to dictionary."""
-        return {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'date_dreamed': self.date_dreamed.isoformat(),
-            'mood': self.mood,
-            'is_lucid': self.is_lucid,
-            'tags': self.get_tags_list(),
-            'is_private': self.is_private,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'user_id': self.user_id
-        }
+        """Convert dream to dictionary (same output as DreamSchema)."""
+        from project.serializers import serialize_dream
+        return serialize_dream(self)
     
     def __repr__(self):
         return f'<Dream {self.title} by User {self.user_id}>'
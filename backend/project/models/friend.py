@@ -2,15 +2,21 @@
 Friend model for managing friendships in the DreamKeeper application.
 """
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, update, insert, union_all
 from project import db
-import bcrypt
+from project.signals import record_feed_changes
 
 class Friendship(db.Model):
     """Friend model for managing friendships."""
-    
+
     __tablename__ = 'friendships'
-    
+    __table_args__ = (
+        db.Index('uq_friendships_requester_addressee', 'requester_id', 'addressee_id', unique=True),
+        # Richieste inviate / ricevute filtrate per stato
+        db.Index('ix_friendships_requester_status', 'requester_id', 'status'),
+        db.Index('ix_friendships_addressee_status', 'addressee_id', 'status'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     requester_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     addressee_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -18,12 +24,140 @@ class Friendship(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relationships - usa le COLONNE, non le variabili
-    requester = db.relationship('User', foreign_keys=[requester_id], backref='sent_friend_requests')
-    addressee = db.relationship('User', foreign_keys=[addressee_id], backref='received_friend_requests')
-    
+    # Relationships - usa le COLONNE, non le variabili.
+    # raise_on_sql: gli utenti vanno caricati esplicitamente (joinedload)
+    requester = db.relationship('User', foreign_keys=[requester_id], lazy='raise_on_sql',
+                                backref=db.backref('sent_friend_requests', lazy='raise_on_sql'))
+    addressee = db.relationship('User', foreign_keys=[addressee_id], lazy='raise_on_sql',
+                                backref=db.backref('received_friend_requests', lazy='raise_on_sql'))
+
     def __init__(self, requester_id, addressee_id, status='pending'):
         """Initialize friendship."""
         self.requester_id = requester_id
         self.addressee_id = addressee_id
-        self.status = status
\ No newline at end of file
+        self.status = status
+
+    def other_user_id(self, user_id):
+        """ID of the other side of the friendship."""
+        return self.addressee_id if self.requester_id == user_id else self.requester_id
+
+    @staticmethod
+    def find_by_id(friendship_id):
+        """Find friendship by ID."""
+        return db.session.get(Friendship, friendship_id)
+
+    @staticmethod
+    def find_between(user_id, other_id):
+        """The friendship row between two users, in either direction (or None)."""
+        return Friendship.query.filter(db.or_(
+            db.and_(Friendship.requester_id == user_id, Friendship.addressee_id == other_id),
+            db.and_(Friendship.requester_id == other_id, Friendship.addressee_id == user_id),
+        )).first()
+
+    @staticmethod
+    def friend_ids_select(user_id):
+        """SELECT of the accepted friends' IDs (one index range per direction)."""
+        table = Friendship.__table__
+        return union_all(
+            select(table.c.addressee_id.label('friend_id')).where(
+                table.c.requester_id == user_id, table.c.status == 'accepted'
+            ),
+            select(table.c.requester_id.label('friend_id')).where(
+                table.c.addressee_id == user_id, table.c.status == 'accepted'
+            ),
+        )
+
+    @staticmethod
+    def friend_ids(user_id, connection=None):
+        """IDs of the accepted friends of a user."""
+        executor = connection if connection is not None else db.session
+        return executor.execute(Friendship.friend_ids_select(user_id)).scalars().all()
+
+    def accept(self):
+        """Accept a pending request: counters and both timelines in one transaction."""
+        from .timeline import TimelineEntry
+
+        self.status = 'accepted'
+        db.session.flush()
+        connection = db.session.connection()
+        UserFriendCount.adjust(connection, [self.requester_id, self.addressee_id], 1)
+        TimelineEntry.backfill(connection, self.requester_id, self.addressee_id)
+        TimelineEntry.backfill(connection, self.addressee_id, self.requester_id)
+        record_feed_changes(db.session(), [self.requester_id, self.addressee_id], [])
+        db.session.commit()
+
+    def delete_from_db(self):
+        """Remove the friendship (unfriend or cancelled request)."""
+        from .timeline import TimelineEntry
+
+        if self.status == 'accepted':
+            connection = db.session.connection()
+            UserFriendCount.adjust(connection, [self.requester_id, self.addressee_id], -1)
+            TimelineEntry.remove_between(connection, self.requester_id, self.addressee_id)
+        db.session.delete(self)
+        db.session.commit()
+
+    def save_to_db(self):
+        """Save friendship to database."""
+        db.session.add(self)
+        db.session.commit()
+
+    def to_dict(self):
+        """Convert friendship to dictionary."""
+        return {
+            'id': self.id,
+            'requester_id': self.requester_id,
+            'addressee_id': self.addressee_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<Friendship {self.requester_id}->{self.addressee_id} {self.status}>'
+
+
+class UserFriendCount(db.Model):
+    """Accepted friends per user, kept in step with accept/unfriend.
+
+    Decides at write time whether a dream is fanned out to the friends'
+    timelines, and at read time which friends are read with fan-in.
+    """
+
+    __tablename__ = 'user_friend_counts'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    friends = db.Column(db.Integer, default=0, nullable=False, index=True)
+
+    @staticmethod
+    def adjust(connection, user_ids, delta):
+        """Atomically add ``delta`` to the friend count of each user."""
+        table = UserFriendCount.__table__
+        for user_id in user_ids:
+            result = connection.execute(
+                update(table).where(table.c.user_id == user_id).values(friends=table.c.friends + delta)
+            )
+            if not result.rowcount:
+                connection.execute(insert(table).values(user_id=user_id, friends=max(delta, 0)))
+
+    @staticmethod
+    def count_for(user_id, connection=None):
+        """Accepted friends of a user (primary-key read)."""
+        executor = connection if connection is not None else db.session
+        count = executor.execute(
+            select(UserFriendCount.friends).where(UserFriendCount.user_id == user_id)
+        ).scalar()
+        return count or 0
+
+    @staticmethod
+    def large_friend_ids(user_id, threshold):
+        """Friends of ``user_id`` with at least ``threshold`` friends (read with fan-in)."""
+        friends = Friendship.friend_ids_select(user_id).subquery()
+        return db.session.execute(
+            select(UserFriendCount.user_id)
+            .join(friends, friends.c.friend_id == UserFriendCount.user_id)
+            .where(UserFriendCount.friends >= threshold)
+        ).scalars().all()
+
+    def __repr__(self):
+        return f'<UserFriendCount {self.user_id}: {self.friends}>'
@@ -0,0 +1,80 @@
+"""
+Per-user journal version, bumped on every dream write (HTTP validators)
+"""
+from datetime import datetime
+from sqlalchemy import event, select, delete, insert, update
+from project import db
+
+
+class UserJournal(db.Model):
+    """One row per user: a version counter and the time of the last dream write.
+
+    Every insert/update/delete of a dream bumps ``version`` in the same flush,
+    so ETag / Last-Modified of the journal endpoints are a primary-key read.
+    """
+
+    __tablename__ = 'user_journals'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @staticmethod
+    def bump(connection, user_id, steps=1, now=None):
+        """Atomically add ``steps`` to a user's journal version."""
+        table = UserJournal.__table__
+        now = now or datetime.utcnow()
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(table).values(user_id=user_id, version=steps, updated_at=now)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={'version': table.c.version + steps, 'updated_at': now}
+            )
+            connection.execute(stmt)
+            return
+
+        result = connection.execute(
+            update(table).where(table.c.user_id == user_id).values(
+                version=table.c.version + steps, updated_at=now
+            )
+        )
+        if not result.rowcount:
+            connection.execute(insert(table).values(user_id=user_id, version=steps, updated_at=now))
+
+    @staticmethod
+    def state_statement(user_id):
+        """SELECT of (version, updated_at) for a user."""
+        return select(UserJournal.version, UserJournal.updated_at).where(UserJournal.user_id == user_id)
+
+    @staticmethod
+    def get_state(user_id):
+        """Return (version, updated_at) for a user; (0, None) if never written."""
+        row = db.session.execute(UserJournal.state_statement(user_id)).first()
+        if row is None:
+            return 0, None
+        return row.version, row.updated_at
+
+    def __repr__(self):
+        return f'<UserJournal {self.user_id} v{self.version}>'
+
+
+def _bump_after_write(mapper, connection, target):
+    UserJournal.bump(connection, target.user_id)
+
+
+def _journal_user_deleted(mapper, connection, target):
+    table = UserJournal.__table__
+    connection.execute(delete(table).where(table.c.user_id == target.id))
+
+
+def register_journal_events(dream_model, user_model):
+    """Bump the owner's journal version in the same flush as every dream write."""
+    event.listen(dream_model, 'after_insert', _bump_after_write)
+    event.listen(dream_model, 'after_update', _bump_after_write)
+    event.listen(dream_model, 'after_delete', _bump_after_write)
+    event.listen(user_model, 'before_delete', _journal_user_deleted)
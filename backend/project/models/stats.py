@@ -0,0 +1,233 @@
+"""
+Per-user dream statistics, maintained incrementally on every dream write
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, select, delete, insert, update, func, extract, case
+from project import db
+
+
+# Oltre questo orizzonte i bucket giornalieri non servono più (thisWeek usa 7 giorni)
+DAY_BUCKET_DAYS = 31
+
+
+class UserDreamStats(db.Model):
+    """Counter buckets per user: one row per (user_id, bucket).
+
+    Buckets are ``total``, ``lucid``, ``month:YYYY-MM``, ``day:YYYY-MM-DD``
+    (recent days only) and ``mood:<mood>``, so the whole summary of a user is
+    a single primary-key range read.
+    """
+
+    __tablename__ = 'user_dream_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bucket = db.Column(db.String(64), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def day_cutoff(today=None):
+        """Oldest day that still gets a day bucket."""
+        return (today or date.today()) - timedelta(days=DAY_BUCKET_DAYS)
+
+    @staticmethod
+    def buckets_for(date_dreamed, is_lucid, mood, today=None):
+        """Return the buckets a dream with these values counts towards."""
+        buckets = ['total']
+        if is_lucid:
+            buckets.append('lucid')
+        if mood:
+            buckets.append(f'mood:{mood}')
+        if date_dreamed:
+            buckets.append(f'month:{date_dreamed:%Y-%m}')
+            if date_dreamed >= UserDreamStats.day_cutoff(today):
+                buckets.append(f'day:{date_dreamed.isoformat()}')
+        return buckets
+
+    @staticmethod
+    def apply_deltas(connection, user_id, deltas):
+        """Atomically add {bucket: delta} to a user's counters."""
+        rows = [
+            {'user_id': user_id, 'bucket': bucket, 'count': delta}
+            for bucket, delta in deltas.items() if delta
+        ]
+        if not rows:
+            return
+
+        table = UserDreamStats.__table__
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.bucket],
+                set_={'count': table.c.count + stmt.excluded['count']}
+            )
+            connection.execute(stmt, rows)
+        else:
+            for row in rows:
+                result = connection.execute(
+                    update(table).where(
+                        table.c.user_id == user_id,
+                        table.c.bucket == row['bucket']
+                    ).values(count=table.c.count + row['count'])
+                )
+                if not result.rowcount:
+                    connection.execute(insert(table), [row])
+
+        # Elimina i bucket azzerati e quelli giornalieri usciti dall'orizzonte
+        connection.execute(delete(table).where(
+            table.c.user_id == user_id,
+            db.or_(
+                table.c.count <= 0,
+                db.and_(
+                    table.c.bucket >= 'day:',
+                    table.c.bucket < f'day:{UserDreamStats.day_cutoff().isoformat()}'
+                )
+            )
+        ))
+
+    @staticmethod
+    def get_for_user(user_id):
+        """Return {bucket: count} for a user (single primary-key range read)."""
+        rows = db.session.execute(
+            select(UserDreamStats.bucket, UserDreamStats.count).where(
+                UserDreamStats.user_id == user_id
+            )
+        ).all()
+        return {bucket: count for bucket, count in rows}
+
+    @staticmethod
+    def summary_for_user(user_id, today=None):
+        """Return the /api/auth/stats payload for a user."""
+        buckets = UserDreamStats.get_for_user(user_id)
+        today = today or datetime.now().date()
+        week_start = f'day:{(today - timedelta(days=7)).isoformat()}'
+
+        return {
+            'total': buckets.get('total', 0),
+            'thisMonth': buckets.get(f'month:{today:%Y-%m}', 0),
+            'thisWeek': sum(
+                count for bucket, count in buckets.items()
+                if bucket.startswith('day:') and bucket >= week_start
+            ),
+            'lucid': buckets.get('lucid', 0)
+        }
+
+    @staticmethod
+    def needs_backfill():
+        """True if there are dreams but no statistics rows at all."""
+        from .dream import Dream
+
+        if db.session.query(select(UserDreamStats.user_id).exists()).scalar():
+            return False
+        return db.session.query(select(Dream.id).exists()).scalar()
+
+    @staticmethod
+    def rebuild(user_id=None):
+        """Recompute the counters from the dreams table (all users or one)."""
+        from .dream import Dream
+
+        table = UserDreamStats.__table__
+        stmt = delete(table)
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        db.session.execute(stmt)
+
+        def scoped(query):
+            if user_id is not None:
+                query = query.filter(Dream.user_id == user_id)
+            return query
+
+        rows = []
+        totals = scoped(db.session.query(
+            Dream.user_id,
+            func.count(Dream.id),
+            func.coalesce(func.sum(case((Dream.is_lucid == True, 1), else_=0)), 0)
+        )).group_by(Dream.user_id)
+        for uid, total, lucid in totals:
+            rows.append({'user_id': uid, 'bucket': 'total', 'count': total})
+            if lucid:
+                rows.append({'user_id': uid, 'bucket': 'lucid', 'count': int(lucid)})
+
+        year = extract('year', Dream.date_dreamed)
+        month = extract('month', Dream.date_dreamed)
+        months = scoped(db.session.query(
+            Dream.user_id, year, month, func.count(Dream.id)
+        )).group_by(Dream.user_id, year, month)
+        for uid, y, m, count in months:
+            rows.append({'user_id': uid, 'bucket': f'month:{int(y):04d}-{int(m):02d}', 'count': count})
+
+        moods = scoped(db.session.query(
+            Dream.user_id, Dream.mood, func.count(Dream.id)
+        ).filter(Dream.mood.isnot(None), Dream.mood != '')).group_by(Dream.user_id, Dream.mood)
+        for uid, mood, count in moods:
+            rows.append({'user_id': uid, 'bucket': f'mood:{mood}', 'count': count})
+
+        days = scoped(db.session.query(
+            Dream.user_id, Dream.date_dreamed, func.count(Dream.id)
+        ).filter(Dream.date_dreamed >= UserDreamStats.day_cutoff())).group_by(Dream.user_id, Dream.date_dreamed)
+        for uid, day, count in days:
+            rows.append({'user_id': uid, 'bucket': f'day:{day.isoformat()}', 'count': count})
+
+        for start in range(0, len(rows), 1000):
+            db.session.execute(insert(table), rows[start:start + 1000])
+        db.session.commit()
+        return len(rows)
+
+    def __repr__(self):
+        return f'<UserDreamStats {self.user_id} {self.bucket}={self.count}>'
+
+
+def _previous_value(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return state.attrs[attr].value
+
+
+def _stats_after_insert(mapper, connection, target):
+    deltas = {bucket: 1 for bucket in UserDreamStats.buckets_for(
+        target.date_dreamed, target.is_lucid, target.mood
+    )}
+    UserDreamStats.apply_deltas(connection, target.user_id, deltas)
+
+
+def _stats_after_update(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in ('date_dreamed', 'is_lucid', 'mood')):
+        return
+
+    deltas = {}
+    old_buckets = UserDreamStats.buckets_for(
+        _previous_value(state, 'date_dreamed'),
+        _previous_value(state, 'is_lucid'),
+        _previous_value(state, 'mood')
+    )
+    for bucket in old_buckets:
+        deltas[bucket] = deltas.get(bucket, 0) - 1
+    for bucket in UserDreamStats.buckets_for(target.date_dreamed, target.is_lucid, target.mood):
+        deltas[bucket] = deltas.get(bucket, 0) + 1
+    UserDreamStats.apply_deltas(connection, target.user_id, deltas)
+
+
+def _stats_after_delete(mapper, connection, target):
+    deltas = {bucket: -1 for bucket in UserDreamStats.buckets_for(
+        target.date_dreamed, target.is_lucid, target.mood
+    )}
+    UserDreamStats.apply_deltas(connection, target.user_id, deltas)
+
+
+def _stats_user_deleted(mapper, connection, target):
+    table = UserDreamStats.__table__
+    connection.execute(delete(table).where(table.c.user_id == target.id))
+
+
+def register_stats_events(dream_model, user_model):
+    """Update the counters in the same flush as every dream insert/update/delete."""
+    event.listen(dream_model, 'after_insert', _stats_after_insert)
+    event.listen(dream_model, 'after_update', _stats_after_update)
+    event.listen(dream_model, 'after_delete', _stats_after_delete)
+    event.listen(user_model, 'before_delete', _stats_user_deleted)
@@ -0,0 +1,179 @@
+"""
+Tag model and dream/tag association table
+"""
+from sqlalchemy import event, select, delete, insert, func
+from project import db
+
+
+# Associazione sogno <-> tag. user_id è denormalizzato così che conteggi e
+# filtri per utente usino solo l'indice composito, senza toccare `dreams`.
+dream_tags = db.Table(
+    'dream_tags',
+    db.Column('dream_id', db.Integer, db.ForeignKey('dreams.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), nullable=False),
+    db.Index('ix_dream_tags_user_tag_dream', 'user_id', 'tag_id', 'dream_id'),
+)
+
+
+class Tag(db.Model):
+    """Tag model: one row per distinct (normalized) tag name."""
+
+    __tablename__ = 'tags'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False, index=True)
+
+    def __init__(self, name):
+        """Initialize tag."""
+        self.name = Tag.normalize(name)
+
+    @staticmethod
+    def normalize(name):
+        """Normalize a tag name (trimmed, lowercase)."""
+        return (name or '').strip().lower()
+
+    @staticmethod
+    def normalize_list(names):
+        """Normalize a list of tag names, dropping empties and duplicates."""
+        normalized = []
+        for name in names or []:
+            name = Tag.normalize(name)
+            if name and name not in normalized:
+                normalized.append(name)
+        return normalized
+
+    @staticmethod
+    def get_or_create_ids(connection, names):
+        """Return {name: id} for the given normalized names, creating missing tags."""
+        if not names:
+            return {}
+        tags_table = Tag.__table__
+        existing = dict(connection.execute(
+            select(tags_table.c.name, tags_table.c.id).where(tags_table.c.name.in_(names))
+        ).all())
+        missing = [name for name in names if name not in existing]
+        if missing:
+            connection.execute(insert(tags_table), [{'name': name} for name in missing])
+            existing.update(connection.execute(
+                select(tags_table.c.name, tags_table.c.id).where(tags_table.c.name.in_(missing))
+            ).all())
+        return existing
+
+    @staticmethod
+    def sync_dream_tags(connection, dream_id, user_id, tags_string):
+        """Replace the association rows of a dream from its comma-separated tags."""
+        connection.execute(delete(dream_tags).where(dream_tags.c.dream_id == dream_id))
+        names = Tag.normalize_list((tags_string or '').split(','))
+        tag_ids = Tag.get_or_create_ids(connection, names)
+        if tag_ids:
+            connection.execute(insert(dream_tags), [
+                {'dream_id': dream_id, 'tag_id': tag_ids[name], 'user_id': user_id}
+                for name in names
+            ])
+
+    @staticmethod
+    def link_many(connection, dreams):
+        """Insert association rows for new dreams: [(dream_id, user_id, tags_string)]."""
+        parsed = [
+            (dream_id, user_id, Tag.normalize_list((tags_string or '').split(',')))
+            for dream_id, user_id, tags_string in dreams
+        ]
+        all_names = sorted({name for _, _, names in parsed for name in names})
+        tag_ids = Tag.get_or_create_ids(connection, all_names)
+        rows = [
+            {'dream_id': dream_id, 'tag_id': tag_ids[name], 'user_id': user_id}
+            for dream_id, user_id, names in parsed for name in names
+        ]
+        if rows:
+            connection.execute(insert(dream_tags), rows)
+        return len(rows)
+
+    @staticmethod
+    def dream_ids_with_tag(user_id, name):
+        """Subquery of the user's dream IDs carrying the given tag."""
+        return select(dream_tags.c.dream_id).join(
+            Tag, Tag.id == dream_tags.c.tag_id
+        ).where(
+            dream_tags.c.user_id == user_id,
+            Tag.name == Tag.normalize(name)
+        )
+
+    @staticmethod
+    def counts_statement(user_id, limit=None):
+        """SELECT of (name, count) for a user's tags, most used first."""
+        count = func.count(dream_tags.c.dream_id)
+        query = select(Tag.name, count).join(
+            dream_tags, dream_tags.c.tag_id == Tag.id
+        ).where(
+            dream_tags.c.user_id == user_id
+        ).group_by(Tag.id, Tag.name).order_by(count.desc(), Tag.name)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def counts_for_user(user_id, limit=None):
+        """Return [(name, count), ...] for a user's tags, most used first."""
+        return [(name, total) for name, total in db.session.execute(Tag.counts_statement(user_id, limit))]
+
+    @staticmethod
+    def needs_backfill():
+        """True if dreams have tags but the association table is empty."""
+        from .dream import Dream
+
+        has_links = db.session.query(select(dream_tags.c.dream_id).exists()).scalar()
+        if has_links:
+            return False
+        return db.session.query(
+            select(Dream.id).where(Dream.tags.isnot(None), Dream.tags != '').exists()
+        ).scalar()
+
+    @staticmethod
+    def rebuild_index():
+        """Rebuild dream_tags from the tags column of every dream."""
+        from .dream import Dream
+
+        connection = db.session.connection()
+        connection.execute(delete(dream_tags))
+        total = 0
+        last_id = 0
+        while True:
+            # Keyset a blocchi per non materializzare tutta la tabella
+            rows = db.session.query(Dream.id, Dream.user_id, Dream.tags).filter(
+                Dream.id > last_id,
+                Dream.tags.isnot(None),
+                Dream.tags != ''
+            ).order_by(Dream.id).limit(1000).all()
+            if not rows:
+                break
+            for dream_id, user_id, tags in rows:
+                Tag.sync_dream_tags(connection, dream_id, user_id, tags)
+            total += len(rows)
+            last_id = rows[-1][0]
+        db.session.commit()
+        return total
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+
+def _sync_tags_after_insert(mapper, connection, target):
+    Tag.sync_dream_tags(connection, target.id, target.user_id, target.tags)
+
+
+def _sync_tags_after_update(mapper, connection, target):
+    history = db.inspect(target).attrs.tags.history
+    if history.has_changes():
+        Tag.sync_dream_tags(connection, target.id, target.user_id, target.tags)
+
+
+def _delete_tags_after_delete(mapper, connection, target):
+    connection.execute(delete(dream_tags).where(dream_tags.c.dream_id == target.id))
+
+
+def register_tag_events(dream_model):
+    """Keep dream_tags in sync with every ORM insert/update/delete of a Dream."""
+    event.listen(dream_model, 'after_insert', _sync_tags_after_insert)
+    event.listen(dream_model, 'after_update', _sync_tags_after_update)
+    event.listen(dream_model, 'after_delete', _delete_tags_after_delete)
@@ -0,0 +1,178 @@
+"""
+Precomputed friends' feed: one timeline row per (reader, shared dream)
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, delete, insert
+from sqlalchemy.orm import Session
+from project import db
+from project.signals import record_feed_changes
+
+# Default se la configurazione non è disponibile (es. script senza app)
+FANOUT_THRESHOLD = 1000
+BACKFILL_LIMIT = 200
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+class TimelineEntry(db.Model):
+    """A non-private dream of a friend, copied into the reader's timeline.
+
+    Dreams of authors with fewer than ``FEED_FANOUT_THRESHOLD`` friends are
+    fanned out here when they are written (same flush, like tags and stats),
+    so a feed page is one range scan of ``ix_timeline_user_created``. Authors
+    above the threshold are not fanned out: their dreams are merged in at
+    read time (fan-in) by ``feed_positions``.
+    """
+
+    __tablename__ = 'timeline_entries'
+    __table_args__ = (
+        db.Index('ix_timeline_user_created', 'user_id', 'created_at', 'dream_id'),
+        db.Index('ix_timeline_dream', 'dream_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    dream_id = db.Column(db.Integer, db.ForeignKey('dreams.id', ondelete='CASCADE'), primary_key=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # created_at del sogno
+
+    @staticmethod
+    def fans_out(connection, author_id):
+        """Whether the author's dreams are pushed to the friends' timelines."""
+        from .friend import UserFriendCount
+
+        threshold = _setting('FEED_FANOUT_THRESHOLD', FANOUT_THRESHOLD)
+        return UserFriendCount.count_for(author_id, connection) < threshold
+
+    @staticmethod
+    def fan_out(connection, author_id, dreams):
+        """Copy [(dream_id, created_at)] of an author into every friend's timeline.
+
+        Returns the IDs of the friends whose timeline received the dreams.
+        """
+        from .friend import Friendship
+
+        if not dreams or not TimelineEntry.fans_out(connection, author_id):
+            return []
+        friend_ids = Friendship.friend_ids(author_id, connection)
+        rows = [
+            {'user_id': friend_id, 'dream_id': dream_id, 'author_id': author_id, 'created_at': created_at}
+            for friend_id in friend_ids for dream_id, created_at in dreams
+        ]
+        if rows:
+            connection.execute(insert(TimelineEntry.__table__), rows)
+        return friend_ids
+
+    @staticmethod
+    def remove_dreams(connection, dream_ids):
+        """Drop dreams from every timeline (deleted or made private)."""
+        table = TimelineEntry.__table__
+        connection.execute(delete(table).where(table.c.dream_id.in_(dream_ids)))
+
+    @staticmethod
+    def backfill(connection, reader_id, author_id):
+        """Copy the latest shared dreams of a new friend into the reader's timeline."""
+        from .dream import Dream
+
+        if not TimelineEntry.fans_out(connection, author_id):
+            return
+        limit = _setting('FEED_BACKFILL_LIMIT', BACKFILL_LIMIT)
+        recent = select(
+            db.literal(reader_id), Dream.id, Dream.user_id, Dream.created_at
+        ).where(
+            Dream.user_id == author_id, Dream.is_private.is_(False)
+        ).order_by(Dream.created_at.desc(), Dream.id.desc()).limit(limit)
+        table = TimelineEntry.__table__
+        connection.execute(insert(table).from_select(
+            [table.c.user_id, table.c.dream_id, table.c.author_id, table.c.created_at], recent
+        ))
+
+    @staticmethod
+    def remove_between(connection, user_id, other_id):
+        """Drop each user's dreams from the other's timeline (unfriend)."""
+        table = TimelineEntry.__table__
+        connection.execute(delete(table).where(db.or_(
+            db.and_(table.c.user_id == user_id, table.c.author_id == other_id),
+            db.and_(table.c.user_id == other_id, table.c.author_id == user_id),
+        )))
+
+    @staticmethod
+    def feed_positions(user_id, limit, before=None):
+        """Newest ``limit`` (created_at, dream_id) of the user's feed, older than ``before``.
+
+        Timeline rows (fan-out) merged with the shared dreams of the friends
+        above the fan-out threshold (fan-in), newest first.
+        """
+        from .dream import Dream
+        from .friend import UserFriendCount
+
+        table = TimelineEntry.__table__
+        query = select(table.c.created_at, table.c.dream_id).where(table.c.user_id == user_id)
+        if before is not None:
+            query = query.where(db.tuple_(table.c.created_at, table.c.dream_id) < before)
+        positions = db.session.execute(
+            query.order_by(table.c.created_at.desc(), table.c.dream_id.desc()).limit(limit)
+        ).all()
+
+        threshold = _setting('FEED_FANOUT_THRESHOLD', FANOUT_THRESHOLD)
+        large_friends = UserFriendCount.large_friend_ids(user_id, threshold)
+        if large_friends:
+            query = select(Dream.created_at, Dream.id).where(
+                Dream.user_id.in_(large_friends), Dream.is_private.is_(False)
+            )
+            if before is not None:
+                query = query.where(db.tuple_(Dream.created_at, Dream.id) < before)
+            fanned_in = db.session.execute(
+                query.order_by(Dream.created_at.desc(), Dream.id.desc()).limit(limit)
+            ).all()
+            # Un autore può aver superato la soglia dopo aver già fatto fan-out
+            positions = sorted({tuple(row) for row in positions} | {tuple(row) for row in fanned_in}, reverse=True)
+
+        return [tuple(row) for row in positions[:limit]]
+
+    def __repr__(self):
+        return f'<TimelineEntry {self.user_id} <- {self.dream_id}>'
+
+
+def _fan_out_and_notify(connection, target):
+    readers = TimelineEntry.fan_out(connection, target.user_id, [(target.id, target.created_at)])
+    session = Session.object_session(target)
+    if readers and session is not None:
+        record_feed_changes(session, readers, [target.id])
+
+
+def _fan_out_after_insert(mapper, connection, target):
+    if not target.is_private:
+        _fan_out_and_notify(connection, target)
+
+
+def _sync_after_update(mapper, connection, target):
+    history = db.inspect(target).attrs.is_private.history
+    if not history.has_changes():
+        return
+    if target.is_private:
+        TimelineEntry.remove_dreams(connection, [target.id])
+    else:
+        _fan_out_and_notify(connection, target)
+
+
+def _remove_after_delete(mapper, connection, target):
+    TimelineEntry.remove_dreams(connection, [target.id])
+
+
+def _timeline_user_deleted(mapper, connection, target):
+    from .friend import UserFriendCount
+
+    table = TimelineEntry.__table__
+    connection.execute(delete(table).where(table.c.user_id == target.id))
+    counts = UserFriendCount.__table__
+    connection.execute(delete(counts).where(counts.c.user_id == target.id))
+
+
+def register_timeline_events(dream_model, user_model):
+    """Keep the timelines in step with every dream write, in the same flush."""
+    event.listen(dream_model, 'after_insert', _fan_out_after_insert)
+    event.listen(dream_model, 'after_update', _sync_after_update)
+    event.listen(dream_model, 'after_delete', _remove_after_delete)
+    event.listen(user_model, 'before_delete', _timeline_user_deleted)
@@ -2,26 +2,37 @@
 User model for authentication and user management
 """
 from datetime import datetime
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from project import db
-import bcrypt
+from project.passwords import hasher
 
 
 class User(db.Model):
     """User model for authentication."""
     
     __tablename__ = 'users'
+    __table_args__ = (
+        # Prefissi: range scan su SQLite, LIKE 'abc%' su Postgres (pattern_ops)
+        db.Index('ix_users_username_lower', 'username_lower',
+                 postgresql_ops={'username_lower': 'varchar_pattern_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    # Username normalizzato per la ricerca: range sull'indice per i prefissi
+    username_lower = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(128), nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Relationship with dreams
-    dreams = db.relationship('Dream', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relationship with dreams. Nessun caricamento implicito: leggere i sogni
+    # (o l'utente da un sogno) in un ciclo genererebbe una query per elemento,
+    # usare query esplicite o joinedload/selectinload
+    dreams = db.relationship('Dream', backref=db.backref('user', lazy='raise_on_sql'),
+                             lazy='raise_on_sql', cascade='all, delete-orphan')
     
     def __init__(self, username, email, password):
         """Initialize user with hashed password."""
@@ -29,15 +40,32 @@ class User(db.Model):
         self.email = email
         self.set_password(password)
     
+    @validates('username')
+    def _normalize_username(self, key, username):
+        self.username_lower = User.normalize_username(username)
+        return username
+    
+    @staticmethod
+    def normalize_username(username):
+        """Lowercase form stored in username_lower and used by the user search."""
+        return (username or '').strip().lower()
+    
     def set_password(self, password):
         """Hash and set password."""
-        # Using bcrypt for stronger password hashing
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        # bcrypt nel pool di processi, costo da BCRYPT_ROUNDS
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
         """Check if provided password matches hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return hasher.check(password, self.password_hash)
+    
+    def rehash_password_if_needed(self, password):
+        """After a successful login, re-hash with the current BCRYPT_ROUNDS if it changed."""
+        if not hasher.needs_rehash(self.password_hash):
+            return False
+        self.set_password(password)
+        db.session.commit()
+        return True
     
     @staticmethod
     def find_by_username(username):
@@ -65,42 +93,10 @@ class User(db.Model):
         db.session.commit()
 
     def get_stats(self):
-        """Get user statistics."""
-        from datetime import datetime, timedelta
-        from sqlalchemy import func, extract
-        from .dream import Dream  # Import del modello Dream
+        """Get user statistics (read from the user_dream_stats counters)."""
+        from .stats import UserDreamStats
         
-        # Statistiche di base
-        total_dreams = len(self.dreams)
-        
-        # Sogni di questo mese
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        dreams_this_month = db.session.query(func.count(Dream.id)).filter(
-            Dream.user_id == self.id,
-            extract('month', Dream.date_dreamed) == current_month,
-            extract('year', Dream.date_dreamed) == current_year
-        ).scalar() or 0
-        
-        # Sogni lucidi
-        lucid_dreams = db.session.query(func.count(Dream.id)).filter(
-            Dream.user_id == self.id,
-            Dream.is_lucid == True
-        ).scalar() or 0
-        
-        # Sogni degli ultimi 7 giorni
-        week_ago = datetime.now() - timedelta(days=7)
-        dreams_this_week = db.session.query(func.count(Dream.id)).filter(
-            Dream.user_id == self.id,
-            Dream.date_dreamed >= week_ago.date()
-        ).scalar() or 0
-        
-        return {
-            'total': total_dreams,
-            'thisMonth': dreams_this_month,
-            'thisWeek': dreams_this_week,
-            'lucid': lucid_dreams
-        }
+        return UserDreamStats.summary_for_user(self.id)
 
     def to_dict(self):
         """Convert user to dictionary (without password)."""
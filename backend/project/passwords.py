@@ -0,0 +1,210 @@
+"""
+bcrypt hashing in a bounded process pool, configurable cost, login throttling
+
+bcrypt is CPU-bound by design (~250ms at cost 12): run inline it pins a
+worker thread and competes for the CPU with every other request. Here hashes
+and checks go to a small ProcessPoolExecutor (``PASSWORD_POOL_WORKERS``, 0 =
+inline) with at most ``PASSWORD_POOL_MAX_PENDING`` jobs queued or running;
+beyond that PasswordHasherBusy is raised and the route answers 503, so a
+login burst is shed instead of starving the rest of the API.
+
+``BCRYPT_ROUNDS`` sets the work factor of new hashes; hashes with a different
+cost are upgraded on the next successful login (``needs_rehash``). Repeated
+failed logins per account+IP and per IP are counted with the rate limiter and
+rejected before any bcrypt work (``LOGIN_MAX_FAILURES*``).
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from project.metrics import Histogram, Counter, Gauge, DURATION_BUCKETS, register, timed
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes queued: retry later (HTTP 503)."""
+
+
+def _hash_job(password, rounds):
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    return hashed, time.perf_counter() - start
+
+
+def _check_job(password, hashed):
+    start = time.perf_counter()
+    matches = bcrypt.checkpw(password, hashed)
+    return matches, time.perf_counter() - start
+
+
+hash_seconds = register(Histogram(
+    'password_hash_seconds', 'bcrypt time per operation, in the pool worker.',
+    ('operation',), DURATION_BUCKETS
+))
+queue_seconds = register(Histogram(
+    'password_hash_queue_seconds', 'Time bcrypt jobs waited for a pool worker.',
+    ('operation',), DURATION_BUCKETS
+))
+rejections = register(Counter(
+    'password_hash_rejected_total', 'Password operations refused (pool full, throttled login).',
+    ('reason',)
+))
+
+
+class PasswordHasher:
+    """Settings, pool and counters of the password hashing."""
+
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 0  # 0 = inline, nessun processo
+        self.max_pending = 32
+        self.timeout = 10.0
+        self.start_method = 'spawn'
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def configure(self, rounds=12, workers=0, max_pending=32, timeout=10.0, start_method='spawn'):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.start_method = start_method
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.shutdown()
+
+    def _executor(self):
+        # Dopo il fork di gunicorn (preload_app) il pool del master non è
+        # utilizzabile: ogni processo crea il proprio al primo uso
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, slots):
+        with self._lock:
+            self.pending -= 1
+        slots.release()
+
+    def _run(self, operation, job, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            rejections.inc(reason='pool_full')
+            raise PasswordHasherBusy('Too many password operations in progress')
+        with self._lock:
+            self.pending += 1
+
+        if self.workers > 0:
+            try:
+                future = self._executor().submit(job, *args)
+            except Exception:
+                self._release(slots)
+                raise
+            # Lo slot si libera quando il job termina davvero: dopo un timeout
+            # bcrypt continua a girare nel pool e occupa ancora un processo
+            future.add_done_callback(lambda _: self._release(slots))
+            with timed('bcrypt'):
+                start = time.perf_counter()
+                try:
+                    result, elapsed = future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    future.cancel()  # ancora in coda: non verrà eseguito
+                    rejections.inc(reason='timeout')
+                    raise PasswordHasherBusy('Password hashing timed out')
+                total = time.perf_counter() - start
+        else:
+            try:
+                with timed('bcrypt'):
+                    start = time.perf_counter()
+                    result, elapsed = job(*args)
+                    total = time.perf_counter() - start
+            finally:
+                self._release(slots)
+        hash_seconds.observe(elapsed, operation=operation)
+        queue_seconds.observe(max(0.0, total - elapsed), operation=operation)
+        return result
+
+    def hash(self, password):
+        """bcrypt hash (str) of a password with the configured cost."""
+        hashed = self._run('hash', _hash_job, password.encode('utf-8'), self.rounds)
+        return hashed.decode('utf-8')
+
+    def check(self, password, hashed):
+        """Whether ``password`` matches the bcrypt ``hashed``."""
+        return self._run('check', _check_job, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """Whether a hash was made with a different cost than BCRYPT_ROUNDS."""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+hasher = PasswordHasher()
+register(Gauge('password_hash_pending', 'Password jobs queued or running in this process.',
+               lambda: hasher.pending))
+
+
+class LoginThrottle:
+    """Failed-login counters on the shared rate limiter (memory, sqlite, redis)."""
+
+    def __init__(self):
+        self.max_failures = 5
+        self.max_failures_per_ip = 20
+        self.window = 900
+
+    def _keys(self, email, ip):
+        return (
+            (f'login-fail:{(email or "").strip().lower()}:{ip}', self.max_failures),
+            (f'login-fail-ip:{ip}', self.max_failures_per_ip),
+        )
+
+    def blocked(self, email, ip):
+        """Seconds to wait if too many recent failures, else 0 (no bcrypt, no query)."""
+        from project.utils.ratelimit import limiter
+
+        for key, limit in self._keys(email, ip):
+            # cost=0: legge il contatore senza incrementarlo
+            result = limiter.hit(key, limit - 1, self.window, cost=0)
+            if not result.allowed:
+                rejections.inc(reason='throttled')
+                return max(1, int(result.reset_after))
+        return 0
+
+    def record_failure(self, email, ip):
+        from project.utils.ratelimit import limiter
+
+        for key, limit in self._keys(email, ip):
+            limiter.hit(key, limit, self.window)
+
+
+login_throttle = LoginThrottle()
+
+
+def init_app(app):
+    """Configure hashing and login throttling from the app config."""
+    hasher.configure(
+        rounds=app.config.get('BCRYPT_ROUNDS', 12),
+        workers=app.config.get('PASSWORD_POOL_WORKERS', 0),
+        max_pending=app.config.get('PASSWORD_POOL_MAX_PENDING', 32),
+        timeout=app.config.get('PASSWORD_POOL_TIMEOUT', 10.0),
+        start_method=app.config.get('PASSWORD_POOL_START_METHOD', 'spawn'),
+    )
+    login_throttle.max_failures = app.config.get('LOGIN_MAX_FAILURES', 5)
+    login_throttle.max_failures_per_ip = app.config.get('LOGIN_MAX_FAILURES_PER_IP', 20)
+    login_throttle.window = app.config.get('LOGIN_FAILURE_WINDOW', 900)
+    return hasher
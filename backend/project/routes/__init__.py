@@ -4,5 +4,8 @@ Routes initialization
 from .auth import auth_bp
 from .dreams import dreams_bp
 from .users import users_bp
+from .batch import batch_bp
+from .friends import friends_bp, feed_bp
+from .events import events_bp
 
-__all__ = ['auth_bp', 'dreams_bp', 'users_bp']
+__all__ = ['auth_bp', 'dreams_bp', 'users_bp', 'batch_bp', 'friends_bp', 'feed_bp', 'events_bp']
@@ -1,9 +1,13 @@
 """
 Authentication routes - VERSIONE SEMPLICE CON FLASK-JWT-EXTENDED
 """
+from datetime import date
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from project.models import User
+from flask_jwt_extended import create_access_token, jwt_required, current_user
+from project.models import User, UserDreamStats
+from project.passwords import login_throttle, PasswordHasherBusy
+from project.utils.response_cache import cached_response
+from project.utils.http import journal_validators, is_not_modified, with_validators, not_modified
 from project import db
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -20,11 +24,22 @@ def login():
         if not email or not password:
             return jsonify({'message': 'Email e password richiesti'}), 400
         
+        # Troppi tentativi falliti di recente: risposta immediata, niente bcrypt
+        retry_after = login_throttle.blocked(email, request.remote_addr)
+        if retry_after:
+            return jsonify({'message': 'Troppi tentativi falliti, riprova più tardi'}), 429, {
+                'Retry-After': str(retry_after)
+            }
+        
         # Trova utente
         user = User.find_by_email(email)
         if not user or not user.check_password(password):
+            login_throttle.record_failure(email, request.remote_addr)
             return jsonify({'message': 'Credenziali non valide'}), 401
         
+        # Costo bcrypt cambiato (BCRYPT_ROUNDS): aggiorna l'hash ora che la password è nota
+        user.rehash_password_if_needed(password)
+        
         # Crea token - usa STRINGA per l'identity
         token = create_access_token(identity=str(user.id))
         
@@ -38,6 +53,8 @@ def login():
             }
         }), 200
         
+    except PasswordHasherBusy:
+        return jsonify({'message': 'Server occupato, riprova tra poco'}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(f"🚨 Errore login: {str(e)}")
         return jsonify({'message': f'Errore interno'}), 500
@@ -48,19 +65,13 @@ def login():
 def get_me():
     """Ottieni info utente corrente."""
     try:
-        # Flask-JWT-Extended fa tutto automaticamente!
-        user_id = int(get_jwt_identity())
-        user = User.find_by_id(user_id)
-        
-        if not user:
-            return jsonify({'message': 'Utente non trovato'}), 404
-        
+        # current_user arriva dalla cache delle identità (nessuna query)
         return jsonify({
             'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'created_at': user.created_at.isoformat()
+                'id': current_user.id,
+                'username': current_user.username,
+                'email': current_user.email,
+                'created_at': current_user.created_at.isoformat()
             }
         }), 200
         
@@ -105,24 +116,26 @@ def register():
             }
         }), 201
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return jsonify({'message': 'Server occupato, riprova tra poco'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Errore interno'}), 500
 
 @auth_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_user_stats():
     """Get user statistics."""
     try:
-        user_id = int(get_jwt_identity())
-        user = User.find_by_id(user_id)
-        print(f"User ID: {user_id}, User: {user}")
+        # thisWeek/thisMonth dipendono dalla data: niente Last-Modified, ETag con il giorno
+        etag, _ = journal_validators(current_user.id, 'summary', date.today().isoformat())
+        if is_not_modified(etag):
+            return not_modified(etag)
         
-        if not user:
-            return jsonify({'message': 'User not found'}), 404
-
-        stats = user.get_stats()
-        return jsonify(stats), 200
+        stats = UserDreamStats.summary_for_user(current_user.id)
+        return with_validators(jsonify(stats), etag), 200
         
     except Exception as e:
         print(f"Errore nel recupero statistiche: {e}")
@@ -0,0 +1,112 @@
+"""
+Batch route: several API calls in one HTTP request
+"""
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from werkzeug.test import EnvironBuilder
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api/batch')
+
+BATCH_MAX_REQUESTS = 20
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# Header che il client può passare a una sotto-richiesta / che vengono restituiti
+FORWARDED_HEADERS = ('If-None-Match', 'If-Modified-Since')
+RETURNED_HEADERS = ('ETag', 'Last-Modified', 'Location', 'Retry-After', 'X-Cache')
+
+# Risposte in streaming senza fine prevista (export, eventi): non bufferizzabili.
+# Le altre risposte "streamed" (es. gli errori HTTP di werkzeug) si leggono per intero
+STREAMING_MIMETYPES = ('text/csv', 'application/x-ndjson', 'text/event-stream')
+
+
+def _validate_item(index, item):
+    """Return an error message for an invalid sub-request, or None."""
+    if not isinstance(item, dict):
+        return f'Request {index} must be an object'
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if method not in BATCH_METHODS:
+        return f'Request {index}: unsupported method {method}'
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return f'Request {index}: path must start with /api/'
+    if path.split('?')[0].rstrip('/') == batch_bp.url_prefix:
+        return f'Request {index}: nested batch requests are not allowed'
+    if path.split('?')[0].rstrip('/') == '/api/events':
+        return f'Request {index}: event streams cannot be batched'
+    if 'body' in item and item['body'] is not None and not isinstance(item['body'], (dict, list)):
+        return f'Request {index}: body must be a JSON object or array'
+    return None
+
+
+def _run_subrequest(item, authorization):
+    """Dispatch one sub-request inside the current app context.
+
+    The request context pushed here reuses the active app context, so `g`,
+    the SQLAlchemy session (and its identity map) and the cached user are
+    shared by every call of the batch.
+    """
+    headers = {name: item['headers'][name] for name in FORWARDED_HEADERS
+               if isinstance(item.get('headers'), dict) and name in item['headers']}
+    if authorization:
+        headers['Authorization'] = authorization
+
+    builder = EnvironBuilder(
+        path=item['path'],
+        method=str(item.get('method', 'GET')).upper(),
+        json=item.get('body'),
+        headers=headers,
+        environ_base={'REMOTE_ADDR': request.remote_addr},
+    )
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+
+    with current_app.request_context(environ):
+        response = current_app.full_dispatch_request()
+        if response.is_streamed and response.mimetype in STREAMING_MIMETYPES:
+            response.close()
+            return {'status': 400, 'headers': {}, 'body': {
+                'message': 'Streaming responses are not supported in a batch'
+            }}
+        body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        result = {
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in RETURNED_HEADERS if name in response.headers},
+            'body': body if body != '' else None,
+        }
+        response.close()
+    return result
+
+
+@batch_bp.route('', methods=['POST'])
+@jwt_required()
+def run_batch():
+    """Execute up to BATCH_MAX_REQUESTS API calls in order and return all results."""
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('requests')
+        if not isinstance(items, list) or not items:
+            return jsonify({'message': 'requests must be a non-empty list'}), 400
+        if len(items) > BATCH_MAX_REQUESTS:
+            return jsonify({'message': f'Too many requests in one batch (max {BATCH_MAX_REQUESTS})'}), 413
+
+        errors = [error for error in (_validate_item(i, item) for i, item in enumerate(items)) if error]
+        if errors:
+            return jsonify({'message': 'Validation error', 'errors': errors}), 400
+
+        authorization = request.headers.get('Authorization')
+        responses = []
+        for index, item in enumerate(items):
+            try:
+                result = _run_subrequest(item, authorization)
+            except Exception as e:
+                current_app.logger.exception('Batch sub-request failed')
+                result = {'status': 500, 'headers': {}, 'body': {'message': 'Internal error', 'error': str(e)}}
+            result['id'] = item.get('id', index)
+            responses.append(result)
+
+        return jsonify({'responses': responses}), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Batch failed', 'error': str(e)}), 500
@@ -1,31 +1,47 @@
 """
 Dreams routes for CRUD operations on user dreams - VERSIONE SEMPLICE
 """
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import csv
+import io
+import json
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, current_user
 from marshmallow import ValidationError
 from datetime import datetime, date
 
-from project.models import Dream, User
+from project.models import Dream, Tag
 from project.schemas import dream_schema, dreams_schema, dream_update_schema
+from project.serializers import serialize_dream, serialize_dreams, dream_serializer, DREAM_FIELDS
 from project.utils.security import rate_limit_check
+from project.utils.search import get_search_backend
+from project.utils.pagination import paginate_by_cursor, InvalidCursor
+from project.utils.response_cache import cached_response
+from project.utils.json_provider import dumps_line
+from project.utils.http import (
+    make_etag, journal_validators, is_not_modified, with_validators, not_modified
+)
 from project import db
 
 dreams_bp = Blueprint('dreams', __name__, url_prefix='/api/dreams')
 
 
+def _requested_fields():
+    """Parse ?fields=title,excerpt,... (id always included); None = all fields."""
+    raw = request.args.get('fields', '').strip()
+    if not raw:
+        return None
+    fields = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = sorted(fields - set(DREAM_FIELDS))
+    if unknown:
+        raise ValidationError({'fields': [f'Unknown fields: {", ".join(unknown)}']})
+    return fields | {'id'}
+
+
 @dreams_bp.route('', methods=['POST'])
 @jwt_required()
 def create_dream():
     """Create a new dream."""
     try:
-        # Flask-JWT-Extended fa tutto automaticamente!
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         if not rate_limit_check(current_user.id, 'create_dream', limit=20, window=3600):
             return jsonify({'message': 'Too many dreams created. Please try again later.'}), 429
         
@@ -51,7 +67,7 @@ def create_dream():
         
         return jsonify({
             'message': 'Dream created successfully',
-            'dream': dream_schema.dump(dream)
+            'dream': serialize_dream(dream)
         }), 201
         
     except ValidationError as e:
@@ -63,44 +79,65 @@ def create_dream():
 
 @dreams_bp.route('', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_user_dreams():
     """Get all dreams for the current user."""
     try:
-        # Flask-JWT-Extended fa tutto automaticamente!
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         # Get query parameters
         page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 10, type=int), 50)  # Max 50 per page
+        per_page = max(1, min(request.args.get('per_page', 10, type=int), 50))  # Da 1 a 50 per pagina
         search = request.args.get('search', '').strip()
+        tags = [tag for tag in request.args.getlist('tag') if tag.strip()]
+        fields = _requested_fields()  # ?fields= per le liste: niente content
+        
+        # Diario invariato dall'ultima richiesta: 304 senza query né serializzazione
+        etag, last_modified = journal_validators(current_user.id)
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
         
         # Build query
         query = Dream.query.filter_by(user_id=current_user.id)
+        if fields is not None:
+            query = query.options(Dream.load_columns(fields))  # content non letto
         
-        # Add search filter
+        # Add search filter (full-text index)
         if search:
-            query = query.filter(
-                db.or_(
-                    Dream.title.contains(search),
-                    Dream.content.contains(search),
-                    Dream.tags.contains(search)
+            query = get_search_backend().filter(query, search)
+        
+        # Add tag filter (dream_tags index), più tag = tutti richiesti
+        for tag in tags:
+            query = query.filter(Dream.id.in_(Tag.dream_ids_with_tag(current_user.id, tag)))
+        
+        # Cursor mode (?cursor= presente, anche vuoto per la prima pagina):
+        # niente COUNT(*) né OFFSET, solo next_cursor
+        if 'cursor' in request.args:
+            try:
+                dreams, next_cursor = paginate_by_cursor(
+                    query, Dream.date_dreamed, Dream.id,
+                    request.args.get('cursor', '').strip(), per_page
                 )
-            )
+            except InvalidCursor:
+                return jsonify({'message': 'Invalid cursor'}), 400
+            
+            return with_validators(jsonify({
+                'dreams': serialize_dreams(dreams, fields),
+                'pagination': {
+                    'per_page': per_page,
+                    'next_cursor': next_cursor,
+                    'has_next': next_cursor is not None
+                }
+            }), etag, last_modified), 200
         
         # Order by date dreamed (most recent first)
-        query = query.order_by(Dream.date_dreamed.desc())
+        query = query.order_by(Dream.date_dreamed.desc(), Dream.id.desc())
         
         # Paginate
         dreams_pagination = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
-        return jsonify({
-            'dreams': dreams_schema.dump(dreams_pagination.items),
+        return with_validators(jsonify({
+            'dreams': serialize_dreams(dreams_pagination.items, fields),
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -109,23 +146,20 @@ def get_user_dreams():
                 'has_next': dreams_pagination.has_next,
                 'has_prev': dreams_pagination.has_prev
             }
-        }), 200
+        }), etag, last_modified), 200
         
+    except ValidationError as e:
+        return jsonify({'message': 'Validation error', 'errors': e.messages}), 400
     except Exception as e:
         return jsonify({'message': 'Failed to get dreams', 'error': str(e)}), 500
 
 
 @dreams_bp.route('/<int:dream_id>', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_dream(dream_id):
     """Get a specific dream."""
     try:
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         dream = Dream.find_by_id(dream_id)
         if not dream:
             return jsonify({'message': 'Dream not found'}), 404
@@ -134,9 +168,13 @@ def get_dream(dream_id):
         if dream.user_id != current_user.id:
             return jsonify({'message': 'Access denied'}), 403
         
-        return jsonify({
-            'dream': dream_schema.dump(dream)
-        }), 200
+        etag = make_etag('d', dream.id, f'{dream.updated_at:%Y%m%d%H%M%S%f}')
+        if is_not_modified(etag, dream.updated_at):
+            return not_modified(etag, dream.updated_at)
+        
+        return with_validators(jsonify({
+            'dream': serialize_dream(dream)
+        }), etag, dream.updated_at), 200
         
     except Exception as e:
         return jsonify({'message': 'Failed to get dream', 'error': str(e)}), 500
@@ -147,12 +185,6 @@ def get_dream(dream_id):
 def update_dream(dream_id):
     """Update a specific dream."""
     try:
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         dream = Dream.find_by_id(dream_id)
         if not dream:
             return jsonify({'message': 'Dream not found'}), 404
@@ -188,7 +220,7 @@ def update_dream(dream_id):
         
         return jsonify({
             'message': 'Dream updated successfully',
-            'dream': dream_schema.dump(dream)
+            'dream': serialize_dream(dream)
         }), 200
         
     except ValidationError as e:
@@ -203,12 +235,6 @@ def update_dream(dream_id):
 def delete_dream(dream_id):
     """Delete a specific dream."""
     try:
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         dream = Dream.find_by_id(dream_id)
         if not dream:
             return jsonify({'message': 'Dream not found'}), 404
@@ -230,15 +256,10 @@ def delete_dream(dream_id):
 
 @dreams_bp.route('/search', methods=['GET'])
 @jwt_required()
+@cached_response()
 def search_dreams():
     """Search dreams by keyword."""
     try:
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
-        
         search_term = request.args.get('q', '').strip()
         if not search_term:
             return jsonify({'message': 'Search term is required'}), 400
@@ -246,74 +267,201 @@ def search_dreams():
         if len(search_term) < 2:
             return jsonify({'message': 'Search term must be at least 2 characters long'}), 400
         
-        dreams = Dream.search_user_dreams(current_user.id, search_term)
+        fields = _requested_fields()
         
-        return jsonify({
-            'dreams': dreams_schema.dump(dreams),
+        etag, last_modified = journal_validators(current_user.id)
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
+        
+        dreams = Dream.search_user_dreams(current_user.id, search_term, columns=fields)
+        
+        return with_validators(jsonify({
+            'dreams': serialize_dreams(dreams, fields),
             'search_term': search_term,
             'count': len(dreams)
-        }), 200
+        }), etag, last_modified), 200
         
+    except ValidationError as e:
+        return jsonify({'message': 'Validation error', 'errors': e.messages}), 400
     except Exception as e:
         return jsonify({'message': 'Search failed', 'error': str(e)}), 500
 
 
 @dreams_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_dream_stats():
     """Get statistics about user's dreams."""
     try:
-        user_id = int(get_jwt_identity())
-        current_user = User.find_by_id(user_id)
-        
-        if not current_user:
-            return jsonify({'message': 'User not found'}), 404
+        etag, last_modified = journal_validators(current_user.id, 'stats')
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
         
-        dreams = Dream.find_by_user_id(current_user.id)
+        stats = Dream.aggregate_user_stats(current_user.id)
+        total_dreams = stats['total_dreams']
         
-        if not dreams:
-            return jsonify({
+        if not total_dreams:
+            return with_validators(jsonify({
                 'total_dreams': 0,
                 'lucid_dreams': 0,
                 'mood_distribution': {},
                 'dreams_by_month': {},
                 'most_common_tags': []
-            }), 200
-        
-        # Calculate statistics
-        total_dreams = len(dreams)
-        lucid_dreams = sum(1 for dream in dreams if dream.is_lucid)
-        
-        # Mood distribution
-        mood_distribution = {}
-        for dream in dreams:
-            if dream.mood:
-                mood_distribution[dream.mood] = mood_distribution.get(dream.mood, 0) + 1
-        
-        # Dreams by month
-        dreams_by_month = {}
-        for dream in dreams:
-            month_key = dream.date_dreamed.strftime('%Y-%m')
-            dreams_by_month[month_key] = dreams_by_month.get(month_key, 0) + 1
-        
-        # Most common tags
-        tag_counts = {}
-        for dream in dreams:
-            if dream.tags:
-                tags_list = dream.get_tags_list()
-                for tag in tags_list:
-                    tag_counts[tag] = tag_counts.get(tag, 0) + 1
-        
-        most_common_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+            }), etag, last_modified), 200
         
-        return jsonify({
+        lucid_dreams = stats['lucid_dreams']
+        
+        return with_validators(jsonify({
             'total_dreams': total_dreams,
             'lucid_dreams': lucid_dreams,
             'lucid_percentage': round((lucid_dreams / total_dreams) * 100, 1) if total_dreams > 0 else 0,
-            'mood_distribution': mood_distribution,
-            'dreams_by_month': dreams_by_month,
-            'most_common_tags': most_common_tags
-        }), 200
+            'mood_distribution': stats['mood_distribution'],
+            'dreams_by_month': stats['dreams_by_month'],
+            'most_common_tags': stats['most_common_tags']
+        }), etag, last_modified), 200
         
     except Exception as e:
         return jsonify({'message': 'Failed to get statistics', 'error': str(e)}), 500
+
+
+@dreams_bp.route('/tags', methods=['GET'])
+@jwt_required()
+@cached_response()
+def get_dream_tags():
+    """Get the user's tags with usage counts (tag cloud)."""
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, 200))
+        
+        etag, last_modified = journal_validators(current_user.id, 'tags')
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
+        
+        counts = Tag.counts_for_user(current_user.id, limit=limit)
+        
+        return with_validators(jsonify({
+            'tags': [{'name': name, 'count': count} for name, count in counts],
+            'count': len(counts)
+        }), etag, last_modified), 200
+        
+    except Exception as e:
+        return jsonify({'message': 'Failed to get tags', 'error': str(e)}), 500
+
+
+# Import / export massivo
+BULK_IMPORT_MAX_ITEMS = 10000
+BULK_IMPORT_CHUNK_SIZE = 500
+EXPORT_YIELD_PER = 500
+# L'export resta quello di sempre: l'anteprima si ricava dal contenuto
+EXPORT_FIELDS = tuple(name for name in DREAM_FIELDS if name != 'excerpt')
+EXPORT_CSV_COLUMNS = [
+    'id', 'title', 'content', 'date_dreamed', 'mood', 'is_lucid',
+    'tags', 'is_private', 'created_at', 'updated_at'
+]
+
+
+def _parse_bulk_payload():
+    """Read a bulk payload: NDJSON lines, a JSON array or {"dreams": [...]}."""
+    content_type = (request.mimetype or '').lower()
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValidationError({'line': [f'Invalid JSON on line {number}']})
+        return items
+    
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('dreams')
+    if not isinstance(payload, list):
+        raise ValidationError({'_schema': ['Expected a JSON array, {"dreams": [...]} or NDJSON']})
+    return payload
+
+
+@dreams_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_import_dreams():
+    """Import many dreams at once (JSON array or NDJSON)."""
+    try:
+        if not rate_limit_check(current_user.id, 'bulk_import', limit=10, window=3600):
+            return jsonify({'message': 'Too many imports. Please try again later.'}), 429
+        
+        items = _parse_bulk_payload()
+        if not items:
+            return jsonify({'message': 'No dreams to import'}), 400
+        if len(items) > BULK_IMPORT_MAX_ITEMS:
+            return jsonify({
+                'message': f'Too many dreams in one request (max {BULK_IMPORT_MAX_ITEMS})'
+            }), 413
+        
+        # Validazione di tutto il payload prima di scrivere qualsiasi cosa
+        data = dreams_schema.load(items)
+        
+        new_ids = Dream.bulk_insert(current_user.id, data, chunk_size=BULK_IMPORT_CHUNK_SIZE)
+        
+        return jsonify({
+            'message': 'Dreams imported successfully',
+            'imported': len(new_ids)
+        }), 201
+        
+    except ValidationError as e:
+        return jsonify({'message': 'Validation error', 'errors': e.messages}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to import dreams', 'error': str(e)}), 500
+
+
+@dreams_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_dreams():
+    """Stream all of the user's dreams as NDJSON (default) or CSV."""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'message': 'Unsupported format (use ndjson or csv)'}), 400
+    
+    if not rate_limit_check(current_user.id, 'export', limit=10, window=3600):
+        return jsonify({'message': 'Too many exports. Please try again later.'}), 429
+    
+    user_id = current_user.id
+    serialize_export = dream_serializer(EXPORT_FIELDS)
+    table = Dream.__table__
+    statement = db.select(table).where(
+        table.c.user_id == user_id
+    ).order_by(
+        table.c.date_dreamed.desc(), table.c.id.desc()
+    ).execution_options(yield_per=EXPORT_YIELD_PER)
+    
+    def generate_ndjson():
+        for row in db.session.execute(statement):
+            yield dumps_line(serialize_export(row))
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        for row in db.session.execute(statement):
+            record = serialize_export(row)
+            record['tags'] = ', '.join(record['tags'])
+            writer.writerow([record[column] for column in EXPORT_CSV_COLUMNS])
+            # Svuota il buffer a ogni riga: niente accumulo in memoria
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    if export_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=dreams-{stamp}.{export_format}'}
+    )
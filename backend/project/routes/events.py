@@ -0,0 +1,77 @@
+"""
+Server-Sent Events: live notifications of the current user's changes
+"""
+from flask import Blueprint, Response, jsonify, request
+from flask_jwt_extended import jwt_required, current_user, verify_jwt_in_request
+
+from project.utils.events import event_streams
+from project.utils.security import load_user_identity
+
+events_bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # nginx: non bufferizzare lo stream
+}
+
+
+def _stream_user_id():
+    """User of the stream: a ticket in the query string, or the Authorization header."""
+    ticket = request.args.get('ticket')
+    if ticket is None:
+        # Solo header: il token di accesso non va mai nella query string
+        verify_jwt_in_request()
+        return current_user.id
+
+    user_id = event_streams.redeem_ticket(ticket)
+    identity = load_user_identity(user_id) if user_id is not None else None
+    if identity is None or not identity.is_active:
+        return None
+    return identity.id
+
+
+@events_bp.route('/ticket', methods=['POST'])
+@jwt_required()
+def create_ticket():
+    """Single-use ticket for GET /api/events?ticket=... (EventSource sends no headers)."""
+    try:
+        if not event_streams.enabled:
+            return jsonify({'message': 'Event stream disabled'}), 404
+        ticket = event_streams.issue_ticket(current_user.id)
+        return jsonify({'ticket': ticket, 'expires_in': event_streams.ticket_ttl}), 201
+
+    except Exception as e:
+        return jsonify({'message': 'Failed to create ticket', 'error': str(e)}), 500
+
+
+@events_bp.route('', methods=['GET'])
+def stream_events():
+    """Stream dream.created/updated/deleted, stats.changed and feed.updated events."""
+    if not event_streams.enabled:
+        return jsonify({'message': 'Event stream disabled'}), 404
+
+    # Con gunicorn ogni stream tiene occupato un thread: oltre il limite il
+    # client continua a fare polling (la modalità ASGI non ha questo limite).
+    # Il posto si prende prima di riscattare il ticket, che con il 503 resta valido
+    if not event_streams.acquire_wsgi_stream():
+        return jsonify({'message': 'Too many open event streams, retry later'}), 503, {'Retry-After': '30'}
+
+    try:
+        user_id = _stream_user_id()
+    except Exception:
+        event_streams.release_wsgi_stream()
+        raise
+    if user_id is None:
+        event_streams.release_wsgi_stream()
+        return jsonify({'message': 'Invalid or expired ticket'}), 401
+
+    subscription = event_streams.subscribe(user_id)
+    response = Response(event_streams.wsgi_stream(subscription), mimetype='text/event-stream',
+                        headers=STREAM_HEADERS)
+
+    @response.call_on_close
+    def release():
+        event_streams.unsubscribe(subscription)
+        event_streams.release_wsgi_stream()
+
+    return response
@@ -0,0 +1,245 @@
+"""
+Friendship routes and the friends' dream feed
+"""
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, current_user
+from sqlalchemy import select
+
+from project.models import User, Dream, Friendship, TimelineEntry
+from project.serializers import serialize_dreams
+from project.utils.security import rate_limit_check
+from project.utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+from project import db
+
+friends_bp = Blueprint('friends', __name__, url_prefix='/api/friends')
+feed_bp = Blueprint('feed', __name__, url_prefix='/api/feed')
+
+# Campi dei sogni nel feed: anteprima al posto del contenuto completo
+FEED_FIELDS = ('id', 'title', 'excerpt', 'date_dreamed', 'mood', 'is_lucid', 'tags', 'created_at', 'user_id')
+
+
+def _usernames(user_ids):
+    """{user_id: username} with a single query."""
+    if not user_ids:
+        return {}
+    rows = db.session.execute(select(User.id, User.username).where(User.id.in_(user_ids))).all()
+    return {user_id: username for user_id, username in rows}
+
+
+def _request_dict(friendship, other_id, usernames):
+    return {
+        'id': friendship.id,
+        'user': {'id': other_id, 'username': usernames.get(other_id)},
+        'status': friendship.status,
+        'created_at': friendship.created_at.isoformat() if friendship.created_at else None
+    }
+
+
+@friends_bp.route('', methods=['GET'])
+@jwt_required()
+def get_friends():
+    """List the accepted friends of the current user."""
+    try:
+        friendships = Friendship.query.filter(
+            Friendship.status == 'accepted',
+            db.or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id)
+        ).all()
+        friend_ids = [friendship.other_user_id(current_user.id) for friendship in friendships]
+        usernames = _usernames(friend_ids)
+
+        friends = sorted((
+            {
+                'id': friend_id,
+                'username': usernames.get(friend_id),
+                'since': friendship.updated_at.isoformat() if friendship.updated_at else None
+            }
+            for friendship, friend_id in zip(friendships, friend_ids)
+        ), key=lambda friend: (friend['username'] or '').lower())
+
+        return jsonify({'friends': friends, 'total': len(friends)}), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Failed to get friends', 'error': str(e)}), 500
+
+
+@friends_bp.route('/requests', methods=['GET'])
+@jwt_required()
+def get_friend_requests():
+    """Pending requests received and sent by the current user."""
+    try:
+        pending = Friendship.query.filter(
+            Friendship.status == 'pending',
+            db.or_(Friendship.requester_id == current_user.id, Friendship.addressee_id == current_user.id)
+        ).order_by(Friendship.created_at.desc()).all()
+        usernames = _usernames({friendship.other_user_id(current_user.id) for friendship in pending})
+
+        return jsonify({
+            'incoming': [
+                _request_dict(friendship, friendship.requester_id, usernames)
+                for friendship in pending if friendship.addressee_id == current_user.id
+            ],
+            'outgoing': [
+                _request_dict(friendship, friendship.addressee_id, usernames)
+                for friendship in pending if friendship.requester_id == current_user.id
+            ]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Failed to get friend requests', 'error': str(e)}), 500
+
+
+@friends_bp.route('/requests', methods=['POST'])
+@jwt_required()
+def send_friend_request():
+    """Send a friend request by user_id or username (accepts a pending reverse request)."""
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get('user_id') is not None:
+            try:
+                other = db.session.get(User, int(data['user_id']))
+            except (TypeError, ValueError):
+                return jsonify({'message': 'user_id must be an integer'}), 400
+        elif data.get('username'):
+            other = User.find_by_username(str(data['username']).strip())
+        else:
+            return jsonify({'message': 'user_id or username required'}), 400
+
+        if other is None:
+            return jsonify({'message': 'User not found'}), 404
+        if other.id == current_user.id:
+            return jsonify({'message': 'You cannot add yourself as a friend'}), 400
+
+        if not rate_limit_check(current_user.id, 'friend_request', limit=30, window=3600):
+            return jsonify({'message': 'Too many friend requests. Please try again later.'}), 429
+
+        friendship = Friendship.find_between(current_user.id, other.id)
+        if friendship is not None:
+            if friendship.status == 'accepted':
+                return jsonify({'message': 'Already friends', 'friendship': friendship.to_dict()}), 409
+            if friendship.status == 'blocked':
+                return jsonify({'message': 'Friend request not allowed'}), 403
+            if friendship.status == 'pending' and friendship.addressee_id == current_user.id:
+                # Richiesta incrociata: l'altro utente ce l'aveva già chiesta
+                friendship.accept()
+                return jsonify({'message': 'Friend request accepted', 'friendship': friendship.to_dict()}), 200
+            if friendship.status == 'pending':
+                return jsonify({'message': 'Friend request already sent', 'friendship': friendship.to_dict()}), 409
+            # Rifiutata in passato: nuova richiesta da parte di chi la invia ora
+            friendship.requester_id, friendship.addressee_id = current_user.id, other.id
+            friendship.status = 'pending'
+        else:
+            friendship = Friendship(current_user.id, other.id)
+
+        friendship.save_to_db()
+        return jsonify({'message': 'Friend request sent', 'friendship': friendship.to_dict()}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to send friend request', 'error': str(e)}), 500
+
+
+def _received_request(friendship_id):
+    """The pending request addressed to the current user, or an error response."""
+    friendship = Friendship.find_by_id(friendship_id)
+    if friendship is None or current_user.id not in (friendship.requester_id, friendship.addressee_id):
+        return None, (jsonify({'message': 'Friend request not found'}), 404)
+    if friendship.addressee_id != current_user.id or friendship.status != 'pending':
+        return None, (jsonify({'message': 'Only pending requests you received can be answered'}), 409)
+    return friendship, None
+
+
+@friends_bp.route('/requests/<int:friendship_id>/accept', methods=['POST'])
+@jwt_required()
+def accept_friend_request(friendship_id):
+    """Accept a received friend request."""
+    try:
+        friendship, error = _received_request(friendship_id)
+        if error:
+            return error
+        friendship.accept()
+        return jsonify({'message': 'Friend request accepted', 'friendship': friendship.to_dict()}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to accept friend request', 'error': str(e)}), 500
+
+
+@friends_bp.route('/requests/<int:friendship_id>/decline', methods=['POST'])
+@jwt_required()
+def decline_friend_request(friendship_id):
+    """Decline a received friend request."""
+    try:
+        friendship, error = _received_request(friendship_id)
+        if error:
+            return error
+        friendship.status = 'declined'
+        friendship.save_to_db()
+        return jsonify({'message': 'Friend request declined', 'friendship': friendship.to_dict()}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to decline friend request', 'error': str(e)}), 500
+
+
+@friends_bp.route('/<int:user_id>', methods=['DELETE'])
+@jwt_required()
+def remove_friend(user_id):
+    """Unfriend a user, or cancel a pending request between the two users."""
+    try:
+        friendship = Friendship.find_between(current_user.id, user_id)
+        if friendship is None or friendship.status not in ('accepted', 'pending'):
+            return jsonify({'message': 'Friendship not found'}), 404
+
+        friendship.delete_from_db()  # rimuove anche i sogni dai rispettivi feed
+        return jsonify({'message': 'Friend removed'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to remove friend', 'error': str(e)}), 500
+
+
+@feed_bp.route('', methods=['GET'])
+@jwt_required()
+def get_feed():
+    """Non-private dreams of the current user's friends, newest first (cursor pagination)."""
+    try:
+        per_page = max(1, min(request.args.get('per_page', 20, type=int), 50))
+        cursor = request.args.get('cursor', '').strip()
+        try:
+            before = decode_cursor(cursor, parse=datetime.fromisoformat) if cursor else None
+        except InvalidCursor:
+            return jsonify({'message': 'Invalid cursor'}), 400
+
+        # Posizioni dalla timeline precalcolata (+ fan-in degli autori con molti amici)
+        positions = TimelineEntry.feed_positions(current_user.id, per_page + 1, before)
+        next_cursor = None
+        if len(positions) > per_page:
+            positions = positions[:per_page]
+            next_cursor = encode_cursor(*positions[-1])
+
+        dream_ids = [dream_id for _, dream_id in positions]
+        dreams = {}
+        if dream_ids:
+            dreams = {dream.id: dream for dream in Dream.query.options(
+                Dream.load_columns(FEED_FIELDS + ('is_private',))
+            ).filter(Dream.id.in_(dream_ids)).all()}
+        ordered = [dreams[dream_id] for dream_id in dream_ids
+                   if dream_id in dreams and not dreams[dream_id].is_private]
+
+        usernames = _usernames({dream.user_id for dream in ordered})
+        items = serialize_dreams(ordered, FEED_FIELDS)
+        for item in items:
+            item['author'] = {'id': item['user_id'], 'username': usernames.get(item['user_id'])}
+
+        return jsonify({
+            'dreams': items,
+            'pagination': {
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({'message': 'Failed to get feed', 'error': str(e)}), 500
@@ -2,13 +2,14 @@
 Users routes for CRUD operations on user accounts - VERSIONE SEMPLICE
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, current_user
 from marshmallow import ValidationError
 from datetime import datetime, date
 
 from project.models import Dream, User
 from project.schemas import dream_schema, dreams_schema, dream_update_schema
 from project.utils.security import rate_limit_check
+from project.utils.user_search import find_user_ids
 from project import db
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
@@ -22,7 +23,7 @@ def find_users():
         query = request.args.get('q', '').strip()
         limit = min(int(request.args.get('limit', 10)), 50)  # Massimo 50 risultati
         
-        current_user_id = get_jwt_identity()
+        current_user_id = current_user.id
         
         if not query:
             return jsonify({'users': [], 'total': 0}), 200
@@ -30,13 +31,12 @@ def find_users():
         if len(query) < 2:
             return jsonify({'users': [], 'total': 0, 'message': 'Minimum 2 characters required'}), 200
         
-        # Query di ricerca con esclusione dell'utente corrente
-        users_query = User.query.filter(
-            User.id != current_user_id,  # Escludi te stesso
-            User.username.ilike(f'%{query}%')  # Case-insensitive search
-        ).limit(limit)
-        
-        users = users_query.all()
+        # Prefissi dall'indice in memoria, poi corrispondenze interne dai trigrammi
+        user_ids = find_user_ids(query, limit, exclude_id=current_user_id)  # Escludi te stesso
+        users = []
+        if user_ids:
+            found = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+            users = [found[user_id] for user_id in user_ids if user_id in found]
         
         # Converti in formato JSON
         users_data = []
@@ -1,7 +1,7 @@
 """
 Marshmallow schemas for serialization and validation
 """
-from marshmallow import Schema, fields, validate, ValidationError, pre_load
+from marshmallow import Schema, fields, validate, ValidationError, pre_load, post_dump
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 from project.models import User, Dream
 from project import ma
@@ -63,6 +63,7 @@ class DreamSchema(Schema):
     id = fields.Int(dump_only=True)
     title = fields.Str(required=True, validate=validate.Length(min=1, max=200))
     content = fields.Str(required=True, validate=validate.Length(min=1, max=5000))
+    excerpt = fields.Str(dump_only=True)
     date_dreamed = fields.Date(required=True)
     mood = fields.Str(validate=validate.Length(max=50), allow_none=True)
     is_lucid = fields.Bool(missing=False)
@@ -82,6 +83,13 @@ class DreamSchema(Schema):
         if 'mood' in data and data['mood']:
             data['mood'] = data['mood'].strip().lower()
         return data
+    
+    @post_dump(pass_original=True)
+    def dump_tags_list(self, data, original, **kwargs):
+        """Dump tags as a list (they are stored as a comma-separated string)."""
+        if isinstance(original, Dream):
+            data['tags'] = original.get_tags_list()
+        return data
 
 
 class DreamUpdateSchema(Schema):
@@ -0,0 +1,88 @@
+"""
+Precompiled serializers for the hot read paths
+
+``DreamSchema.dump`` walks the marshmallow field machinery for every dream;
+here the dump fields of the schema are compiled once into a single function
+building the dict directly, with the same keys, order and values.
+"""
+from marshmallow import fields
+
+from project.metrics import timed
+from project.schemas import DreamSchema
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _tags_list(value):
+    # Come Dream.get_tags_list (post_dump di DreamSchema)
+    return [tag.strip() for tag in value.split(',')] if value else []
+
+
+# Integer/String/Boolean arrivano dal database già del tipo giusto: il valore
+# della colonna va copiato così com'è
+_PASSTHROUGH = (fields.Integer, fields.String, fields.Boolean)
+_ISOFORMAT = (fields.Date, fields.DateTime)
+
+
+def compile_serializer(schema, overrides=None, only=None):
+    """Compile ``schema``'s dump fields into ``serialize(obj) -> dict``.
+
+    ``obj`` can be a model instance or a Core row with the same attribute
+    names. ``overrides`` maps a field name to a converter applied to the raw
+    attribute (e.g. tags). ``only`` restricts the output to those fields (in
+    schema order). Unknown field types fall back to ``field.serialize``.
+    """
+    overrides = overrides or {}
+    namespace = {'_isoformat': _isoformat}
+    items = []
+    for name, field in schema.dump_fields.items():
+        if only is not None and name not in only:
+            continue
+        attribute = field.attribute or name
+        if name in overrides:
+            namespace[f'_convert_{name}'] = overrides[name]
+            expression = f'_convert_{name}(obj.{attribute})'
+        elif isinstance(field, _PASSTHROUGH):
+            expression = f'obj.{attribute}'
+        elif isinstance(field, _ISOFORMAT) and field.format in (None, 'iso'):
+            expression = f'_isoformat(obj.{attribute})'
+        else:
+            namespace[f'_field_{name}'] = field
+            expression = f'_field_{name}.serialize({attribute!r}, obj)'
+        items.append(f'{name!r}: {expression}')
+
+    source = 'def serialize(obj):\n    return {' + ', '.join(items) + '}\n'
+    exec(compile(source, f'<serializer {type(schema).__name__}>', 'exec'), namespace)
+    serialize = namespace['serialize']
+    serialize.source = source
+    return serialize
+
+
+_dream_schema = DreamSchema()
+_DREAM_OVERRIDES = {'tags': _tags_list}
+
+# Campi selezionabili con ?fields= (sparse fieldsets)
+DREAM_FIELDS = tuple(_dream_schema.dump_fields)
+
+serialize_dream = compile_serializer(_dream_schema, overrides=_DREAM_OVERRIDES)
+
+_dream_serializers = {None: serialize_dream}
+
+
+def dream_serializer(fields=None):
+    """Serializer for a subset of DREAM_FIELDS (compiled once per field set)."""
+    key = frozenset(fields) if fields is not None else None
+    serializer = _dream_serializers.get(key)
+    if serializer is None:
+        serializer = compile_serializer(_dream_schema, overrides=_DREAM_OVERRIDES, only=key)
+        _dream_serializers[key] = serializer
+    return serializer
+
+
+def serialize_dreams(dreams, fields=None):
+    """Serialize an iterable of dreams (models or rows) to a list of dicts."""
+    serialize = dream_serializer(fields)
+    with timed('serialize'):
+        return [serialize(dream) for dream in dreams]
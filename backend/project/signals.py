@@ -0,0 +1,73 @@
+"""
+Application signals, sent only once the database transaction has committed
+"""
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_signals = Namespace()
+
+# Inviato una volta per utente dopo ogni commit che ha scritto dei sogni.
+# kwargs: user_id, changes=[(action, dream_id), ...] con action in
+# 'insert' | 'update' | 'delete'
+dreams_changed = _signals.signal('dreams-changed')
+
+# Inviato dopo il commit a ogni lettore nella cui timeline sono entrati dei
+# sogni (fan-out o nuova amicizia). kwargs: user_id, dream_ids=[...]
+feed_changed = _signals.signal('feed-changed')
+
+_PENDING_KEY = 'pending_dream_changes'
+_PENDING_FEED_KEY = 'pending_feed_changes'
+
+
+def record_dream_changes(session, user_id, changes):
+    """Queue [(action, dream_id)] for ``user_id`` until the session commits."""
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    pending.setdefault(user_id, []).extend(changes)
+
+
+def record_feed_changes(session, user_ids, dream_ids):
+    """Queue the dreams added to the timelines of ``user_ids`` until the session commits."""
+    pending = session.info.setdefault(_PENDING_FEED_KEY, {})
+    for user_id in user_ids:
+        pending.setdefault(user_id, []).extend(dream_ids)
+
+
+def _sender():
+    return current_app._get_current_object() if has_app_context() else None
+
+
+def _send_after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    pending_feed = session.info.pop(_PENDING_FEED_KEY, None)
+    if not pending and not pending_feed:
+        return
+    sender = _sender()
+    for user_id, changes in (pending or {}).items():
+        dreams_changed.send(sender, user_id=user_id, changes=changes)
+    for user_id, dream_ids in (pending_feed or {}).items():
+        feed_changed.send(sender, user_id=user_id, dream_ids=dream_ids)
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PENDING_FEED_KEY, None)
+
+
+def _recorder(action):
+    def record(mapper, connection, target):
+        session = Session.object_session(target)
+        if session is not None:
+            record_dream_changes(session, target.user_id, [(action, target.id)])
+    return record
+
+
+def register_dream_signals(dream_model):
+    """Collect dream writes during flush and emit dreams_changed after commit."""
+    event.listen(dream_model, 'after_insert', _recorder('insert'))
+    event.listen(dream_model, 'after_update', _recorder('update'))
+    event.listen(dream_model, 'after_delete', _recorder('delete'))
+    if not event.contains(Session, 'after_commit', _send_after_commit):
+        event.listen(Session, 'after_commit', _send_after_commit)
+        event.listen(Session, 'after_rollback', _discard_after_rollback)
@@ -0,0 +1,92 @@
+"""
+Pytest plugin: app/client fixtures and SQL query budgets per endpoint
+
+Enable it from a conftest.py with ``pytest_plugins = ['project.testing']``:
+
+    def test_list_dreams(client, auth_headers, query_budget):
+        with query_budget('GET /api/dreams'):
+            client.get('/api/dreams', headers=auth_headers)
+
+The testing config also turns the N+1 detector on in 'raise' mode, so a
+request repeating the same SELECT fails the test on its own.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+from project.app import create_app
+from project.utils.nplusone import track_queries
+from project.utils.ratelimit import limiter
+from project.utils.response_cache import response_cache
+
+# Query massime per richiesta, misurate con la cache delle risposte
+# disattivata (+1 per la lettura dell'utente del token se non è in cache)
+QUERY_BUDGETS = {
+    'POST /api/auth/register': 5,
+    'POST /api/auth/login': 2,
+    'GET /api/auth/me': 1,
+    'GET /api/auth/stats': 3,
+    'GET /api/dreams': 4,
+    'GET /api/dreams/<id>': 2,
+    'POST /api/dreams': 11,
+    'PUT /api/dreams/<id>': 10,
+    'DELETE /api/dreams/<id>': 7,
+    'GET /api/dreams/search': 3,
+    'GET /api/dreams/stats': 6,
+    'GET /api/dreams/tags': 3,
+    'GET /api/dreams/export': 2,
+    'GET /api/users/find': 4,
+    'GET /api/friends': 3,
+    'GET /api/friends/requests': 3,
+    'POST /api/friends/requests/<id>/accept': 12,
+    'DELETE /api/friends/<user_id>': 6,
+    'GET /api/feed': 5,
+}
+
+TEST_PASSWORD = 'TestPassw0rd'
+
+
+@pytest.fixture
+def app():
+    """A fresh testing app on an in-memory database."""
+    app = create_app('testing')
+    limiter.enabled = False
+    response_cache.enabled = False  # i budget misurano le query reali
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization header of a newly registered user."""
+    response = client.post('/api/auth/register', json={
+        'username': 'test_user', 'email': 'test_user@example.com', 'password': TEST_PASSWORD
+    })
+    assert response.status_code == 201, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+@pytest.fixture
+def query_budget():
+    """Context manager failing the test when the block runs too many statements.
+
+    Accepts a number or a key of QUERY_BUDGETS (``'GET /api/dreams'``); the
+    tracker is yielded so the test can inspect ``statements`` as well.
+    """
+    @contextmanager
+    def budget(limit):
+        name = limit if isinstance(limit, str) else None
+        maximum = QUERY_BUDGETS[name] if name is not None else limit
+        with track_queries() as tracker:
+            yield tracker
+        if tracker.total > maximum:
+            statements = '\n'.join(f'  {statement}' for statement in tracker.statements)
+            pytest.fail(
+                f'{name or "block"}: {tracker.total} queries, budget {maximum}\n{statements}',
+                pytrace=False
+            )
+    return budget
@@ -3,10 +3,12 @@ Utility functions
 """
 from .security import (
     token_required, get_current_user, admin_required,
-    validate_password_strength, sanitize_input, rate_limit_check
+    validate_password_strength, sanitize_input, rate_limit_check,
+    load_user_identity, invalidate_user
 )
 
 __all__ = [
     'token_required', 'get_current_user', 'admin_required',
-    'validate_password_strength', 'sanitize_input', 'rate_limit_check'
+    'validate_password_strength', 'sanitize_input', 'rate_limit_check',
+    'load_user_identity', 'invalidate_user'
 ]
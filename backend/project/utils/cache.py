@@ -0,0 +1,92 @@
+"""
+Small in-process caches
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    With ``maxbytes`` the cache also keeps the total ``size`` of its entries
+    (as passed to :meth:`set`) under that cap, evicting the least recently
+    used ones first.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value or ``default`` if missing/expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, size=0):
+        """Store a value, evicting the least recently used entries if full."""
+        if self.maxbytes is not None and size > self.maxbytes:
+            return False
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (
+                self.maxbytes is not None and self._bytes > self.maxbytes
+            ):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def delete(self, key):
+        """Remove a key (no error if missing)."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+        if self.maxbytes is not None:
+            stats['bytes'] = self._bytes
+            stats['maxbytes'] = self.maxbytes
+        return stats
@@ -0,0 +1,158 @@
+"""
+Negotiated gzip / brotli response compression
+
+Buffered responses are compressed once (below ``COMPRESS_MIN_SIZE`` they are
+sent as they are) and the result is kept in a small cache keyed by the body
+digest, so identical payloads (cached responses, polling) are not compressed
+again. Streamed responses (export) are compressed chunk by chunk and flushed
+regularly, never buffered whole. Brotli needs the optional ``brotli`` package.
+"""
+import hashlib
+import zlib
+from flask import request
+
+from project.utils.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli è opzionale: solo gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/csv', 'text/html', 'text/plain', 'text/css', 'text/javascript',
+    'image/svg+xml',
+}
+
+
+class Compressor:
+    """Response compression settings, counters and the precompressed cache."""
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 500
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self.stream_flush = 64 * 1024
+        self.cache = TTLCache(maxsize=512, ttl=300, maxbytes=8 * 1024 * 1024)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def encodings(self):
+        return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def negotiate(self):
+        """Best encoding accepted by the client (q-values respected), or None."""
+        accepted = request.accept_encodings
+        best = accepted.best_match(self.encodings())
+        if best and accepted[best] > 0:
+            return best
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31 = formato gzip
+        return compressor.compress(data) + compressor.flush()
+
+    def compress_cached(self, data, encoding):
+        key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = self.compress(data, encoding)
+            self.cache.set(key, compressed, size=len(compressed))
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        return compressed
+
+    def compress_stream(self, chunks, encoding):
+        """Compress an iterable incrementally, flushing every ``stream_flush`` bytes."""
+        if encoding == 'br':
+            stream = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = stream.process, stream.flush, stream.finish
+        else:
+            stream = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            process, finish = stream.compress, stream.flush
+            flush = lambda: stream.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+
+        pending = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                self.bytes_in += len(chunk)
+                output = process(chunk)
+                pending += len(chunk)
+                # Flush periodico: il client riceve l'export man mano
+                if pending >= self.stream_flush:
+                    output += flush()
+                    pending = 0
+                if output:
+                    self.bytes_out += len(output)
+                    yield output
+            output = finish()
+            self.bytes_out += len(output)
+            yield output
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def stats(self):
+        stats = {
+            'encodings': list(self.encodings()),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else 0.0,
+        }
+        stats['cache'] = self.cache.stats()
+        return stats
+
+
+compressor = Compressor()
+
+
+def _compressible(response):
+    if not compressor.enabled or response.direct_passthrough:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or request.method == 'HEAD':
+        return False
+    return response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress_response(response):
+    """after_request hook: compress the body with the negotiated encoding."""
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = compressor.negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compressor.compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < compressor.min_size:
+            return response
+        response.set_data(compressor.compress_cached(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Configure from the COMPRESS_* settings and register the hook."""
+    compressor.enabled = app.config.get('COMPRESS_ENABLED', True)
+    compressor.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+    compressor.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+    compressor.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+    compressor.stream_flush = app.config.get('COMPRESS_STREAM_FLUSH', 64 * 1024)
+    compressor.cache.maxsize = app.config.get('COMPRESS_CACHE_SIZE', 512)
+    compressor.cache.maxbytes = app.config.get('COMPRESS_CACHE_MAX_BYTES', 8 * 1024 * 1024)
+    app.after_request(compress_response)
+    return compressor
@@ -0,0 +1,318 @@
+"""
+Live change notifications for the /api/events stream (Server-Sent Events)
+
+Every commit that writes dreams publishes events to their owner
+(``dreams_changed`` signal) and to the friends whose feed received them
+(``feed_changed``). Each open stream is a bounded per-user subscription;
+the broker carries the events from the writing worker to the streams:
+
+- ``memory://``            in-process, a stream only sees its own worker's writes
+- ``redis://host:6379/2``  PUBLISH per user, one listener thread per process (needs ``redis``)
+
+``EventSource`` cannot send an Authorization header, so a stream is opened
+with a single-use ticket (``POST /api/events/ticket``, ``EVENTS_TICKET_TTL``
+seconds) instead of the access token; the broker also stores the tickets,
+so any worker can redeem them.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from project.signals import dreams_changed, feed_changed
+
+# Azione del segnale dreams_changed -> nome dell'evento SSE
+DREAM_EVENTS = {
+    'insert': 'dream.created',
+    'update': 'dream.updated',
+    'delete': 'dream.deleted',
+}
+
+HEARTBEAT = b': ping\n\n'
+
+
+def format_event(name, data):
+    """One SSE message (``event:`` + ``data:`` lines)."""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f'event: {name}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+def stream_preamble(retry_ms):
+    """First bytes of a stream: reconnection delay for EventSource."""
+    return f'retry: {retry_ms}\n\n'.encode('ascii')
+
+
+class Subscription:
+    """Pending events of one open stream.
+
+    Bounded: a client that falls more than ``maxsize`` events behind gets a
+    single ``resync`` event instead (reload everything) and the backlog is
+    dropped. ``wake`` is called, from any thread, when events arrive.
+    """
+
+    def __init__(self, user_id, maxsize=100, wake=None):
+        self.user_id = user_id
+        self.maxsize = maxsize
+        self._events = deque()
+        self._overflowed = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._wake = wake or self._ready.set
+
+    def put(self, events):
+        with self._lock:
+            if self._overflowed:
+                return
+            if len(self._events) + len(events) > self.maxsize:
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.extend(events)
+        self._wake()
+
+    def drain(self):
+        """Take every pending event (``[('resync', {})]`` after an overflow)."""
+        with self._lock:
+            self._ready.clear()
+            if self._overflowed:
+                self._overflowed = False
+                return [('resync', {})]
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def wait(self, timeout):
+        """Block until events arrive or ``timeout`` seconds pass (WSGI streams)."""
+        self._ready.wait(timeout)
+        return self.drain()
+
+
+class MemoryBroker:
+    """In-process broker: publish delivers straight to the local subscriptions."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._tickets = {}  # ticket -> (user_id, scadenza)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def issue_ticket(self, user_id, ttl):
+        ticket = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self._tickets.items() if expires_at <= now]:
+                del self._tickets[key]
+            self._tickets[ticket] = (user_id, now + ttl)
+        return ticket
+
+    def redeem_ticket(self, ticket):
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def subscribe(self, user_id, maxsize=100, wake=None):
+        subscription = Subscription(user_id, maxsize=maxsize, wake=wake)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def deliver(self, user_id, events):
+        """Hand events to the streams of ``user_id`` open in this process."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(events)
+
+    def publish(self, user_id, events):
+        self.published += 1
+        self.deliver(user_id, events)
+
+    def streams(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def close(self):
+        return None
+
+
+class RedisBroker(MemoryBroker):
+    """Shared broker: PUBLISH on ``events:<user_id>``, delivered by a listener thread."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='events'):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self._pubsub = None
+        self._listener = None
+        self._listener_pid = None
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def publish(self, user_id, events):
+        self.published += 1
+        self.client.publish(f'{self.prefix}:{user_id}', json.dumps(events))
+
+    def issue_ticket(self, user_id, ttl):
+        ticket = secrets.token_urlsafe(32)
+        self.client.set(f'{self.prefix}-ticket:{ticket}', user_id, ex=max(1, int(ttl)))
+        return ticket
+
+    def redeem_ticket(self, ticket):
+        # GET + DELETE nella stessa transazione: un ticket vale una volta sola
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(f'{self.prefix}-ticket:{ticket}')
+        pipe.delete(f'{self.prefix}-ticket:{ticket}')
+        user_id, _ = pipe.execute()
+        return int(user_id) if user_id is not None else None
+
+    def subscribe(self, user_id, maxsize=100, wake=None):
+        self._ensure_listener()
+        return super().subscribe(user_id, maxsize=maxsize, wake=wake)
+
+    def _on_message(self, message):
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        user_id = int(channel.rsplit(':', 1)[1])
+        self.deliver(user_id, [tuple(event) for event in json.loads(message['data'])])
+
+    def _ensure_listener(self):
+        # Avviato al primo stream, nel processo del worker (dopo il fork)
+        with self._lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                return
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.psubscribe(**{f'{self.prefix}:*': self._on_message})
+            self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            self._listener_pid = os.getpid()
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+                self._pubsub.close()
+            self._listener = None
+
+
+def create_broker(url):
+    """Build a broker from a URL (memory:// or redis://)."""
+    url = url or 'memory://'
+    if url.startswith('memory://'):
+        return MemoryBroker()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker.from_url(url)
+    raise ValueError(f'Unsupported events broker: {url}')
+
+
+class EventStreams:
+    """Front object used by the routes: broker plus stream settings."""
+
+    def __init__(self, broker=None, enabled=True):
+        self.broker = broker or MemoryBroker()
+        self.enabled = enabled
+        self.queue_size = 100
+        self.heartbeat = 15.0
+        self.retry_ms = 3000
+        self.ticket_ttl = 30
+        # Stream WSGI: ognuno occupa un thread per tutta la connessione
+        self._wsgi_slots = threading.BoundedSemaphore(2)
+
+    def configure_wsgi_streams(self, max_streams):
+        self._wsgi_slots = threading.BoundedSemaphore(max_streams) if max_streams > 0 else None
+
+    def acquire_wsgi_stream(self):
+        return self._wsgi_slots is not None and self._wsgi_slots.acquire(blocking=False)
+
+    def release_wsgi_stream(self):
+        self._wsgi_slots.release()
+
+    def subscribe(self, user_id, wake=None):
+        return self.broker.subscribe(user_id, maxsize=self.queue_size, wake=wake)
+
+    def unsubscribe(self, subscription):
+        self.broker.unsubscribe(subscription)
+
+    def issue_ticket(self, user_id):
+        """Single-use, short-lived ticket opening one stream of ``user_id``."""
+        return self.broker.issue_ticket(user_id, self.ticket_ttl)
+
+    def redeem_ticket(self, ticket):
+        """User ID of a valid ticket, consuming it (None if unknown, used or expired)."""
+        if not ticket:
+            return None
+        return self.broker.redeem_ticket(ticket)
+
+    def publish(self, user_id, events):
+        if not self.enabled or not events:
+            return
+        try:
+            self.broker.publish(user_id, events)
+        except Exception as e:
+            # La scrittura è già stata salvata: una notifica persa non deve farla fallire
+            print(f"⚠️  Notifica eventi non inviata: {e}")
+
+    def wsgi_stream(self, subscription):
+        """Generator of SSE bytes for a WSGI response (heartbeat when idle)."""
+        yield stream_preamble(self.retry_ms)
+        while True:
+            events = subscription.wait(self.heartbeat)
+            if not events:
+                yield HEARTBEAT
+                continue
+            yield b''.join(format_event(name, data) for name, data in events)
+
+
+event_streams = EventStreams()
+
+
+def _on_dreams_changed(sender, user_id=None, changes=(), **kwargs):
+    events = [(DREAM_EVENTS[action], {'id': dream_id}) for action, dream_id in changes]
+    # Ogni scrittura di sogni aggiorna anche le statistiche dell'utente
+    events.append(('stats.changed', {}))
+    event_streams.publish(user_id, events)
+
+
+def _on_feed_changed(sender, user_id=None, dream_ids=(), **kwargs):
+    event_streams.publish(user_id, [('feed.updated', {'dream_ids': list(dream_ids)})])
+
+
+def init_app(app):
+    """Configure the broker and subscribe to the write signals."""
+    url = app.config.get('EVENTS_BROKER_URL', 'memory://')
+    try:
+        broker = create_broker(url)
+    except ImportError:
+        print("⚠️  redis non disponibile, eventi solo nel processo corrente")
+        broker = MemoryBroker()
+
+    event_streams.broker.close()
+    event_streams.broker = broker
+    event_streams.enabled = app.config.get('EVENTS_ENABLED', True)
+    event_streams.queue_size = app.config.get('EVENTS_QUEUE_SIZE', 100)
+    event_streams.heartbeat = app.config.get('EVENTS_HEARTBEAT', 15.0)
+    event_streams.retry_ms = app.config.get('EVENTS_RETRY_MS', 3000)
+    event_streams.ticket_ttl = app.config.get('EVENTS_TICKET_TTL', 30)
+    event_streams.configure_wsgi_streams(app.config.get('EVENTS_MAX_WSGI_STREAMS', 2))
+
+    dreams_changed.connect(_on_dreams_changed)
+    feed_changed.connect(_on_feed_changed)
+    return event_streams
@@ -0,0 +1,69 @@
+"""
+Conditional GET helpers: weak ETags, Last-Modified and 304 responses
+"""
+from datetime import timezone
+from flask import request, make_response
+from werkzeug.http import http_date, quote_etag
+
+from project.models import UserJournal
+
+
+def make_etag(*parts):
+    """Build an opaque ETag value from its parts (quoted/weak-marked on output)."""
+    return '-'.join(str(part) for part in parts)
+
+
+def journal_validators(user_id, *extra):
+    """Return (etag, last_modified) of a user's journal at its current version."""
+    version, updated_at = UserJournal.get_state(user_id)
+    return make_etag('j', user_id, version, *extra), updated_at
+
+
+def _as_utc(moment):
+    # I DateTime del database sono UTC senza timezone
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def validators_match(if_none_match, if_modified_since, etag, last_modified=None):
+    """True if parsed If-None-Match / If-Modified-Since values still match."""
+    # If-None-Match ha la precedenza su If-Modified-Since (RFC 9110)
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    if last_modified is not None and if_modified_since is not None:
+        return _as_utc(last_modified).replace(microsecond=0) <= if_modified_since
+    return False
+
+
+def is_not_modified(etag, last_modified=None):
+    """True if the request's If-None-Match / If-Modified-Since still match."""
+    return validators_match(request.if_none_match, request.if_modified_since, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach the weak ETag, Last-Modified and revalidation headers to a response."""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    # Il browser può riusare la copia solo dopo averla rivalidata, mai condivisa
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response
+
+
+def validator_headers(etag, last_modified=None):
+    """The headers of with_validators, for responses built outside Flask (ASGI)."""
+    headers = {
+        'ETag': quote_etag(etag, weak=True),
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Authorization',
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(_as_utc(last_modified))
+    return headers
+
+
+def not_modified(etag, last_modified=None):
+    """Empty 304 response carrying the same validators."""
+    return with_validators(make_response('', 304), etag, last_modified)
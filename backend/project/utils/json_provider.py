@@ -0,0 +1,56 @@
+"""
+Flask JSON provider backed by orjson (falls back to the standard library)
+"""
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson è opzionale
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Same output as Flask's default provider (sorted keys, compact unless
+    debug, dates as HTTP dates), encoded by orjson.
+
+    The only difference: non-ASCII characters are written as UTF-8 instead of
+    ``\\uXXXX`` escapes, which decodes to the same JSON.
+    """
+
+    # datetime/date/time e dataclass passano da _default di Flask come prima
+    OPTIONS = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    ) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.OPTIONS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option) + b'\n',
+            mimetype=self.mimetype
+        )
+
+
+def dumps_line(obj):
+    """Encode one NDJSON line (UTF-8 bytes, keys in insertion order)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def init_app(app):
+    """Install the orjson provider unless JSON_USE_ORJSON is disabled."""
+    if app.config.get('JSON_USE_ORJSON', True) and orjson is not None:
+        app.json = ORJSONProvider(app)
+    return app.json
@@ -0,0 +1,131 @@
+"""
+N+1 query detector for development and tests
+
+Every SELECT executed during a request is reduced to its shape (whitespace and
+literals collapsed, ``IN (?, ?, ...)`` lists folded); when the same shape runs
+more than ``NPLUSONE_THRESHOLD`` times in one request the detector logs a
+warning or, with ``NPLUSONE_ACTION='raise'`` (testing config), fails the
+request with NPlusOneError. ``track_queries()`` does the same around any block
+of code, outside of requests too (see project/testing.py). Disabled in
+production: the cursor hook is not even installed.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+from flask import request, current_app, has_request_context
+from sqlalchemy import event
+
+_ENVIRON_KEY = 'dream_keeper.nplusone'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\?|%\(\w+\)s|:\w+)(?:, (?:\?|%\(\w+\)s|:\w+))*\)', re.IGNORECASE)
+_SELECT_RE = re.compile(r'^\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+
+
+class NPlusOneError(Exception):
+    """The same statement shape ran more times than allowed in one unit of work."""
+
+
+def statement_shape(statement):
+    """Normalized form of a SQL statement, equal for all repetitions of a query."""
+    shape = _WHITESPACE_RE.sub(' ', statement).strip()
+    shape = _STRING_RE.sub('?', shape)
+    shape = _NUMBER_RE.sub('?', shape)
+    return _IN_LIST_RE.sub('IN (?)', shape)
+
+
+class QueryTracker:
+    """Statements seen in one request (or block), counted by shape."""
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+        self.total = 0
+        self.statements = []
+        self.shapes = Counter()
+
+    def add(self, statement):
+        self.total += 1
+        self.statements.append(statement)
+        if _SELECT_RE.match(statement):
+            self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self):
+        """[(shape, count)] of the SELECTs run more than ``threshold`` times."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > self.threshold]
+
+    def report(self, label):
+        lines = [f'{label}: {count}x {shape}' for shape, count in self.repeated()]
+        return '\n'.join(lines)
+
+
+class Detector:
+    """Detector settings plus the trackers of ``track_queries`` blocks."""
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold = 5
+        self.action = 'log'
+        self._blocks = []
+
+    def current(self):
+        """Tracker of the current request, or None."""
+        if not has_request_context():
+            return None
+        return request.environ.get(_ENVIRON_KEY)
+
+
+detector = Detector()
+
+
+@contextmanager
+def track_queries(threshold=None):
+    """Collect the statements run inside the block into a QueryTracker."""
+    tracker = QueryTracker(detector.threshold if threshold is None else threshold)
+    detector._blocks.append(tracker)
+    try:
+        yield tracker
+    finally:
+        detector._blocks.remove(tracker)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    tracker = detector.current()
+    if tracker is not None:
+        tracker.add(statement)
+    for block in detector._blocks:
+        block.add(statement)
+
+
+def _start_tracking():
+    request.environ[_ENVIRON_KEY] = QueryTracker(detector.threshold)
+
+
+def _check_request(response):
+    tracker = detector.current()
+    if tracker is None or not tracker.repeated():
+        return response
+    report = tracker.report(f'{request.method} {request.path}')
+    if detector.action == 'raise':
+        raise NPlusOneError(f'Repeated queries (possible N+1):\n{report}')
+    current_app.logger.warning('⚠️  Possibile N+1\n%s', report)
+    return response
+
+
+def init_app(app):
+    """Enable the detector when NPLUSONE_ENABLED is set (dev/testing configs)."""
+    detector.threshold = app.config.get('NPLUSONE_THRESHOLD', 5)
+    detector.action = app.config.get('NPLUSONE_ACTION', 'log')
+    detector.enabled = app.config.get('NPLUSONE_ENABLED', False)
+    if not detector.enabled:
+        return detector
+
+    with app.app_context():
+        from project import db
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _count_statement):
+        event.listen(engine, 'before_cursor_execute', _count_statement)
+    app.before_request(_start_tracking)
+    app.after_request(_check_request)
+    return detector
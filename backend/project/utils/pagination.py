@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import date
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a malformed cursor."""
+
+
+def encode_cursor(date_dreamed, dream_id):
+    """Encode the (date_dreamed, id) position of the last item as an opaque token.
+
+    Works for datetime positions too (feed), decoded with ``parse=datetime.fromisoformat``.
+    """
+    raw = json.dumps([date_dreamed.isoformat(), dream_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, parse=date.fromisoformat):
+    """Decode a token produced by encode_cursor into (date, id)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_iso, dream_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return parse(date_iso), int(dream_id)
+    except (ValueError, TypeError, UnicodeError, OverflowError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def paginate_by_cursor(query, date_column, id_column, cursor, per_page):
+    """Return (items, next_cursor) for a query ordered by (date desc, id desc).
+
+    Uses a row-value comparison on the (date, id) position instead of OFFSET,
+    so every page costs the same no matter how deep the client has scrolled.
+    """
+    from project import db
+
+    if cursor:
+        last_date, last_id = decode_cursor(cursor)
+        query = query.filter(db.tuple_(date_column, id_column) < (last_date, last_id))
+
+    items = query.order_by(date_column.desc(), id_column.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, date_column.key), getattr(last, id_column.key))
+    return items, next_cursor
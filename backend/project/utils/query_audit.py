@@ -0,0 +1,205 @@
+"""
+Query plan audit: replay every blueprint endpoint and EXPLAIN what it runs
+
+The workload runs against a throw-away in-memory app built from the models;
+the captured statements are then explained against the configured database,
+so missing indexes on a real (possibly not migrated) database show up too.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from project import db
+
+# Le richieste che coprono tutte le route dei blueprint.
+# {dream_id}, {friend_id}, {request_id}, {declined_id} vengono sostituiti con
+# gli ID creati dal seed (un sogno, un amico, due richieste di amicizia ricevute).
+WORKLOAD = [
+    ('POST', '/api/auth/register', {
+        'username': 'audit_new', 'email': 'audit_new@example.com', 'password': 'AuditPassw0rd'
+    }),
+    ('POST', '/api/auth/login', {'email': 'audit@example.com', 'password': 'AuditPassw0rd'}),
+    ('POST', '/api/dreams', {
+        'title': 'Nuovo volo', 'content': 'Volavo sopra le nuvole', 'date_dreamed': '2024-01-01',
+        'mood': 'happy', 'tags': ['cielo']
+    }),
+    ('GET', '/api/auth/me', None),
+    ('GET', '/api/auth/stats', None),
+    ('GET', '/api/dreams', None),
+    ('GET', '/api/dreams?page=2&per_page=5', None),
+    ('GET', '/api/dreams?cursor=&per_page=5', None),
+    ('GET', '/api/dreams?search=volo', None),
+    ('GET', '/api/dreams?tag=mare', None),
+    ('GET', '/api/dreams/{dream_id}', None),
+    ('GET', '/api/dreams/search?q=volo', None),
+    ('GET', '/api/dreams/stats', None),
+    ('GET', '/api/dreams/tags', None),
+    ('POST', '/api/dreams/bulk', [
+        {'title': 'Importato', 'content': 'Sogno importato', 'date_dreamed': '2024-02-01', 'tags': ['mare']}
+    ]),
+    ('GET', '/api/dreams/export', None),
+    ('POST', '/api/batch', {'requests': [
+        {'path': '/api/auth/me'}, {'path': '/api/dreams/stats'}
+    ]}),
+    ('PUT', '/api/dreams/{dream_id}', {'title': 'Volo aggiornato', 'tags': ['mare', 'cielo']}),
+    ('DELETE', '/api/dreams/{dream_id}', None),
+    ('GET', '/api/users/find?q=audit', None),
+    ('POST', '/api/friends/requests', {'username': 'audit_new'}),
+    ('GET', '/api/friends/requests', None),
+    ('POST', '/api/friends/requests/{request_id}/accept', None),
+    ('POST', '/api/friends/requests/{declined_id}/decline', None),
+    ('GET', '/api/friends', None),
+    ('GET', '/api/feed', None),
+    ('POST', '/api/events/ticket', None),
+    ('DELETE', '/api/friends/{friend_id}', None),
+]
+
+# Route escluse dal workload: lo stream SSE resta aperto e dopo
+# l'autenticazione non esegue query (il ticket si chiede nel workload)
+UNAUDITED = {('GET', '/api/events')}
+
+SEED_DREAMS = 30
+
+_FULL_SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?P<rest>.*)$')
+
+
+@contextmanager
+def capture_statements(engine):
+    """Collect (statement, parameters) for every cursor execution on the engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany and parameters:
+            parameters = parameters[0]
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _seed():
+    """Create an audit user, a small journal and friend requests; return (headers, ids)."""
+    from flask_jwt_extended import create_access_token
+    from project.models import User, Dream, Friendship
+
+    user = User(username='audit_user', email='audit@example.com', password='AuditPassw0rd')
+    user.save_to_db()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+    today = date.today()
+    for i in range(SEED_DREAMS):
+        dream = Dream(
+            title=f'Volo {i}',
+            content='Sognavo di volare sopra il mare ' * 5,
+            date_dreamed=today - timedelta(days=i),
+            user_id=user.id,
+            mood='happy' if i % 2 else 'weird',
+            is_lucid=i % 3 == 0
+        )
+        dream.set_tags_from_list(['mare', f'tag{i % 4}'])
+        dream.save_to_db()
+
+    ids = {'dream_id': dream.id}
+    for key, name in (('request_id', 'audit_friend'), ('declined_id', 'audit_stranger')):
+        other = User(username=name, email=f'{name}@example.com', password='AuditPassw0rd')
+        other.save_to_db()
+        Dream(title='Condiviso', content='Un sogno pubblico', date_dreamed=today,
+              user_id=other.id, is_private=False).save_to_db()
+        request = Friendship(other.id, user.id)
+        request.save_to_db()
+        ids[key] = request.id
+        if key == 'request_id':
+            ids['friend_id'] = other.id
+    return headers, ids
+
+
+def run_workload(scratch_app):
+    """Drive every WORKLOAD request; return [(label, status, statements)]."""
+    results = []
+    client = scratch_app.test_client()
+
+    with scratch_app.app_context():
+        headers, ids = _seed()
+        engine = db.engine
+
+        for method, path, body in WORKLOAD:
+            url = path.format(**ids)
+            with capture_statements(engine) as statements:
+                response = client.open(url, method=method, json=body, headers=headers)
+            results.append((f'{method} {path}', response.status_code, list(statements)))
+
+    return results
+
+
+def uncovered_routes(app):
+    """Blueprint routes that the workload does not exercise."""
+    covered = {(method, re.sub(r'\{\w+\}', '{}', path.split('?')[0])) for method, path, _ in WORKLOAD}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if '.' not in rule.endpoint or rule.endpoint.startswith('static'):
+            continue
+        path = re.sub(r'<(?:\w+:)?\w+>', '{}', rule.rule)
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (method, path) not in covered and (method, path) not in UNAUDITED:
+                missing.append(f'{method} {path}')
+    return missing
+
+
+def explain(statement, parameters):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    connection = db.session.connection()
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters or ()).all()
+    return [row[-1] for row in rows]
+
+
+def classify(detail):
+    """Classify a plan line: 'full-scan', 'index-scan', 'temp-sort' or None."""
+    match = _FULL_SCAN_RE.match(detail)
+    if match:
+        rest = match.group('rest')
+        if 'VIRTUAL TABLE' in rest:
+            return None
+        if 'USING' in rest:
+            return 'index-scan'
+        return 'full-scan'
+    if detail.startswith('USE TEMP B-TREE'):
+        return 'temp-sort'
+    return None
+
+
+def audit(scratch_app):
+    """Run the workload and explain each distinct statement on the current app.
+
+    Returns a list of dicts: endpoint, status, statement, plan, findings.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('EXPLAIN QUERY PLAN audit supports SQLite databases only')
+
+    report = []
+    seen = set()
+    for label, status, statements in run_workload(scratch_app):
+        for statement, parameters in statements:
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            if verb not in ('SELECT', 'UPDATE', 'DELETE', 'WITH') or statement in seen:
+                continue
+            seen.add(statement)
+            try:
+                plan = explain(statement, parameters)
+            except Exception as e:
+                db.session.rollback()
+                plan = [f'ERROR: {e}']
+            findings = [(kind, line) for line in plan for kind in [classify(line)] if kind]
+            report.append({
+                'endpoint': label,
+                'status': status,
+                'statement': ' '.join(statement.split()),
+                'plan': plan,
+                'findings': findings,
+            })
+    db.session.rollback()
+    return report
@@ -0,0 +1,268 @@
+"""
+Rate limiting with a sliding-window counter and pluggable storage
+
+Each key keeps only two counters (current and previous fixed window); the
+estimate ``prev * (1 - elapsed/window) + curr`` approximates a true sliding
+window with O(1) memory per key. Backends:
+
+- ``memory://``            in-process, lock striping, idle-key eviction
+- ``sqlite:///path.db``    shared across workers on the same host
+- ``redis://host:6379/0``  shared across hosts (needs the ``redis`` package)
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class RateLimitResult:
+    """Outcome of a rate limit hit."""
+
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset_after')
+
+    def __init__(self, allowed, limit, remaining, reset_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+
+    def __bool__(self):
+        return self.allowed
+
+
+def _window_position(now, window):
+    """Return (window index, fraction of the current window elapsed)."""
+    index = int(now // window)
+    return index, (now - index * window) / window
+
+
+def _estimate(prev, curr, elapsed_fraction):
+    return prev * (1.0 - elapsed_fraction) + curr
+
+
+def _result(allowed, limit, estimate, window, elapsed_fraction):
+    remaining = max(0, int(math.floor(limit - estimate)))
+    return RateLimitResult(allowed, limit, remaining, window * (1.0 - elapsed_fraction))
+
+
+class MemoryBackend:
+    """In-process backend: one dict per lock stripe, idle keys evicted lazily."""
+
+    name = 'memory'
+
+    def __init__(self, stripes=64, sweep_every=256):
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+        self._sweep_every = sweep_every
+        self._ops = 0
+        self._next_sweep = 0
+
+    def _stripe(self, key):
+        return zlib.crc32(key.encode('utf-8')) % len(self._stripes)
+
+    def hit(self, key, limit, window, cost=1, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = _window_position(now, window)
+        stripe = self._stripe(key)
+        entries, lock = self._stripes[stripe]
+
+        with lock:
+            # entry = [window index, current count, previous count, expires_at]
+            entry = entries.get(key)
+            if entry is None or entry[0] < index - 1:
+                entry = [index, 0, 0, 0]
+            elif entry[0] == index - 1:
+                entry = [index, 0, entry[1], 0]
+
+            estimate = _estimate(entry[2], entry[1], elapsed)
+            allowed = estimate + cost <= limit
+            if allowed:
+                entry[1] += cost
+                estimate += cost
+            entry[3] = (index + 2) * window
+            entries[key] = entry
+
+        # Ogni sweep_every operazioni ripulisce una stripe, a rotazione
+        # (contatore non protetto da lock: basta che sia approssimativo)
+        self._ops += 1
+        if self._ops >= self._sweep_every:
+            self._ops = 0
+            self._next_sweep = (self._next_sweep + 1) % len(self._stripes)
+            self._evict(self._next_sweep, now)
+
+        return _result(allowed, limit, estimate, window, elapsed)
+
+    def _evict(self, stripe, now):
+        entries, lock = self._stripes[stripe]
+        with lock:
+            for key in [key for key, entry in entries.items() if entry[3] <= now]:
+                del entries[key]
+
+    def reset(self):
+        for entries, lock in self._stripes:
+            with lock:
+                entries.clear()
+
+    def __len__(self):
+        return sum(len(entries) for entries, _ in self._stripes)
+
+
+class SQLiteBackend:
+    """Shared backend on a SQLite file (all workers of one host)."""
+
+    name = 'sqlite'
+
+    def __init__(self, path, sweep_every=1024):
+        self.path = path
+        self._local = threading.local()
+        self._sweep_every = sweep_every
+        self._ops = 0
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits ('
+                'key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, '
+                'curr INTEGER NOT NULL, prev INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limits_expires ON rate_limits (expires_at)')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key, limit, window, cost=1, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = _window_position(now, window)
+        connection = self._connect()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT window_index, curr, prev FROM rate_limits WHERE key = ?', (key,)
+            ).fetchone()
+            curr, prev = 0, 0
+            if row is not None:
+                if row[0] == index:
+                    curr, prev = row[1], row[2]
+                elif row[0] == index - 1:
+                    prev = row[1]
+
+            estimate = _estimate(prev, curr, elapsed)
+            allowed = estimate + cost <= limit
+            if allowed:
+                curr += cost
+                estimate += cost
+            connection.execute(
+                'INSERT INTO rate_limits (key, window_index, curr, prev, expires_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET window_index = excluded.window_index, '
+                'curr = excluded.curr, prev = excluded.prev, expires_at = excluded.expires_at',
+                (key, index, curr, prev, (index + 2) * window)
+            )
+
+            self._ops += 1
+            if self._ops >= self._sweep_every:
+                self._ops = 0
+                connection.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        return _result(allowed, limit, estimate, window, elapsed)
+
+    def reset(self):
+        self._connect().execute('DELETE FROM rate_limits')
+
+
+class RedisBackend:
+    """Shared backend on any server speaking the Redis protocol.
+
+    Counters live in ``rl:<key>:<window index>`` keys that expire on their
+    own, so idle keys never need a sweep.
+    """
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='rl'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def hit(self, key, limit, window, cost=1, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = _window_position(now, window)
+        curr_key = f'{self.prefix}:{key}:{index}'
+        prev_key = f'{self.prefix}:{key}:{index - 1}'
+        ttl = int(math.ceil(window * 2))
+
+        # Incrementa subito e annulla se oltre il limite: tra worker concorrenti
+        # si può solo negare qualche richiesta in più, mai superare il limite
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incrby(curr_key, cost)
+        pipe.expire(curr_key, ttl)
+        pipe.get(prev_key)
+        curr, _, prev = pipe.execute()
+
+        estimate = _estimate(int(prev or 0), int(curr), elapsed)
+        allowed = estimate <= limit
+        if not allowed:
+            self.client.decrby(curr_key, cost)
+            estimate -= cost
+        return _result(allowed, limit, estimate, window, elapsed)
+
+    def reset(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+
+def create_backend(url):
+    """Build a backend from a storage URL."""
+    url = url or 'memory://'
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return SQLiteBackend(path)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend.from_url(url)
+    raise ValueError(f'Unsupported rate limit storage: {url}')
+
+
+class RateLimiter:
+    """Front object used by the routes; wraps the configured backend."""
+
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+
+    def hit(self, key, limit, window, cost=1):
+        if not self.enabled:
+            return RateLimitResult(True, limit, limit, 0)
+        return self.backend.hit(key, limit, window, cost=cost)
+
+
+limiter = RateLimiter()
+
+
+def init_app(app):
+    """Configure the limiter from RATELIMIT_STORAGE_URL / RATELIMIT_ENABLED."""
+    url = app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
+    try:
+        backend = create_backend(url)
+    except ImportError:
+        print("⚠️  redis non disponibile, rate limiting in memoria")
+        backend = MemoryBackend()
+    limiter.backend = backend
+    limiter.enabled = app.config.get('RATELIMIT_ENABLED', True)
+    return limiter
@@ -0,0 +1,211 @@
+"""
+Response cache for the read endpoints, invalidated by every dream write
+
+Entries are keyed by user, path and sorted query parameters, plus a per-user
+generation number: a write bumps the generation (``dreams_changed`` signal,
+sent after commit), so all of that user's entries become unreachable at once
+and age out of the LRU. Backends:
+
+- ``memory://``            in-process LRU with TTL, entry and byte caps
+- ``redis://host:6379/1``  shared across workers/hosts (needs ``redis``)
+
+With several workers the in-process backend only sees the writes of its own
+worker: use a shared backend there (the production config does so).
+"""
+import json
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+from flask import request, Response
+from flask_jwt_extended import current_user
+
+from project.signals import dreams_changed
+from project.utils.cache import TTLCache
+
+# Header della risposta originale riprodotti sulle risposte dalla cache
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+class MemoryCacheBackend:
+    """In-process backend: a TTLCache plus a generation counter per user."""
+
+    name = 'memory'
+
+    def __init__(self, maxsize=2048, maxbytes=32 * 1024 * 1024, ttl=30):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, maxbytes=maxbytes)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        return self._generations.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry, ttl):
+        self.cache.set(key, entry, ttl=ttl, size=len(entry[0]))
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self._generations.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class RedisCacheBackend:
+    """Shared backend: entries with SETEX, generations with INCR."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='rc', ttl=30):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url, ttl=30):
+        import redis
+        return cls(redis.Redis.from_url(url), ttl=ttl)
+
+    def generation(self, user_id):
+        return int(self.client.get(f'{self.prefix}:gen:{user_id}') or 0)
+
+    def bump(self, user_id):
+        self.client.incr(f'{self.prefix}:gen:{user_id}')
+
+    def get(self, key):
+        raw = self.client.get(f'{self.prefix}:{key}')
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        header_length, _, rest = raw.partition(b'\n')
+        header_length = int(header_length)
+        meta = json.loads(rest[:header_length])
+        return rest[header_length:], meta['mimetype'], meta['headers']
+
+    def set(self, key, entry, ttl):
+        body, mimetype, headers = entry
+        meta = json.dumps({'mimetype': mimetype, 'headers': headers}).encode('utf-8')
+        self.client.setex(
+            f'{self.prefix}:{key}', int(ttl or self.ttl),
+            str(len(meta)).encode('ascii') + b'\n' + meta + body
+        )
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def create_backend(url, maxsize=2048, maxbytes=32 * 1024 * 1024, ttl=30):
+    """Build a backend from a storage URL."""
+    url = url or 'memory://'
+    if url.startswith('memory://'):
+        return MemoryCacheBackend(maxsize=maxsize, maxbytes=maxbytes, ttl=ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCacheBackend.from_url(url, ttl=ttl)
+    raise ValueError(f'Unsupported response cache storage: {url}')
+
+
+class ResponseCache:
+    """Front object used by the routes; wraps the configured backend."""
+
+    def __init__(self, backend=None, enabled=True, ttl=30):
+        self.backend = backend or MemoryCacheBackend(ttl=ttl)
+        self.enabled = enabled
+        self.ttl = ttl
+        self.invalidations = 0
+
+    def key_for(self, user_id, path, args):
+        generation = self.backend.generation(user_id)
+        query = urlencode(sorted(args.items(multi=True)))
+        return f'{user_id}:{generation}:{path}?{query}'
+
+    def invalidate_user(self, user_id):
+        self.backend.bump(user_id)
+        self.invalidations += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = dict(self.backend.stats())
+        stats['backend'] = self.backend.name
+        stats['enabled'] = self.enabled
+        stats['invalidations'] = self.invalidations
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_ratio'] = round(stats.get('hits', 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def _entry_response(entry):
+    body, mimetype, headers = entry
+    response = Response(body, status=200, mimetype=mimetype)
+    for name, value in headers.items():
+        response.headers[name] = value
+    return response
+
+
+def cached_response(ttl=None):
+    """Cache successful GET responses of the current user (use after @jwt_required)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or request.method != 'GET':
+                return view(*args, **kwargs)
+
+            key = response_cache.key_for(current_user.id, request.path, request.args)
+            entry = response_cache.backend.get(key)
+            if entry is not None:
+                response = _entry_response(entry)
+                response.headers['X-Cache'] = 'HIT'
+                # If-None-Match / If-Modified-Since sull'ETag salvato -> 304
+                return response.make_conditional(request)
+
+            result = view(*args, **kwargs)
+            response, status = (result if isinstance(result, tuple) else (result, 200))[:2]
+            if status == 200 and isinstance(response, Response) and not response.is_streamed:
+                headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                response_cache.backend.set(key, (response.get_data(), response.mimetype, headers), ttl or response_cache.ttl)
+                response.headers['X-Cache'] = 'MISS'
+            return result
+        return wrapper
+    return decorator
+
+
+def _on_dreams_changed(sender, user_id=None, **kwargs):
+    response_cache.invalidate_user(user_id)
+
+
+def init_app(app):
+    """Configure the cache from the RESPONSE_CACHE_* settings."""
+    ttl = app.config.get('RESPONSE_CACHE_TTL', 30)
+    try:
+        backend = create_backend(
+            app.config.get('RESPONSE_CACHE_URL', 'memory://'),
+            maxsize=app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 2048),
+            maxbytes=app.config.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+            ttl=ttl
+        )
+    except ImportError:
+        print("⚠️  redis non disponibile, cache delle risposte in memoria")
+        backend = MemoryCacheBackend(ttl=ttl)
+    response_cache.backend = backend
+    response_cache.ttl = ttl
+    response_cache.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+    dreams_changed.connect(_on_dreams_changed)
+    return response_cache
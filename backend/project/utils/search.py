@@ -0,0 +1,237 @@
+"""
+Full-text search backends for dreams
+
+The index lives next to the ``dreams`` table and is kept in sync by the
+database itself (FTS5 triggers on SQLite, an expression GIN index on
+Postgres), so the models never have to remember to update it.
+"""
+import re
+
+from sqlalchemy import text, false
+from sqlalchemy.exc import OperationalError
+
+from project import db
+from project.models import Dream
+
+# Peso delle colonne nel ranking: titolo e tag contano più del contenuto
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+TAGS_WEIGHT = 5.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(search_term):
+    """Split a raw search term into plain word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(search_term or '')]
+
+
+class LikeSearchBackend:
+    """Fallback backend using LIKE filters (full scan, no ranking)."""
+
+    name = 'like'
+
+    def install(self):
+        """Nothing to install."""
+        return False
+
+    def rebuild(self):
+        """Nothing to rebuild."""
+        return None
+
+    def filter(self, query, search_term):
+        """Restrict a Dream query to the rows matching the search term."""
+        return query.filter(
+            db.or_(
+                Dream.title.contains(search_term),
+                Dream.content.contains(search_term),
+                Dream.tags.contains(search_term)
+            )
+        )
+
+    def search(self, query, search_term):
+        """Filter and order a Dream query by relevance."""
+        return self.filter(query, search_term).order_by(Dream.date_dreamed.desc())
+
+
+class SQLiteFTS5Backend(LikeSearchBackend):
+    """SQLite FTS5 external-content index synced by triggers."""
+
+    name = 'sqlite_fts5'
+    table = 'dreams_fts'
+
+    DDL = [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            title, content, tags,
+            content='dreams', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON dreams BEGIN
+            INSERT INTO {table}(rowid, title, content, tags)
+            VALUES (new.id, new.title, new.content, new.tags);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON dreams BEGIN
+            INSERT INTO {table}({table}, rowid, title, content, tags)
+            VALUES ('delete', old.id, old.title, old.content, old.tags);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF title, content, tags ON dreams BEGIN
+            INSERT INTO {table}({table}, rowid, title, content, tags)
+            VALUES ('delete', old.id, old.title, old.content, old.tags);
+            INSERT INTO {table}(rowid, title, content, tags)
+            VALUES (new.id, new.title, new.content, new.tags);
+        END
+        """,
+    ]
+
+    def install(self):
+        """Create the FTS table and triggers; rebuild if the table is new."""
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': self.table}
+        ).scalar()
+        for statement in self.DDL:
+            db.session.execute(text(statement))
+        if not exists:
+            self.rebuild()
+        db.session.commit()
+        return not exists
+
+    def rebuild(self):
+        """Repopulate the index from the dreams table."""
+        db.session.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"))
+
+    @staticmethod
+    def build_match(search_term):
+        """Build an FTS5 MATCH expression with prefix matching on every token."""
+        tokens = tokenize(search_term)
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def _matches(self, search_term):
+        match = self.build_match(search_term)
+        if not match:
+            return None
+        return text(
+            f"SELECT rowid AS id, bm25({self.table}, :w_title, :w_content, :w_tags) AS rank "
+            f"FROM {self.table} WHERE {self.table} MATCH :match"
+        ).bindparams(
+            match=match,
+            w_title=TITLE_WEIGHT,
+            w_content=CONTENT_WEIGHT,
+            w_tags=TAGS_WEIGHT
+        ).columns(id=db.Integer, rank=db.Float).subquery('fts')
+
+    def filter(self, query, search_term):
+        matches = self._matches(search_term)
+        if matches is None:
+            return query.filter(false())
+        return query.filter(Dream.id.in_(db.select(matches.c.id)))
+
+    def search(self, query, search_term):
+        matches = self._matches(search_term)
+        if matches is None:
+            return query.filter(false())
+        # bm25() restituisce valori negativi: più basso = più rilevante
+        return query.join(matches, matches.c.id == Dream.id).order_by(
+            matches.c.rank, Dream.date_dreamed.desc()
+        )
+
+
+class PostgresFTSBackend(LikeSearchBackend):
+    """Postgres tsvector backend backed by an expression GIN index."""
+
+    name = 'postgres'
+    index = 'ix_dreams_search_vector'
+    config = 'simple'
+
+    VECTOR = (
+        "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(tags, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(content, '')), 'D')"
+    )
+
+    def install(self):
+        """Create the expression index used by the tsvector queries."""
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.index} ON dreams USING GIN (({self.VECTOR}))"
+        ))
+        db.session.commit()
+        return False
+
+    @staticmethod
+    def build_query(search_term):
+        """Build a to_tsquery expression with prefix matching on every token."""
+        return ' & '.join(f'{token}:*' for token in tokenize(search_term))
+
+    def _match_clause(self, search_term):
+        tsquery = self.build_query(search_term)
+        if not tsquery:
+            return None, None
+        clause = text(
+            f"({self.VECTOR}) @@ to_tsquery('{self.config}', :tsquery)"
+        ).bindparams(tsquery=tsquery)
+        rank = text(
+            f"ts_rank(({self.VECTOR}), to_tsquery('{self.config}', :tsquery_rank))"
+        ).bindparams(tsquery_rank=tsquery)
+        return clause, rank
+
+    def filter(self, query, search_term):
+        clause, _ = self._match_clause(search_term)
+        if clause is None:
+            return query.filter(false())
+        return query.filter(clause)
+
+    def search(self, query, search_term):
+        clause, rank = self._match_clause(search_term)
+        if clause is None:
+            return query.filter(false())
+        return query.filter(clause).order_by(db.desc(rank), Dream.date_dreamed.desc())
+
+
+BACKENDS = {
+    LikeSearchBackend.name: LikeSearchBackend,
+    SQLiteFTS5Backend.name: SQLiteFTS5Backend,
+    PostgresFTSBackend.name: PostgresFTSBackend,
+}
+
+_DIALECT_BACKENDS = {
+    'sqlite': SQLiteFTS5Backend.name,
+    'postgresql': PostgresFTSBackend.name,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the active search backend (LIKE fallback if none installed)."""
+    return _backend or LikeSearchBackend()
+
+
+def init_app(app):
+    """Select, install and activate the search backend for this app."""
+    global _backend
+
+    name = app.config.get('SEARCH_BACKEND', 'auto')
+    with app.app_context():
+        if name == 'auto':
+            name = _DIALECT_BACKENDS.get(db.engine.dialect.name, LikeSearchBackend.name)
+
+        backend = BACKENDS[name]()
+        try:
+            if backend.install():
+                print(f"🔎 Indice di ricerca '{backend.name}' creato e popolato")
+        except OperationalError as e:
+            # Es. SQLite compilato senza FTS5
+            db.session.rollback()
+            print(f"⚠️  Backend di ricerca '{backend.name}' non disponibile: {e}")
+            backend = LikeSearchBackend()
+
+    _backend = backend
+    return backend
@@ -1,11 +1,17 @@
 """
 Security utilities for authentication and authorization
 """
+import threading
+from collections import namedtuple
 from functools import wraps
 from flask import jsonify, request, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 import jwt
 import datetime
+from project import db, jwt as jwt_manager
 from project.models import User
+from project.utils.cache import TTLCache
 
 # Configurazione JWT centralizzata
 JWT_SECRET_KEY = 'my_super_secret_key_2024'
@@ -13,6 +19,111 @@ JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
 
+# Identità utente in cache: evita una query per richiesta solo per sapere
+# che l'utente del token esiste ed è attivo
+UserIdentity = namedtuple('UserIdentity', ['id', 'username', 'email', 'is_active', 'created_at'])
+
+_user_cache = TTLCache(maxsize=1024, ttl=60)
+
+# Incrementato a ogni invalidazione: una lettura iniziata prima non finisce in cache
+_invalidations = 0
+_invalidations_lock = threading.Lock()
+
+_PENDING_KEY = 'pending_user_invalidations'
+
+
+def load_user_identity(user_id):
+    """Return the cached UserIdentity for a user ID (None if not found)."""
+    identity = _user_cache.get(user_id)
+    if identity is not None:
+        return identity
+    
+    generation = _invalidations
+    row = db.session.query(
+        User.id, User.username, User.email, User.is_active, User.created_at
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    
+    identity = UserIdentity(*row)
+    with _invalidations_lock:
+        if generation == _invalidations:
+            _user_cache.set(user_id, identity)
+    return identity
+
+
+def invalidate_user(user_id):
+    """Drop a user from the identity cache."""
+    global _invalidations
+    with _invalidations_lock:
+        _invalidations += 1
+        _user_cache.delete(user_id)
+
+
+def user_cache_stats():
+    """Hit/miss counters of the identity cache."""
+    return _user_cache.stats()
+
+
+def _record_user_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+def _invalidate_after_commit(session):
+    # Solo dopo il commit: prima, una richiesta concorrente rileggerebbe
+    # (e rimetterebbe in cache) la riga non ancora aggiornata
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        invalidate_user(user_id)
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _jwt_user_lookup(jwt_header, jwt_data):
+    """flask_jwt_extended user_lookup_loader: resolve `current_user` from the cache."""
+    try:
+        identity = load_user_identity(int(jwt_data['sub']))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if identity is None or not identity.is_active:
+        return None
+    return identity
+
+
+def _jwt_user_lookup_error(jwt_header, jwt_data):
+    """Response when the token's user is missing or disabled."""
+    try:
+        identity = load_user_identity(int(jwt_data['sub']))
+    except (KeyError, TypeError, ValueError):
+        identity = None
+    if identity is not None and not identity.is_active:
+        return jsonify({'message': 'Utente disattivato'}), 401
+    return jsonify({'message': 'User not found'}), 404
+
+
+def init_app(app):
+    """Configure the identity cache and register the JWT user loader."""
+    _user_cache.maxsize = app.config.get('USER_CACHE_SIZE', 1024)
+    _user_cache.ttl = app.config.get('USER_CACHE_TTL', 60)
+    _user_cache.clear()  # una nuova app può avere un altro database (test)
+    
+    jwt_manager.user_lookup_loader(_jwt_user_lookup)
+    jwt_manager.user_lookup_error_loader(_jwt_user_lookup_error)
+    
+    # Invalida la cache dopo il commit di ogni update/delete dell'utente.
+    # La cache è per processo: con più worker gli altri vedono la modifica
+    # (es. utente disattivato) solo alla scadenza, entro USER_CACHE_TTL
+    for event_name in ('after_update', 'after_delete'):
+        if not event.contains(User, event_name, _record_user_change):
+            event.listen(User, event_name, _record_user_change)
+    if not event.contains(Session, 'after_commit', _invalidate_after_commit):
+        event.listen(Session, 'after_commit', _invalidate_after_commit)
+        event.listen(Session, 'after_rollback', _discard_after_rollback)
+
+
 def create_jwt_token(user):
     """Crea un token JWT per l'utente specificato."""
     payload = {
@@ -207,37 +318,12 @@ def sanitize_input(data):
     return data
 
 
-def rate_limit_check(user_id, action, limit=10, window=3600):
+def rate_limit_check(user_id, action, limit=10, window=3600, cost=1):
     """
-    Basic rate limiting check (in-memory implementation).
-    In production, use Redis or similar for distributed rate limiting.
+    Rate limiting check (sliding-window counter).
+    Lo storage è configurato con RATELIMIT_STORAGE_URL (memory, sqlite, redis),
+    vedi project.utils.ratelimit.
     """
-    from datetime import datetime, timedelta
-    import threading
+    from project.utils.ratelimit import limiter
     
-    # Simple in-memory storage (not suitable for production)
-    if not hasattr(rate_limit_check, 'storage'):
-        rate_limit_check.storage = {}
-        rate_limit_check.lock = threading.Lock()
-    
-    with rate_limit_check.lock:
-        key = f"{user_id}:{action}"
-        now = datetime.utcnow()
-        
-        if key not in rate_limit_check.storage:
-            rate_limit_check.storage[key] = []
-        
-        # Remove old entries
-        cutoff = now - timedelta(seconds=window)
-        rate_limit_check.storage[key] = [
-            timestamp for timestamp in rate_limit_check.storage[key]
-            if timestamp > cutoff
-        ]
-        
-        # Check if limit exceeded
-        if len(rate_limit_check.storage[key]) >= limit:
-            return False
-        
-        # Add current request
-        rate_limit_check.storage[key].append(now)
-        return True
+    return limiter.hit(f"{user_id}:{action}", limit, window, cost=cost).allowed
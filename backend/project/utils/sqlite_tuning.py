@@ -0,0 +1,45 @@
+"""
+SQLite connection tuning: PRAGMAs applied to every new pooled connection
+"""
+from sqlalchemy import event
+
+from project import db
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """Run ``PRAGMA name=value`` for each item on a raw DB-API connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def current_pragmas(connection, names):
+    """Read back the effective PRAGMA values on a SQLAlchemy connection."""
+    return {
+        name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        for name in names
+    }
+
+
+def init_app(app):
+    """Register the connect hook on the app's engine (file-based SQLite only)."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return None
+    if engine.url.database in (None, '', ':memory:'):
+        return None
+
+    # busy_timeout per primo: cambiare journal_mode richiede un lock
+    ordered = dict(sorted(pragmas.items(), key=lambda item: item[0] != 'busy_timeout'))
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, ordered)
+
+    if not event.contains(engine, 'connect', set_sqlite_pragmas):
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+    return ordered
@@ -0,0 +1,349 @@
+"""
+Username type-ahead for /api/users/find
+
+Prefix matches come from an in-memory index of the normalized usernames,
+warmed at startup and updated when registrations commit (with a range scan
+of the ``username_lower`` index as fallback). When the prefixes do not fill the
+page, infix matches come from a trigram index kept by the database
+(FTS5 ``trigram`` on SQLite, ``pg_trgm`` GIN on Postgres).
+"""
+import bisect
+import threading
+from array import array
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+from project import db
+from project.models import User
+
+# I trigrammi non indicizzano termini più corti di 3 caratteri
+MIN_INFIX_LENGTH = 3
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string sorting after every string that starts with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class UsernameIndex:
+    """Sorted in-memory index of (username_lower, id) for prefix lookups.
+
+    All the usernames sharing a prefix are one contiguous slice of a sorted
+    list, so a lookup is a bisect plus a short walk, like descending a trie,
+    with two flat arrays instead of one node per character. Users registered
+    by other workers are picked up by ``sync`` (a primary-key range read).
+    """
+
+    def __init__(self):
+        self.keys = []         # username_lower, ordinati
+        self.ids = array('q')  # id dell'utente alla stessa posizione
+        self.max_id = 0
+        self.warm = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def warm_up(self):
+        """Load every username from the database."""
+        # Ordinati in Python: la collation del database (es. Postgres) può differire
+        rows = sorted(tuple(row) for row in db.session.execute(select(User.username_lower, User.id)))
+        with self._lock:
+            self.keys = [username_lower for username_lower, _ in rows]
+            self.ids = array('q', (user_id for _, user_id in rows))
+            self.max_id = max(self.ids, default=0)
+            self.warm = True
+        return len(rows)
+
+    def _position(self, username_lower, user_id):
+        position = bisect.bisect_left(self.keys, username_lower)
+        while position < len(self.keys) and self.keys[position] == username_lower:
+            if self.ids[position] >= user_id:
+                break
+            position += 1
+        return position
+
+    def add(self, username_lower, user_id):
+        with self._lock:
+            position = self._position(username_lower, user_id)
+            if (position < len(self.keys) and self.keys[position] == username_lower
+                    and self.ids[position] == user_id):
+                return
+            self.keys.insert(position, username_lower)
+            self.ids.insert(position, user_id)
+
+    def discard(self, username_lower, user_id):
+        with self._lock:
+            position = self._position(username_lower, user_id)
+            if (position < len(self.keys) and self.keys[position] == username_lower
+                    and self.ids[position] == user_id):
+                del self.keys[position]
+                del self.ids[position]
+
+    def sync(self):
+        """Add the users registered since the last sync (also by other workers)."""
+        rows = db.session.execute(
+            select(User.username_lower, User.id).where(User.id > self.max_id).order_by(User.id)
+        ).all()
+        for username_lower, user_id in rows:
+            self.add(username_lower, user_id)
+        if rows:
+            self.max_id = max(self.max_id, rows[-1][1])
+
+    def prefix(self, prefix, limit, exclude_id=None):
+        """IDs of the first ``limit`` users whose username starts with ``prefix``."""
+        user_ids = []
+        with self._lock:
+            position = bisect.bisect_left(self.keys, prefix)
+            while position < len(self.keys) and len(user_ids) < limit:
+                if not self.keys[position].startswith(prefix):
+                    break
+                if self.ids[position] != exclude_id:
+                    user_ids.append(self.ids[position])
+                position += 1
+        return user_ids
+
+
+class LikeUserSearch:
+    """Fallback infix search with LIKE (full scan of users)."""
+
+    name = 'like'
+
+    def install(self):
+        """Nothing to install."""
+        return False
+
+    def rebuild(self):
+        """Nothing to rebuild."""
+        return None
+
+    def infix(self, term, limit, exclude_ids):
+        """IDs of users whose username contains ``term``, shortest first."""
+        return db.session.execute(
+            select(User.id).where(
+                User.username_lower.contains(term, autoescape=True),
+                User.id.not_in(exclude_ids)
+            ).order_by(db.func.length(User.username_lower), User.username_lower).limit(limit)
+        ).scalars().all()
+
+
+class SQLiteTrigramUserSearch(LikeUserSearch):
+    """SQLite FTS5 trigram index over users.username_lower, synced by triggers."""
+
+    name = 'sqlite_trigram'
+    table = 'users_fts'
+
+    DDL = [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            username_lower, content='users', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON users BEGIN
+            INSERT INTO {table}(rowid, username_lower) VALUES (new.id, new.username_lower);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON users BEGIN
+            INSERT INTO {table}({table}, rowid, username_lower) VALUES ('delete', old.id, old.username_lower);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF username_lower ON users BEGIN
+            INSERT INTO {table}({table}, rowid, username_lower) VALUES ('delete', old.id, old.username_lower);
+            INSERT INTO {table}(rowid, username_lower) VALUES (new.id, new.username_lower);
+        END
+        """,
+    ]
+
+    def install(self):
+        """Create the trigram table and triggers; rebuild if the table is new."""
+        exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': self.table}
+        ).scalar()
+        for statement in self.DDL:
+            db.session.execute(text(statement))
+        if not exists:
+            self.rebuild()
+        db.session.commit()
+        return not exists
+
+    def rebuild(self):
+        """Repopulate the index from the users table."""
+        db.session.execute(text(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')"))
+
+    def infix(self, term, limit, exclude_ids):
+        if len(term) < MIN_INFIX_LENGTH:
+            return []
+        matches = text(
+            f"SELECT rowid AS id FROM {self.table} WHERE {self.table} MATCH :match"
+        ).bindparams(match='"' + term.replace('"', '""') + '"').columns(id=db.Integer).subquery('users_fts')
+        return db.session.execute(
+            select(User.id).where(
+                User.id.in_(select(matches.c.id)),
+                User.id.not_in(exclude_ids)
+            ).order_by(db.func.length(User.username_lower), User.username_lower).limit(limit)
+        ).scalars().all()
+
+
+class PostgresTrigramUserSearch(LikeUserSearch):
+    """Postgres pg_trgm GIN index: LIKE '%term%' becomes an index lookup."""
+
+    name = 'postgres_trgm'
+    index = 'ix_users_username_trgm'
+
+    def install(self):
+        """Enable pg_trgm and create the trigram index."""
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {self.index} ON users USING GIN (username_lower gin_trgm_ops)"
+        ))
+        db.session.commit()
+        return False
+
+    def infix(self, term, limit, exclude_ids):
+        if len(term) < MIN_INFIX_LENGTH:
+            return []
+        return super().infix(term, limit, exclude_ids)
+
+
+BACKENDS = {
+    LikeUserSearch.name: LikeUserSearch,
+    SQLiteTrigramUserSearch.name: SQLiteTrigramUserSearch,
+    PostgresTrigramUserSearch.name: PostgresTrigramUserSearch,
+}
+
+_DIALECT_BACKENDS = {
+    'sqlite': SQLiteTrigramUserSearch.name,
+    'postgresql': PostgresTrigramUserSearch.name,
+}
+
+_backend = None
+
+
+def get_user_search_backend():
+    """Return the active infix backend (LIKE fallback if none installed)."""
+    return _backend or LikeUserSearch()
+
+
+def get_username_index():
+    """The username index of the current app (None if disabled)."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('username_index')
+
+
+def _prefix_ids(term, limit, exclude_id):
+    """Prefix matches from the username_lower index (range scan)."""
+    query = select(User.id).where(
+        User.username_lower >= term,
+        User.username_lower < prefix_upper_bound(term),
+        User.username_lower.startswith(term, autoescape=True)
+    )
+    if exclude_id is not None:
+        query = query.where(User.id != exclude_id)
+    return db.session.execute(
+        query.order_by(User.username_lower, User.id).limit(limit)
+    ).scalars().all()
+
+
+def find_user_ids(term, limit, exclude_id=None):
+    """IDs of the users matching ``term``: prefix matches first, then infix ones."""
+    term = User.normalize_username(term)
+    if not term:
+        return []
+
+    index = get_username_index()
+    if index is not None and index.warm:
+        index.sync()
+        user_ids = index.prefix(term, limit, exclude_id)
+    else:
+        user_ids = _prefix_ids(term, limit, exclude_id)
+
+    if len(user_ids) < limit:
+        exclude_ids = set(user_ids)
+        if exclude_id is not None:
+            exclude_ids.add(exclude_id)
+        user_ids += get_user_search_backend().infix(term, limit - len(user_ids), exclude_ids)
+    return user_ids
+
+
+_PENDING_KEY = 'pending_username_index'
+
+
+def _record(target, changes):
+    """Queue index changes until the session commits (a rollback drops them)."""
+    index = get_username_index()
+    session = Session.object_session(target)
+    if index is None or not index.warm or session is None:
+        return
+    session.info.setdefault(_PENDING_KEY, []).extend((index, *change) for change in changes)
+
+
+def _index_inserted_user(mapper, connection, target):
+    _record(target, [('add', target.username_lower, target.id)])
+
+
+def _index_updated_user(mapper, connection, target):
+    history = db.inspect(target).attrs.username_lower.history
+    if not history.has_changes():
+        return
+    changes = [('discard', old, target.id) for old in history.deleted]
+    _record(target, changes + [('add', target.username_lower, target.id)])
+
+
+def _index_deleted_user(mapper, connection, target):
+    _record(target, [('discard', target.username_lower, target.id)])
+
+
+def _apply_after_commit(session):
+    for index, action, username_lower, user_id in session.info.pop(_PENDING_KEY, ()):
+        getattr(index, action)(username_lower, user_id)
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_app(app):
+    """Install the trigram backend and warm the username index."""
+    global _backend
+
+    with app.app_context():
+        columns = {column['name'] for column in db.inspect(db.engine).get_columns('users')}
+        if 'username_lower' not in columns:
+            # Database non ancora migrato: gli indici verranno creati al prossimo avvio
+            print("⚠️  Ricerca utenti non disponibile: esegui 'flask db upgrade'")
+            _backend = LikeUserSearch()
+            return _backend
+
+        name = _DIALECT_BACKENDS.get(db.engine.dialect.name, LikeUserSearch.name)
+        backend = BACKENDS[name]()
+        try:
+            if backend.install():
+                print(f"🔎 Indice utenti '{backend.name}' creato e popolato")
+        except (OperationalError, ProgrammingError) as e:
+            # Es. SQLite senza tokenizer trigram, pg_trgm non installabile
+            db.session.rollback()
+            print(f"⚠️  Ricerca utenti '{backend.name}' non disponibile: {e}")
+            backend = LikeUserSearch()
+
+        if app.config.get('USER_INDEX_ENABLED', True):
+            index = UsernameIndex()
+            index.warm_up()
+            app.extensions['username_index'] = index
+
+    _backend = backend
+
+    if not event.contains(User, 'after_insert', _index_inserted_user):
+        event.listen(User, 'after_insert', _index_inserted_user)
+        event.listen(User, 'after_update', _index_updated_user)
+        event.listen(User, 'after_delete', _index_deleted_user)
+        event.listen(Session, 'after_commit', _apply_after_commit)
+        event.listen(Session, 'after_rollback', _discard_after_rollback)
+    return backend
@@ -22,12 +22,14 @@ except ImportError:
 
 from project.app import create_app
 
-# Create Flask application
-app = create_app()
-
+# L'app si crea solo qui o nella factory di gunicorn (wsgi_app = 'run:create_app()'):
+# i processi 'spawn' del pool bcrypt reimportano questo file come __mp_main__
+# e non devono rifare create_app() (create_all, indici, warm-up)
 if __name__ == "__main__":
-    # Configuration for development
-    debug_mode = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
+    app = create_app()
+    
+    # Server di sviluppo (Werkzeug). In produzione: gunicorn -c gunicorn.conf.py
+    debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     host = '0.0.0.0'
     port = int(os.environ.get('FLASK_PORT', 5000))
     
@@ -40,5 +42,6 @@ if __name__ == "__main__":
     app.run(
         debug=debug_mode,
         host=host,
-        port=port
+        port=port,
+        threaded=True
     )
@@ -0,0 +1,127 @@
+"""
+ASGI mode: native routes on the async engine and the WSGI bridge
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('aiosqlite')
+
+from config import config
+from project.asgi import AsgiApp
+
+
+@pytest.fixture
+def database_file(tmp_path, monkeypatch):
+    # Il motore async apre il database per conto suo: serve un file, non :memory:
+    monkeypatch.setattr(config['testing'], 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'asgi.db'}")
+
+
+@pytest.fixture
+def app(database_file, app):
+    return app
+
+
+def call(asgi_app, path, headers=(), query_string=b'', method='GET', body=b'', disconnect_after=None):
+    """Run one request through the ASGI app; return (status, headers, body)."""
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'root_path': '', 'query_string': query_string,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+    requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        if disconnect_after is None:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(disconnect_after)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        try:
+            await asgi_app(scope, receive, send)
+        finally:
+            await asgi_app.shutdown()
+
+    asyncio.run(run())
+    start = messages[0]
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+@pytest.fixture
+def tagged(client, auth_headers):
+    for title, tags in [('Volo', ['volo', 'mare']), ('Mare', ['mare']), ('Notte', ['notte', 'mare'])]:
+        response = client.post('/api/dreams', headers=auth_headers, json={
+            'title': title, 'content': f'{title} nel sogno', 'date_dreamed': '2024-01-01', 'tags': tags
+        })
+        assert response.status_code == 201
+    return auth_headers
+
+
+def test_native_tags_match_the_flask_view(app, client, tagged):
+    flask_response = client.get('/api/dreams/tags?limit=2', headers=tagged)
+
+    status, headers, body = call(AsgiApp(app), '/api/dreams/tags',
+                                 headers=tagged.items(), query_string=b'limit=2')
+    assert status == 200
+    assert json.loads(body) == flask_response.get_json()
+    assert json.loads(body)['tags'][0] == {'name': 'mare', 'count': 3}
+    assert headers['etag'] == flask_response.headers['ETag']
+    assert headers['cache-control'] == 'private, no-cache'
+
+
+def test_native_tags_not_modified(app, client, tagged):
+    etag = client.get('/api/dreams/tags', headers=tagged).headers['ETag']
+
+    status, headers, body = call(AsgiApp(app), '/api/dreams/tags',
+                                 headers=[*tagged.items(), ('If-None-Match', etag)])
+    assert status == 304
+    assert body == b''
+    assert headers['etag'] == etag
+
+
+def test_native_tags_require_a_token(app):
+    status, _, body = call(AsgiApp(app), '/api/dreams/tags')
+    assert status == 401
+    assert json.loads(body) == {'message': 'Missing or invalid token'}  # route nativa, non Flask
+
+
+def test_wsgi_bridge_serves_flask_routes(app, tagged):
+    payload = json.dumps({'title': 'Via ASGI', 'content': 'Sogno', 'date_dreamed': '2024-01-02'}).encode()
+    status, _, body = call(AsgiApp(app), '/api/dreams', method='POST', body=payload, headers=[
+        *tagged.items(), ('Content-Type', 'application/json'), ('Content-Length', str(len(payload)))
+    ])
+    assert status == 201, body
+    assert json.loads(body)['dream']['title'] == 'Via ASGI'
+
+    status, _, body = call(AsgiApp(app), '/api/dreams', headers=tagged.items())
+    assert status == 200
+    assert json.loads(body)['pagination']['total'] == 4
+
+
+def test_event_stream_opens_with_a_single_use_ticket(app, client, auth_headers):
+    ticket = client.post('/api/events/ticket', headers=auth_headers).get_json()['ticket']
+
+    status, headers, body = call(AsgiApp(app), '/api/events',
+                                 query_string=f'ticket={ticket}'.encode(), disconnect_after=0.1)
+    assert status == 200
+    assert headers['content-type'] == 'text/event-stream'
+    assert body.startswith(b'retry:')
+
+    status, _, _ = call(AsgiApp(app), '/api/events', query_string=f'ticket={ticket}'.encode())
+    assert status == 401
+
+
+def test_event_stream_rejects_the_access_token_in_the_query_string(app, auth_headers):
+    token = auth_headers['Authorization'].split()[1]
+    status, _, _ = call(AsgiApp(app), '/api/events', query_string=f'jwt={token}'.encode())
+    assert status == 401
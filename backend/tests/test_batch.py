@@ -0,0 +1,39 @@
+"""
+Batch sub-requests keep the status of errors raised by Flask/werkzeug
+"""
+import pytest
+
+
+def run_batch(client, headers, *requests):
+    response = client.post('/api/batch', headers=headers, json={'requests': list(requests)})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['responses']
+
+
+@pytest.mark.parametrize('method, path, status', [
+    ('GET', '/api/nope', 404),
+    ('PUT', '/api/auth/me', 405),
+    ('GET', '/api/dreams/999999', 404),
+])
+def test_http_errors_keep_their_status(client, auth_headers, method, path, status):
+    [result] = run_batch(client, auth_headers, {'method': method, 'path': path})
+    assert result['status'] == status
+
+
+def test_json_responses_are_returned(client, auth_headers):
+    created, listed = run_batch(
+        client, auth_headers,
+        {'method': 'POST', 'path': '/api/dreams', 'body': {
+            'title': 'Dal batch', 'content': 'Sogno', 'date_dreamed': '2024-01-01'}},
+        {'method': 'GET', 'path': '/api/dreams'},
+    )
+    assert created['status'] == 201
+    assert listed['status'] == 200
+    assert listed['body']['dreams'][0]['title'] == 'Dal batch'
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson'])
+def test_export_streams_are_rejected(client, auth_headers, export_format):
+    [result] = run_batch(client, auth_headers, {'path': f'/api/dreams/export?format={export_format}'})
+    assert result['status'] == 400
+    assert result['body']['message'] == 'Streaming responses are not supported in a batch'
@@ -0,0 +1,44 @@
+"""
+Event stream (WSGI): tickets and the per-worker stream limit
+"""
+import pytest
+
+from project.utils.events import event_streams
+
+
+@pytest.fixture
+def one_stream(app):
+    event_streams.configure_wsgi_streams(1)
+    yield
+    event_streams.configure_wsgi_streams(app.config['EVENTS_MAX_WSGI_STREAMS'])
+
+
+def new_ticket(client, auth_headers):
+    return client.post('/api/events/ticket', headers=auth_headers).get_json()['ticket']
+
+
+def test_ticket_survives_a_full_worker(client, auth_headers, one_stream):
+    ticket = new_ticket(client, auth_headers)
+    busy = client.get(f'/api/events?ticket={new_ticket(client, auth_headers)}')
+    assert busy.status_code == 200
+
+    response = client.get(f'/api/events?ticket={ticket}')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+
+    # Chiuso il primo stream, lo stesso ticket apre il suo
+    busy.close()
+    response = client.get(f'/api/events?ticket={ticket}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    response.close()
+
+
+def test_rejected_tickets_release_the_slot(client, auth_headers, one_stream):
+    for _ in range(2):
+        assert client.get('/api/events?ticket=nope').status_code == 401
+    assert client.get('/api/events').status_code == 401
+
+    response = client.get(f'/api/events?ticket={new_ticket(client, auth_headers)}')
+    assert response.status_code == 200
+    response.close()
@@ -0,0 +1,43 @@
+"""
+Cursor pagination of /api/dreams: bounds of per_page and malformed cursors
+"""
+import base64
+
+import pytest
+
+
+@pytest.fixture
+def dreams(client, auth_headers):
+    for day in range(1, 4):
+        response = client.post('/api/dreams', headers=auth_headers, json={
+            'title': f'Sogno {day}', 'content': 'Contenuto', 'date_dreamed': f'2024-01-0{day}'
+        })
+        assert response.status_code == 201
+    return auth_headers
+
+
+@pytest.mark.parametrize('per_page', [0, -5])
+def test_per_page_is_at_least_one(client, dreams, per_page):
+    response = client.get(f'/api/dreams?cursor=&per_page={per_page}', headers=dreams)
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert len(body['dreams']) == 1
+    assert body['pagination']['per_page'] == 1
+    assert body['pagination']['has_next']
+
+
+def test_cursor_pages_cover_every_dream(client, dreams):
+    titles, cursor = [], ''
+    while cursor is not None:
+        body = client.get(f'/api/dreams?cursor={cursor}&per_page=2', headers=dreams).get_json()
+        titles += [dream['title'] for dream in body['dreams']]
+        cursor = body['pagination']['next_cursor']
+    assert titles == ['Sogno 3', 'Sogno 2', 'Sogno 1']
+
+
+@pytest.mark.parametrize('raw', [b'["2024-01-01",1e999]', b'["2024-01-01"]', b'not json'])
+def test_malformed_cursor_is_rejected(client, dreams, raw):
+    cursor = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    response = client.get(f'/api/dreams?cursor={cursor}', headers=dreams)
+    assert response.status_code == 400
+    assert response.get_json() == {'message': 'Invalid cursor'}
@@ -0,0 +1,91 @@
+"""
+Every endpoint of QUERY_BUDGETS stays within its SQL budget
+"""
+import pytest
+
+from project.testing import QUERY_BUDGETS, TEST_PASSWORD
+
+
+def register(client, username):
+    response = client.post('/api/auth/register', json={
+        'username': username, 'email': f'{username}@example.com', 'password': TEST_PASSWORD
+    })
+    assert response.status_code == 201, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def create_dream(client, headers, title, is_private=True):
+    response = client.post('/api/dreams', headers=headers, json={
+        'title': title, 'content': f'{title}: sognavo di volare sopra il mare',
+        'date_dreamed': '2024-01-01', 'tags': ['volo', 'mare'], 'is_private': is_private
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['dream']['id']
+
+
+@pytest.fixture
+def world(client, auth_headers):
+    """test_user with a dream, a friend with a public dream and a pending request."""
+    me = client.get('/api/auth/me', headers=auth_headers).get_json()['user']['id']
+
+    friend = register(client, 'friend_user')
+    request_id = client.post('/api/friends/requests', headers=friend, json={'user_id': me}).get_json()['friendship']['id']
+    client.post(f'/api/friends/requests/{request_id}/accept', headers=auth_headers)
+    create_dream(client, friend, 'Sogno condiviso', is_private=False)
+
+    stranger = register(client, 'stranger_user')
+    pending = client.post('/api/friends/requests', headers=stranger, json={'user_id': me}).get_json()['friendship']['id']
+
+    return {
+        'dream_id': create_dream(client, auth_headers, 'Sogno di prova'),
+        'friend_id': client.get('/api/auth/me', headers=friend).get_json()['user']['id'],
+        'pending_id': pending,
+    }
+
+
+REQUESTS = {
+    'POST /api/auth/register': lambda client, headers, world: client.post('/api/auth/register', json={
+        'username': 'new_user', 'email': 'new_user@example.com', 'password': TEST_PASSWORD
+    }),
+    'POST /api/auth/login': lambda client, headers, world: client.post('/api/auth/login', json={
+        'email': 'test_user@example.com', 'password': TEST_PASSWORD
+    }),
+    'GET /api/auth/me': lambda client, headers, world: client.get('/api/auth/me', headers=headers),
+    'GET /api/auth/stats': lambda client, headers, world: client.get('/api/auth/stats', headers=headers),
+    'GET /api/dreams': lambda client, headers, world: client.get('/api/dreams', headers=headers),
+    'GET /api/dreams/<id>': lambda client, headers, world: client.get(
+        f"/api/dreams/{world['dream_id']}", headers=headers),
+    'POST /api/dreams': lambda client, headers, world: client.post('/api/dreams', headers=headers, json={
+        'title': 'Nuovo sogno', 'content': 'Un sogno nuovo', 'date_dreamed': '2024-02-01',
+        'tags': ['volo', 'notte']
+    }),
+    'PUT /api/dreams/<id>': lambda client, headers, world: client.put(
+        f"/api/dreams/{world['dream_id']}", headers=headers, json={'title': 'Titolo nuovo', 'tags': ['notte']}),
+    'DELETE /api/dreams/<id>': lambda client, headers, world: client.delete(
+        f"/api/dreams/{world['dream_id']}", headers=headers),
+    'GET /api/dreams/search': lambda client, headers, world: client.get(
+        '/api/dreams/search?q=volare', headers=headers),
+    'GET /api/dreams/stats': lambda client, headers, world: client.get('/api/dreams/stats', headers=headers),
+    'GET /api/dreams/tags': lambda client, headers, world: client.get('/api/dreams/tags', headers=headers),
+    'GET /api/dreams/export': lambda client, headers, world: client.get('/api/dreams/export', headers=headers),
+    'GET /api/users/find': lambda client, headers, world: client.get('/api/users/find?q=frie', headers=headers),
+    'GET /api/friends': lambda client, headers, world: client.get('/api/friends', headers=headers),
+    'GET /api/friends/requests': lambda client, headers, world: client.get('/api/friends/requests', headers=headers),
+    'POST /api/friends/requests/<id>/accept': lambda client, headers, world: client.post(
+        f"/api/friends/requests/{world['pending_id']}/accept", headers=headers),
+    'DELETE /api/friends/<user_id>': lambda client, headers, world: client.delete(
+        f"/api/friends/{world['friend_id']}", headers=headers),
+    'GET /api/feed': lambda client, headers, world: client.get('/api/feed', headers=headers),
+}
+
+
+def test_every_budget_has_a_request():
+    assert set(REQUESTS) == set(QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize('name', sorted(QUERY_BUDGETS))
+def test_query_budget(name, client, auth_headers, world, query_budget):
+    with query_budget(name):
+        response = REQUESTS[name](client, auth_headers, world)
+        response.get_data()  # export in streaming: le query partono leggendo il corpo
+    assert response.status_code < 300, response.get_json()
@@ -0,0 +1,108 @@
+"""
+Rate limiter backends: same expectations for memory, SQLite and Redis
+"""
+import pytest
+
+from project.utils.ratelimit import MemoryBackend, RedisBackend, SQLiteBackend
+
+WINDOW = 10
+START = 1000.0  # inizio esatto della finestra 100
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'ratelimit.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisBackend(fakeredis.FakeRedis())
+
+
+def hits(backend, key, count, now, limit=5):
+    return [backend.hit(key, limit, WINDOW, now=now).allowed for _ in range(count)]
+
+
+def test_allows_up_to_limit_then_denies(backend):
+    assert hits(backend, 'user:1', 6, START) == [True] * 5 + [False]
+
+    result = backend.hit('user:1', 5, WINDOW, now=START + 1)
+    assert not result.allowed
+    assert result.remaining == 0
+    assert result.reset_after == pytest.approx(WINDOW - 1)
+
+
+def test_keys_are_independent(backend):
+    hits(backend, 'user:1', 5, START)
+    assert backend.hit('user:2', 5, WINDOW, now=START).allowed
+
+
+def test_remaining_counts_down(backend):
+    remaining = [backend.hit('user:1', 5, WINDOW, now=START).remaining for _ in range(3)]
+    assert remaining == [4, 3, 2]
+
+
+def test_cost(backend):
+    assert backend.hit('user:1', 5, WINDOW, cost=4, now=START).allowed
+    assert not backend.hit('user:1', 5, WINDOW, cost=2, now=START).allowed
+    assert backend.hit('user:1', 5, WINDOW, cost=1, now=START).allowed
+
+
+def test_peek_does_not_consume(backend):
+    hits(backend, 'user:1', 3, START)
+    for _ in range(3):
+        result = backend.hit('user:1', 5, WINDOW, cost=0, now=START)
+        assert result.allowed
+        assert result.remaining == 2
+
+    hits(backend, 'user:1', 2, START)
+    result = backend.hit('user:1', 5, WINDOW, cost=0, now=START)
+    assert result.remaining == 0
+    assert not backend.hit('user:1', 5, WINDOW, now=START).allowed
+
+
+def test_previous_window_weighs_on_the_next(backend):
+    hits(backend, 'user:1', 5, START)
+
+    # A metà della finestra successiva conta ancora metà della precedente (2.5)
+    assert hits(backend, 'user:1', 3, START + WINDOW * 1.5) == [True, True, False]
+
+
+def test_window_rollover_resets(backend):
+    hits(backend, 'user:1', 5, START)
+    assert hits(backend, 'user:1', 6, START + WINDOW * 2) == [True] * 5 + [False]
+
+
+def test_denied_hits_are_not_counted(backend):
+    hits(backend, 'user:1', 10, START)
+    # Se i tentativi negati contassero, la finestra successiva partirebbe da 10
+    assert hits(backend, 'user:1', 3, START + WINDOW * 1.5) == [True, True, False]
+
+
+def test_reset(backend):
+    hits(backend, 'user:1', 5, START)
+    backend.reset()
+    assert backend.hit('user:1', 5, WINDOW, now=START).allowed
+
+
+def test_memory_evicts_idle_keys():
+    backend = MemoryBackend(stripes=1, sweep_every=1)
+    backend.hit('idle', 5, WINDOW, now=START)
+    backend.hit('active', 5, WINDOW, now=START + WINDOW)
+    assert len(backend) == 2
+
+    # Passate due finestre 'idle' non pesa più sulla stima: viene rimossa
+    backend.hit('active', 5, WINDOW, now=START + WINDOW * 2)
+    assert len(backend) == 1
+    assert backend.hit('idle', 5, WINDOW, now=START + WINDOW * 2).remaining == 4
+
+
+def test_redis_decrements_denied_hits():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeRedis()
+    backend = RedisBackend(client)
+    hits(backend, 'user:1', 5, START)
+
+    assert not backend.hit('user:1', 5, WINDOW, cost=3, now=START).allowed
+    assert int(client.get('rl:user:1:100')) == 5
+    assert client.ttl('rl:user:1:100') == WINDOW * 2
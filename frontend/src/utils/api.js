@@ -31,4 +31,64 @@ api.interceptors.response.use(
   }
 )
 
+// Più chiamate API in una sola richiesta HTTP (POST /api/batch).
+// requests: [{ id, method, path, body }] -> { [id]: { status, headers, body } }
+export const batch = async (requests) => {
+  const response = await api.post('/api/batch', { requests })
+  return Object.fromEntries(response.data.responses.map((result) => [result.id, result]))
+}
+
+// Notifiche live (GET /api/events, Server-Sent Events). EventSource non può
+// inviare l'header Authorization e il token di accesso non va mai nell'URL:
+// si chiede un ticket monouso (valido pochi secondi) e si apre ?ticket=.
+// Il ticket vale una volta sola, quindi la riconnessione automatica di
+// EventSource è sostituita da una con un ticket nuovo (e un 'resync').
+// handlers: { 'dream.created': (data) => ..., 'stats.changed': ..., 'feed.updated': ... }
+// Restituisce { close() }, o null se gli eventi non sono disponibili.
+export const openEvents = (handlers) => {
+  if (!localStorage.getItem('token') || typeof EventSource === 'undefined') return null
+  let source = null
+  let timer = null
+  let closed = false
+  let reconnecting = false
+
+  const retry = () => {
+    if (closed) return
+    reconnecting = true
+    timer = setTimeout(connect, 5000)
+  }
+
+  const connect = async () => {
+    try {
+      const { data } = await api.post('/api/events/ticket')
+      if (closed) return
+      source = new EventSource(`${api.defaults.baseURL}/api/events?ticket=${encodeURIComponent(data.ticket)}`)
+      Object.entries(handlers).forEach(([name, handler]) => {
+        source.addEventListener(name, (event) => handler(JSON.parse(event.data || '{}')))
+      })
+      source.onopen = () => {
+        // Eventi persi durante la disconnessione: ricarica
+        if (reconnecting && handlers.resync) handlers.resync({})
+        reconnecting = false
+      }
+      source.onerror = () => {
+        source.close()
+        retry()
+      }
+    } catch (error) {
+      // 404: stream disattivati sul server, nessun nuovo tentativo
+      if (error.response?.status !== 404) retry()
+    }
+  }
+
+  connect()
+  return {
+    close: () => {
+      closed = true
+      clearTimeout(timer)
+      if (source) source.close()
+    }
+  }
+}
+
 export default api
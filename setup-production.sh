@@ -178,6 +178,11 @@ RUN apt-get update && apt-get install -y \
 COPY requirements.txt .
 RUN pip install --no-cache-dir -r requirements.txt
 
+# Modalità ASGI (uvicorn asgi:app): docker build --build-arg ASGI=1
+ARG ASGI=0
+COPY requirements-asgi.txt .
+RUN if [ "$ASGI" = "1" ]; then pip install --no-cache-dir -r requirements-asgi.txt asyncpg; fi
+
 # Copy application
 COPY . .
 
@@ -191,7 +196,7 @@ HEALTHCHECK --interval=30s --timeout=30s --start-period=5s --retries=3 \
 
 EXPOSE 5000
 
-CMD ["gunicorn", "--bind", "0.0.0.0:5000", "--workers", "2", "--timeout", "120", "run:app"]
+CMD ["gunicorn", "-c", "gunicorn.conf.py"]
 EOF
 
 # Crea Dockerfile per produzione frontend